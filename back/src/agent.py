@@ -4,15 +4,13 @@ from google.adk.tools.agent_tool import AgentTool
 from src.agents_instruction_prompt import (
     DIRECTOR_PROMPT,
     IMAGE_CREATOR_PROMPT,
+    VARIANT_DIRECTOR_PROMPT,
     VIDEO_CREATOR_PROMPT,
 )
+from src.models.variant_model import VariantPlan
 from langfuse import get_client
 from openinference.instrumentation.google_adk import GoogleADKInstrumentor
 from src.tools.freepik import gen_vid, gen_image
-from src.shared_state import SharedState
-
-# Set shared state for tools
-shared_state = SharedState()
 
 # # Configure Langfuse client for production monitoring
 # langfuse = get_client()
@@ -29,23 +27,33 @@ shared_state = SharedState()
 #     print(f"Failed to set up Google ADK Instrumentation: {e}")
 #     print("Continuing without instrumentation.")
 
-video_producer_agent = Agent(
-    name="video_producer_agent",
-    model="gemini-2.5-flash-lite",
-    description=("Generates videos based on provided prompts and images."),
-    instruction=VIDEO_CREATOR_PROMPT,
-    tools=[gen_vid],
-    output_key="video_output"
-)
 
-image_creator_agent = Agent(
-    name="image_creator_agent",
-    model="gemini-2.5-flash-lite",
-    description=("Generates images based on provided prompts."),
-    instruction=IMAGE_CREATOR_PROMPT,
-    tools=[gen_image],
-    output_key="image_output"
-)
+# An agent can only have one parent, so each pipeline builds its own creators
+def make_video_producer_agent():
+    return Agent(
+        name="video_producer_agent",
+        model="gemini-2.5-flash-lite",
+        description=("Generates videos based on provided prompts and images."),
+        instruction=VIDEO_CREATOR_PROMPT,
+        tools=[gen_vid],
+        output_key="video_output"
+    )
+
+
+def make_image_creator_agent():
+    return Agent(
+        name="image_creator_agent",
+        model="gemini-2.5-flash-lite",
+        description=("Generates images based on provided prompts."),
+        instruction=IMAGE_CREATOR_PROMPT,
+        tools=[gen_image],
+        output_key="image_output"
+    )
+
+
+video_producer_agent = make_video_producer_agent()
+
+image_creator_agent = make_image_creator_agent()
 
 director_agent = LlmAgent(
     name="director_agent",
@@ -72,3 +80,23 @@ final_agent = SequentialAgent(
 )
 
 root_agent = final_agent
+
+# Fan-out mode: the director plans several variants, then every variant gets
+# its own image -> video run (see src/runner.py:call_agent_variants)
+variant_director_agent = LlmAgent(
+    name="variant_director_agent",
+    model="gemini-2.5-flash-lite",
+    description="Plans several alternative image and video prompts for a cut-scene",
+    instruction=VARIANT_DIRECTOR_PROMPT,
+    output_schema=VariantPlan,
+    output_key="variant_plan",
+)
+
+variant_agent = SequentialAgent(
+    name="variant_agent",
+    description="Generates the image, then the video, of one planned variant",
+    sub_agents=[
+        make_image_creator_agent(),
+        make_video_producer_agent(),
+    ],
+)
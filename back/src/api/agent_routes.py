@@ -1,51 +1,165 @@
-from fastapi import APIRouter
-from pydantic import BaseModel
+import asyncio
+import json
+import os
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 
-from src.agent import root_agent
-from src.runner import call_agent
-from src.shared_state import SharedState
+from src.agent import root_agent, variant_agent, variant_director_agent
+from src.runner import call_agent, call_agent_variants
+from src.models.job_model import JobModel, JobStatus
+from src.services.job_queue import job_queue
+from src.services.session_store import get_session_store
 
 router = APIRouter()
 
-_shared_state = SharedState()
-
 # Initialize the Runner with the root agent
+session_service = InMemorySessionService()
 runner = Runner(
-    agent=root_agent, app_name="contentizer", session_service=InMemorySessionService()
+    agent=root_agent, app_name="contentizer", session_service=session_service
+)
+# Fan-out mode plans with one agent and generates each variant with another
+variant_director_runner = Runner(
+    agent=variant_director_agent,
+    app_name="contentizer",
+    session_service=session_service,
+)
+variant_runner = Runner(
+    agent=variant_agent, app_name="contentizer", session_service=session_service
 )
 
+AGENT_PROMPT_JOB = "agent_prompt"
+AGENT_MAX_VARIANTS = int(os.getenv("AGENT_MAX_VARIANTS", "8"))
+AGENT_VARIANT_CONCURRENCY = int(os.getenv("AGENT_VARIANT_CONCURRENCY", "3"))
+
 
 class PromptRequest(BaseModel):
     video_id: str
     time: str
     prompt: str
+    # Regenerate even when an identical request was generated before
+    bypass_cache: bool = False
+    # More than one variant plans that many takes and generates them in parallel
+    variants: int = Field(1, ge=1, le=AGENT_MAX_VARIANTS)
+    max_concurrency: int = Field(AGENT_VARIANT_CONCURRENCY, ge=1, le=AGENT_MAX_VARIANTS)
+
+
+async def run_agent_prompt_job(job: JobModel, report) -> dict:
+    request = PromptRequest(**job.payload)
+    session_id = f"{request.video_id}_{request.time}"  # Creating unique session
+    if request.variants > 1:
+        return await _run_variants(request, session_id, report)
+    if request.bypass_cache:
+        await get_session_store().set_bypass_cache(session_id, True)
+    # Execute the agent with async runtime
+    response = await call_agent(
+        query=request.prompt,
+        runner=runner,
+        user_id=request.video_id,  # Using video_id as user_id
+        session_id=session_id,
+        on_event=report,
+    )
+    return {
+        "video_id": request.video_id,
+        "time": request.time,
+        "response": response,
+        "generated_video_path": await get_session_store().get_video_path(session_id),
+    }
+
+
+async def _run_variants(request: PromptRequest, session_id: str, report) -> dict:
+    results = await call_agent_variants(
+        query=request.prompt,
+        director_runner=variant_director_runner,
+        variant_runner=variant_runner,
+        user_id=request.video_id,
+        session_id=session_id,
+        variants=request.variants,
+        max_concurrency=request.max_concurrency,
+        on_event=report,
+        bypass_cache=request.bypass_cache,
+    )
+    generated = [r.generated_video_path for r in results if r.generated_video_path]
+    return {
+        "video_id": request.video_id,
+        "time": request.time,
+        "response": f"Generated {len(generated)} of {len(results)} variants",
+        # The first successful variant, for clients that expect a single video
+        "generated_video_path": generated[0] if generated else None,
+        "variants": [result.model_dump() for result in results],
+    }
+
+
+job_queue.register_handler(AGENT_PROMPT_JOB, run_agent_prompt_job)
 
 
-@router.post("/prompt")
+def _job_response(job: JobModel) -> dict:
+    return job.model_dump(mode="json", exclude={"payload"})
+
+
+@router.post("/prompt", status_code=202)
 async def get_agent_prompt(request: PromptRequest):
-    try:
-        # Execute the agent with async runtime
-        response = await call_agent(
-            query=request.prompt,
-            runner=runner,
-            user_id=request.video_id,  # Using video_id as user_id
-            session_id=f"{request.video_id}_{request.time}",  # Creating unique session
-        )
-
-        return {
-            "video_id": request.video_id,
-            "time": request.time,
-            "response": response,
-            "generated_video_path": _shared_state.get_video_path(),
-            "status": "success",
-        }
-    except Exception as e:
-        print(f"Error processing agent prompt: {e}")
-        return {
-            "video_id": request.video_id,
-            "time": request.time,
-            "error": str(e),
-            "status": "error",
-        }
+    """Queue an agent run and return its job id right away."""
+    job = await job_queue.submit(
+        AGENT_PROMPT_JOB, user_id=request.video_id, payload=request.model_dump()
+    )
+    return {
+        "job_id": job.job_id,
+        "video_id": request.video_id,
+        "time": request.time,
+        "status": job.status,
+        "status_url": f"/api/agent/jobs/{job.job_id}",
+        "events_url": f"/api/agent/jobs/{job.job_id}/events",
+    }
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if await job_queue.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not await job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return {"job_id": job_id, "status": JobStatus.CANCELLED}
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events with the job's progress until it finishes."""
+    queue = job_queue.subscribe(job_id)
+    job = await job_queue.get_job(job_id)
+    if job is None:
+        job_queue.unsubscribe(job_id, queue)
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        try:
+            yield f"event: snapshot\ndata: {json.dumps(_job_response(job))}\n\n"
+            if job.status in JobStatus.FINISHED:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+                if event["type"] == "status" and event["status"] in JobStatus.FINISHED:
+                    return
+        finally:
+            job_queue.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
@@ -0,0 +1,123 @@
+import os
+import re
+from logging import Logger
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import RedirectResponse, Response
+from starlette.background import BackgroundTask
+
+from src.global_constants import ASSETS_DIR
+from src.repository.project_repository import AsyncProjectRepository
+from src.services.hls_packager import (
+    build_manifest,
+    find_rendition,
+    load_manifest,
+    master_playlist,
+    media_playlist,
+    segment_cache,
+    segment_packager,
+)
+from src.services.media_executor import media_executor
+from src.services.mongo_client import AsyncMongoClientSingleton
+from src.services.range_stream import RangeFileResponse
+
+router = APIRouter()
+logger = Logger("hls_routes")
+
+PLAYLIST_MEDIA_TYPE = "application/vnd.apple.mpegurl"
+# Everything under a package key is derived from fixed inputs
+IMMUTABLE = {"cache-control": "public, max-age=31536000, immutable"}
+# The key an asset or project packages to changes whenever it is edited
+REVALIDATE = {"cache-control": "no-cache"}
+PACKAGE_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+async def package_redirect(sources) -> RedirectResponse:
+    manifest = await media_executor.run(build_manifest, sources)
+    return RedirectResponse(
+        f"/api/hls/{manifest['key']}/master.m3u8", headers=REVALIDATE
+    )
+
+
+def get_manifest(key: str) -> dict:
+    manifest = load_manifest(key) if PACKAGE_KEY.fullmatch(key) else None
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="Package not found")
+    return manifest
+
+
+@router.get("/assets/{filepath:path}")
+async def package_asset(filepath: str):
+    """Redirect to the HLS master playlist of a single asset."""
+    if not os.path.isfile(os.path.join(ASSETS_DIR, filepath)):
+        raise HTTPException(status_code=404, detail="File not found")
+    return await package_redirect([(filepath, None, None)])
+
+
+@router.get("/projects/{project_id}")
+async def package_project(project_id: str):
+    """Redirect to the HLS master playlist of a project's head version.
+
+    The timeline is packaged straight from its tracks, so it plays without
+    waiting for an export.
+    """
+    async with AsyncProjectRepository(AsyncMongoClientSingleton()) as repository:
+        project = await repository.get_project(project_id)
+    if not project or not project["project_versions"]:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    tracks = sorted(
+        project["project_versions"][-1]["project_tracks"],
+        key=lambda track: track.get("track_start_time", 0),
+    )
+    if not tracks:
+        raise HTTPException(status_code=400, detail="Project has no tracks")
+    return await package_redirect(
+        [
+            (
+                track["track_location"],
+                track.get("track_in_point"),
+                track.get("track_out_point"),
+            )
+            for track in tracks
+        ]
+    )
+
+
+@router.get("/{key}/master.m3u8")
+async def get_master_playlist(key: str):
+    manifest = get_manifest(key)
+    return Response(
+        master_playlist(manifest["renditions"]),
+        media_type=PLAYLIST_MEDIA_TYPE,
+        headers=IMMUTABLE,
+    )
+
+
+@router.get("/{key}/{rendition}.m3u8")
+async def get_media_playlist(key: str, rendition: str):
+    manifest = get_manifest(key)
+    found = find_rendition(manifest, rendition)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Rendition not found")
+    return Response(
+        media_playlist(found, manifest["segments"]),
+        media_type=PLAYLIST_MEDIA_TYPE,
+        headers=IMMUTABLE,
+    )
+
+
+@router.get("/{key}/{rendition}/{index}.ts")
+async def get_segment(key: str, rendition: str, index: int):
+    """Serve one segment, encoding it (and the next few) on first request."""
+    manifest = get_manifest(key)
+    found = find_rendition(manifest, rendition)
+    if found is None or not 0 <= index < len(manifest["segments"]):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    path = await segment_packager.get_segment(manifest, found, index)
+    return RangeFileResponse(
+        path,
+        media_type="video/mp2t",
+        headers=IMMUTABLE,
+        background=BackgroundTask(segment_cache.release, path),
+    )
@@ -1,10 +1,57 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from src.api.routes import router
 from src.api.video_routes import router as video_router
 from src.api.agent_routes import router as agent_router
+from src.api.hls_routes import router as hls_router
+from src.services.job_queue import job_queue
+from src.services.freepik_client import close_freepik_client
+from src.services.mongo_client import AsyncMongoClientSingleton, MongoClientSingleton
+from src.repository.migrations import migrate_project_versions
+from src.repository.blob_repository import AsyncBlobRepository
+from src.repository.generation_cache_repository import AsyncGenerationCacheRepository
+from pymongo.errors import PyMongoError
+from src.services.media_executor import (
+    media_executor,
+    MediaQueueFull,
+    MediaJobTimeout,
+    MediaJobCancelled,
+)
+from logging import Logger
+
+logger = Logger("main")
+
 
-app = FastAPI(title="Contentizer API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mongo_client = MongoClientSingleton()
+    mongo_client.connect()
+    async_mongo_client = AsyncMongoClientSingleton()
+    async_mongo_client.connect()
+    try:
+        # Creates the indexes, then moves any embedded versions out
+        await asyncio.to_thread(migrate_project_versions)
+        async with AsyncBlobRepository(async_mongo_client) as blob_repository:
+            await blob_repository.ensure_indexes()
+        async with AsyncGenerationCacheRepository(async_mongo_client) as repository:
+            await repository.ensure_indexes()
+    except PyMongoError as e:
+        # Serve anyway; indexes and migrations are retried on the next start
+        logger.error(f"Could not prepare the projects collections: {e}")
+    # Starts even while Mongo is down and loads the queued jobs once it's back
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await close_freepik_client()
+    media_executor.shutdown()
+    await async_mongo_client.close_client()
+    mongo_client.close_client()
+
+
+app = FastAPI(title="Contentizer API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -15,6 +62,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(MediaQueueFull)
+async def media_queue_full_handler(request: Request, exc: MediaQueueFull):
+    return JSONResponse(
+        status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "5"}
+    )
+
+
+@app.exception_handler(MediaJobTimeout)
+async def media_job_timeout_handler(request: Request, exc: MediaJobTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
+@app.exception_handler(MediaJobCancelled)
+async def media_job_cancelled_handler(request: Request, exc: MediaJobCancelled):
+    # 499: client closed request (nginx convention); nobody is listening anymore
+    return JSONResponse(status_code=499, content={"detail": "Request cancelled"})
+
+
 app.include_router(router, prefix="/api")
 app.include_router(video_router, prefix="/api/video")
 app.include_router(agent_router, prefix="/api/agent")
+app.include_router(hls_router, prefix="/api/hls")
@@ -1,25 +1,114 @@
+import asyncio
 import os
-import shutil
-from typing import Optional
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse
 from src.services.uuid import gen_uuid_str
-from src.repository.project_repository import ProjectRepository
-from src.models.project_model import ProjectModel
-from src.services.mongo_client import MongoClientSingleton
+from src.repository.project_repository import AsyncProjectRepository
+from pydantic import BaseModel, Field
+from src.repository.upload_repository import AsyncUploadRepository
+from src.models.project_model import (
+    ProcessingStatus,
+    ProjectModel,
+    ProjectSummaryModel,
+)
+from src.models.upload_model import UploadSessionModel, UploadStatus
+from src.services.mongo_client import (
+    AsyncMongoClientSingleton,
+    MongoClientSingleton,
+)
 from src.global_constants import ASSETS_DIR, THUMBNAILS_DIR
-from src.services.video_edit import gen_thumbnail
+from src.services.media_pipeline import (
+    PIPELINE_STAGES,
+    initial_processing,
+    start_media_pipeline,
+)
+from src.services.range_stream import RangeFileResponse
+from src.services.blob_store import BLOB_GC_JOB, store_file, store_stream
+from src.services.generation_cache import generation_cache
+from src.repository.blob_repository import AsyncBlobRepository
+from src.services.job_queue import job_queue
+from src.services.thumbnails import THUMBNAIL_MEDIA_TYPES, resolve_thumbnail_path
+from src.services.video_edit import preview_path
+from src.services.chunked_upload import (
+    MAX_UPLOAD_CHUNK_SIZE,
+    MAX_UPLOAD_SIZE,
+    UPLOAD_CHUNK_SIZE,
+    ChunkError,
+    ChunkIntegrityError,
+    UploadClosedError,
+    allocate,
+    chunk_bounds,
+    content_digest,
+    finalize,
+    total_chunks,
+    write_chunk,
+)
 from datetime import datetime
+from urllib.parse import quote
 from logging import Logger
 
 logger = Logger("routes_logger")
 
 router = APIRouter()
 
+PLACEHOLDER_THUMBNAIL = "https://placehold.co/400"
+UPLOAD_READ_SIZE = 1024 * 1024
+IMMUTABLE_CACHE_CONTROL = {"cache-control": "public, max-age=31536000, immutable"}
+
 os.makedirs(ASSETS_DIR, exist_ok=True)
 os.makedirs(THUMBNAILS_DIR, exist_ok=True)
 
 
+async def create_upload_project(
+    project_id: str, filename: str, relative_file_path: str
+):
+    """Create the project for an uploaded video and queue its processing.
+
+    Probing, the thumbnail, the proxy and the waveform are produced in the
+    background; poll `/projects/{project_id}/processing` for their status.
+    """
+    mongo_client = AsyncMongoClientSingleton()
+    async with AsyncProjectRepository(mongo_client) as project_repository:
+        await project_repository.create_project(
+            data=ProjectModel(
+                name=filename,
+                project_id=project_id,
+                user_id="0",
+                project_directory=f"{project_id}/",
+                last_edited=datetime.now().isoformat(),
+                thumbnail=PLACEHOLDER_THUMBNAIL,
+                project_versions=[
+                    {
+                        "version": "0",
+                        "project_tracks": [
+                            {
+                                "track_location": relative_file_path,
+                                "track_start_time": "00:00:00",
+                                "track_type": "video",
+                            }
+                        ],
+                    }
+                ],
+                processing=initial_processing(),
+            )
+        )
+    job = await start_media_pipeline(project_id, "0", relative_file_path)
+
+    logger.info(f"Project created in DB with ID: {project_id}")
+    return {
+        "project": project_id,
+        "url": f"/api/stream/{relative_file_path}",
+        "preview_url": f"/api/preview/{relative_file_path}",
+        "processing_job_id": job.job_id,
+        "processing_url": f"/api/projects/{project_id}/processing",
+    }
+
+
+async def iter_upload(file: UploadFile):
+    while piece := await file.read(UPLOAD_READ_SIZE):
+        yield piece
+
+
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
     try:
@@ -32,105 +121,282 @@ async def upload_file(file: UploadFile = File(...)):
         file_path = os.path.join(project_directory, new_filename)
         relative_file_path = os.path.join(project_unique_id, new_filename)
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # Hashed as it is received; footage uploaded before is stored once
+        await store_stream(iter_upload(file), file_path)
 
         logger.info(
             f"File uploaded successfully: {file_path} \n new_filename: {new_filename} \n relative_file_path: {relative_file_path}"
         )
-        # Generate thumbnail
-        result_thumbnail_path = gen_thumbnail(relative_file_path)
-        logger.info(f"Thumbnail generated at: {result_thumbnail_path}")
-        # create project entry in DB
-        mongo_client = MongoClientSingleton()
-        with ProjectRepository(mongo_client) as project_repository:
-            project_repository.create_project(
-                data=ProjectModel(
-                    name=file.filename,
-                    project_id=project_unique_id,
-                    user_id="0",
-                    project_directory=f"{project_unique_id}/",
-                    last_edited=datetime.now().isoformat(),
-                    thumbnail=result_thumbnail_path,
-                    project_versions=[
-                        {
-                            "version": "0",
-                            "project_tracks": [
-                                {
-                                    "track_location": relative_file_path,
-                                    "track_start_time": "00:00:00",
-                                    "track_type": "video",
-                                }
-                            ],
-                        }
-                    ],
-                )
-            )
-
-        logger.info(f"Project created in DB with ID: {project_unique_id}")
-        return {
-            "project": project_unique_id,
-            "url": f"/api/stream/{relative_file_path}",
-        }
+        return await create_upload_project(
+            project_unique_id, file.filename, relative_file_path
+        )
     except Exception as e:
         logger.error(f"Error during file upload: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/recent_projects", response_model=list[ProjectModel])
-async def get_recent_projects():
-    mongo_client = MongoClientSingleton()
-    with ProjectRepository(mongo_client) as project_repository:
-        projects = project_repository.get_user_projects(user_id="0", count=10, index=0)
-        return [project for project in projects]
-    logger.info("No recent projects found.")
-    return []
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int = Field(gt=0, le=MAX_UPLOAD_SIZE)
+    chunk_size: int = Field(UPLOAD_CHUNK_SIZE, gt=0, le=MAX_UPLOAD_CHUNK_SIZE)
+
 
+def upload_status(session: UploadSessionModel) -> dict:
+    received = set(session.received_chunks)
+    return {
+        "upload_id": session.upload_id,
+        "status": session.status,
+        "size": session.size,
+        "chunk_size": session.chunk_size,
+        "total_chunks": session.total_chunks,
+        "received_chunks": sorted(received),
+        "missing_chunks": [
+            index for index in range(session.total_chunks) if index not in received
+        ],
+    }
 
-@router.get("/thumbnails/{filepath:path}")
+
+async def get_upload_session(upload_id: str) -> UploadSessionModel:
+    async with AsyncUploadRepository(AsyncMongoClientSingleton()) as repository:
+        session = await repository.get_session(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(request: CreateUploadRequest):
+    """Start a resumable upload.
+
+    Send each chunk with `PUT /uploads/{upload_id}/chunks/{index}` (any order,
+    in parallel, with its hex sha256 in `X-Chunk-Sha256`), check what is still
+    missing with `GET /uploads/{upload_id}`, then `POST .../complete`.
+    """
+    project_id = gen_uuid_str()
+    filename = os.path.basename(request.filename)
+    relative_path = os.path.join(project_id, f"{gen_uuid_str()}{filename}")
+    await asyncio.to_thread(
+        allocate, os.path.join(ASSETS_DIR, relative_path), request.size
+    )
+    now = datetime.now()
+    session = UploadSessionModel(
+        upload_id=gen_uuid_str(),
+        user_id="0",
+        project_id=project_id,
+        filename=filename,
+        relative_path=relative_path,
+        size=request.size,
+        chunk_size=request.chunk_size,
+        total_chunks=total_chunks(request.size, request.chunk_size),
+        created_at=now,
+        updated_at=now,
+    )
+    async with AsyncUploadRepository(AsyncMongoClientSingleton()) as repository:
+        await repository.create_session(session)
+    return upload_status(session)
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    return upload_status(await get_upload_session(upload_id))
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: str = Header(...),
+):
+    session = await get_upload_session(upload_id)
+    if session.status != UploadStatus.UPLOADING:
+        raise HTTPException(status_code=409, detail="Upload is already complete")
+    try:
+        offset, length = chunk_bounds(index, session.size, session.chunk_size)
+        await write_chunk(
+            os.path.join(ASSETS_DIR, session.relative_path),
+            offset,
+            length,
+            request.stream(),
+            x_chunk_sha256,
+        )
+    except ChunkIntegrityError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except UploadClosedError as e:
+        # Raced with a completion; every chunk was already received by then
+        raise HTTPException(status_code=409, detail=str(e))
+    except ChunkError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async with AsyncUploadRepository(AsyncMongoClientSingleton()) as repository:
+        await repository.mark_chunk_received(upload_id, index)
+    return {"upload_id": upload_id, "index": index}
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    session = await get_upload_session(upload_id)
+    result = {
+        "project": session.project_id,
+        "url": f"/api/stream/{session.relative_path}",
+        "preview_url": f"/api/preview/{session.relative_path}",
+    }
+    if session.status == UploadStatus.COMPLETE:
+        # A retried completion; the first one already created the project
+        return result
+
+    missing = upload_status(session)["missing_chunks"]
+    if missing:
+        raise HTTPException(
+            status_code=409, detail={"message": "Upload incomplete", "missing": missing}
+        )
+
+    async with AsyncUploadRepository(AsyncMongoClientSingleton()) as repository:
+        if not await repository.mark_complete(upload_id):
+            return result
+        try:
+            full_path = os.path.join(ASSETS_DIR, session.relative_path)
+            digest = await asyncio.to_thread(content_digest, full_path)
+            await asyncio.to_thread(finalize, full_path)
+            await store_file(full_path, digest)
+            return await create_upload_project(
+                session.project_id, session.filename, session.relative_path
+            )
+        except BaseException:
+            await repository.reopen(upload_id)
+            raise
+
+
+@router.get("/projects/{project_id}/processing")
+async def get_project_processing(project_id: str):
+    """Status of each post-upload processing stage of a project."""
+    async with AsyncProjectRepository(AsyncMongoClientSingleton()) as repository:
+        processing = await repository.get_processing(project_id)
+    if processing is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"project_id": project_id, "stages": processing}
+
+
+@router.post("/projects/{project_id}/processing/{stage}/retry", status_code=202)
+async def retry_project_processing(project_id: str, stage: str):
+    """Run one processing stage again, e.g. after it failed."""
+    if stage not in PIPELINE_STAGES:
+        raise HTTPException(status_code=404, detail="Unknown processing stage")
+    async with AsyncProjectRepository(AsyncMongoClientSingleton()) as repository:
+        project = await repository.get_project(project_id)
+        if not project:
+            raise HTTPException(status_code=404, detail="Project not found")
+        current = project.get("processing", {}).get(stage, {})
+        if current.get("status") in ProcessingStatus.ACTIVE:
+            raise HTTPException(status_code=409, detail=f"{stage} is already queued")
+        await repository.set_processing_stage(
+            project_id, stage, ProcessingStatus.PENDING
+        )
+    video_path = project["project_versions"][0]["project_tracks"][0]["track_location"]
+    job = await start_media_pipeline(project_id, project["user_id"], video_path, [stage])
+    return {"project_id": project_id, "stage": stage, "job_id": job.job_id}
+
+
+@router.get("/recent_projects", response_model=list[ProjectSummaryModel])
+async def get_recent_projects(
+    limit: int = Query(10, ge=1, le=100),
+    before_edited: datetime | None = None,
+    before_id: str | None = None,
+):
+    """Most recently edited projects first.
+
+    To get the next page pass the `last_edited` and `project_id` of the last
+    project received as `before_edited` and `before_id`; the two only make
+    sense together.
+    """
+    if (before_edited is None) != (before_id is None):
+        raise HTTPException(
+            status_code=400,
+            detail="before_edited and before_id must be passed together",
+        )
+    after = None
+    if before_edited is not None:
+        after = (before_edited, before_id)
+    mongo_client = AsyncMongoClientSingleton()
+    async with AsyncProjectRepository(mongo_client) as project_repository:
+        return await project_repository.get_user_projects(
+            user_id="0", count=limit, after=after
+        )
+
+
+@router.get("/metrics/mongo_pool")
+async def get_mongo_pool_metrics():
+    """Connection pool usage of the shared Mongo clients."""
+    return {
+        "async": AsyncMongoClientSingleton().pool_metrics.snapshot(),
+        "sync": MongoClientSingleton().pool_metrics.snapshot(),
+    }
+
+
+@router.get("/metrics/blob_store")
+async def get_blob_store_metrics():
+    """Bytes stored once in the blob store against the bytes referenced."""
+    async with AsyncBlobRepository(AsyncMongoClientSingleton()) as repository:
+        return await repository.usage()
+
+
+@router.get("/metrics/generation_cache")
+async def get_generation_cache_metrics():
+    """Hits and misses of this worker, and what the cache holds overall."""
+    return await generation_cache.usage()
+
+
+@router.post("/blobs/gc", status_code=202)
+async def collect_blob_garbage():
+    """Queue deletion of blobs no project file references any more."""
+    job = await job_queue.submit(BLOB_GC_JOB, user_id="0", payload={})
+    return {"job_id": job.job_id, "status_url": f"/api/agent/jobs/{job.job_id}"}
+
+
+@router.api_route("/thumbnails/{filepath:path}", methods=["GET", "HEAD"])
 async def get_thumbnail(filepath: str):
-    if not os.path.exists(filepath):
+    """Serve a poster, sprite sheet or sprite index from THUMBNAILS_DIR.
+
+    Their directories are named after the source file's identity, so the
+    files never change and can be cached for good.
+    """
+    full_path = await asyncio.to_thread(resolve_thumbnail_path, filepath)
+    if full_path is None:
         logger.error(f"Thumbnail not found at path: {filepath}")
         raise HTTPException(status_code=404, detail="Thumbnail not found")
 
-    def iterfile():
-        with open(filepath, "rb") as thumbnail:
-            yield thumbnail.read()
+    return RangeFileResponse(
+        full_path,
+        media_type=THUMBNAIL_MEDIA_TYPES.get(os.path.splitext(full_path)[1]),
+        headers=IMMUTABLE_CACHE_CONTROL,
+    )
 
-    return StreamingResponse(iterfile(), media_type="image/jpeg")
 
+@router.api_route("/stream/{filepath:path}", methods=["GET", "HEAD"])
+async def stream_video(filepath: str):
+    """Stream exactly the file at `filepath`.
 
-@router.get("/stream/{filepath:path}")
-async def stream_video(filepath: str, range: Optional[str] = None):
+    The URL always maps to the same bytes, so a player's range requests can
+    never mix two encodings; previews go through `/preview` instead.
+    """
     full_path = os.path.join(ASSETS_DIR, filepath)
-    if not os.path.exists(full_path):
+    if not os.path.isfile(full_path):
         logger.error(f"File not found at path: {full_path}")
         raise HTTPException(status_code=404, detail="File not found")
+    return RangeFileResponse(full_path)
 
-    file_size = os.path.getsize(full_path)
-    start = 0
-    end = file_size - 1
-
-    if range:
-        range_str = range.replace("bytes=", "")
-        range_parts = range_str.split("-")
-        if range_parts[0]:
-            start = int(range_parts[0])
-        if len(range_parts) > 1 and range_parts[1]:
-            end = int(range_parts[1])
-
-    chunk_size = end - start + 1
-
-    def iterfile():
-        with open(full_path, "rb") as video:
-            video.seek(start)
-            yield video.read(chunk_size)
-
-    headers = {
-        "Content-Range": f"bytes {start}-{end}/{file_size}",
-        "Accept-Ranges": "bytes",
-        "Content-Length": str(chunk_size),
-        "Content-Type": "video/mp4",
-    }
 
-    return StreamingResponse(iterfile(), status_code=206, headers=headers)
+@router.api_route("/preview/{filepath:path}", methods=["GET", "HEAD"])
+async def preview_video(filepath: str):
+    """Redirect to the stream of a video's editing proxy once it is ready,
+    and to the original until then."""
+    if not os.path.isfile(os.path.join(ASSETS_DIR, filepath)):
+        logger.error(f"File not found at path: {filepath}")
+        raise HTTPException(status_code=404, detail="File not found")
+    served_path = await asyncio.to_thread(preview_path, filepath)
+    return RedirectResponse(
+        f"/api/stream/{quote(served_path)}",
+        status_code=302,
+        # Where it points changes when the proxy is done
+        headers={"cache-control": "no-cache"},
+    )
@@ -1,10 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 import ffmpeg
 import os
-from pydantic import BaseModel
-from typing import List
-from src.repository.project_repository import ProjectRepository
-from src.services.mongo_client import MongoClientSingleton
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from src.repository.project_repository import AsyncProjectRepository
+from src.services.mongo_client import AsyncMongoClientSingleton
 from src.services.video_edit import (
     probe,
     trim,
@@ -12,7 +12,10 @@ from src.services.video_edit import (
     get_video_metadata,
     concatenate_videos,
     add_video_to_sequence,
+    preview_path,
+    TRIM_AUTO,
 )
+from src.services.media_executor import media_executor, MediaExecutorError
 from src.services.uuid import gen_uuid_str
 from src.global_constants import ASSETS_DIR
 from src.models.project_model import ProjectTracksModel
@@ -21,11 +24,15 @@ from logging import Logger
 router = APIRouter()
 logger = Logger("video_routes")
 
+TRACK_APPEND_RETRIES = 5
+
 
 class TrimRequest(BaseModel):
     project_location: str
     start_time: float
     end_time: float
+    mode: Literal["auto", "copy", "smart", "reencode"] = TRIM_AUTO
+    preview: bool = False  # Cut from the editing proxy when there is one
 
 
 class AddVideoRequest(BaseModel):
@@ -33,52 +40,88 @@ class AddVideoRequest(BaseModel):
     video_path: str
 
 
+class TrackPointsRequest(BaseModel):
+    project_id: str
+    track_index: int = Field(ge=0)  # Position in the head version's tracks
+    # Source seconds the track plays from/to; None plays from the start/to the end
+    in_point: Optional[float] = Field(None, ge=0)
+    out_point: Optional[float] = Field(None, gt=0)
+
+
 class ConcatenateRequest(BaseModel):
     project_id: str
     output_filename: str = None
+    preview: bool = False  # Render from editing proxies instead of originals
 
 
 # we keep the project id so that the project folder would be same
 @router.post("/trim")
-async def trim_video(request: TrimRequest):
+async def trim_video(request: TrimRequest, http_request: Request):
     input_path = os.path.join(ASSETS_DIR, request.project_location)
     if not os.path.exists(input_path):
         raise HTTPException(status_code=404, detail="File not found")
+    if request.preview:
+        input_path = os.path.join(ASSETS_DIR, preview_path(request.project_location))
 
     output_path = os.path.join(
         ASSETS_DIR, (request.project_location + f"_{gen_uuid_str()}.mp4")
     )
 
     try:
-        trim(
-            input_path, output_path, float(request.start_time), float(request.end_time)
+        trim_mode = await media_executor.run(
+            trim,
+            input_path,
+            output_path,
+            float(request.start_time),
+            float(request.end_time),
+            request.mode,
+            is_disconnected=http_request.is_disconnected,
         )
-        return {"url": f"/api/stream/{os.path.basename(output_path)}"}
+        if trim_mode is None:
+            raise HTTPException(status_code=500, detail="Failed to trim video")
+        return {
+            "url": f"/api/stream/{os.path.relpath(output_path, ASSETS_DIR)}",
+            "trim_mode": trim_mode,
+        }
     except ffmpeg.Error as e:
         logger.error(f"FFmpeg error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"FFmpeg error: {str(e)}")
+    except FileNotFoundError:
+        # Deleted while queued, or the proxy went away between check and cut
+        raise HTTPException(status_code=404, detail="File not found")
+    except OSError as e:
+        logger.error(f"Could not trim {input_path}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to trim video: {e}")
 
 
 @router.get("/get_info/{project_id}")
-async def get_video_info(project_id: str):
+async def get_video_info(project_id: str, http_request: Request):
     try:
-        mongo_client = MongoClientSingleton()
+        mongo_client = AsyncMongoClientSingleton()
 
-        with ProjectRepository(mongo_client) as project_repository:
-            project = project_repository.get_project(project_id)
+        async with AsyncProjectRepository(mongo_client) as project_repository:
+            project = await project_repository.get_project(project_id)
             if not project:
                 logger.error("Project not found")
                 raise HTTPException(status_code=404, detail="Project not found")
             project_tracks = project["project_versions"][-1]["project_tracks"]
             probe_results = []
             for track in project_tracks:
-                probe_results.append(probe(track["track_location"]))
+                probe_results.append(
+                    await media_executor.run(
+                        probe,
+                        track["track_location"],
+                        is_disconnected=http_request.is_disconnected,
+                    )
+                )
             project.pop("_id", None)
             return {
                 "project": project,
                 "probe": probe_results,
             }
 
+    except (HTTPException, MediaExecutorError):
+        raise
     except Exception as e:
         logger.error(f"Error retrieving project: {str(e)}")
         raise HTTPException(
@@ -90,73 +133,152 @@ async def get_video_info(project_id: str):
 async def add_video_to_project(request: AddVideoRequest):
     """Add a video to the project timeline after existing videos"""
     try:
-        mongo_client = MongoClientSingleton()
-
-        with ProjectRepository(mongo_client) as project_repository:
-            project = project_repository.get_project(request.project_id)
-            if not project:
-                logger.error("Project not found")
-                raise HTTPException(status_code=404, detail="Project not found")
-
-            # Get existing tracks
-            project_tracks = project["project_versions"][-1]["project_tracks"]
+        mongo_client = AsyncMongoClientSingleton()
+
+        # Normalize video path - remove ASSETS_DIR prefix if present
+        video_path = request.video_path
+        if video_path.startswith(ASSETS_DIR):
+            # Remove the ASSETS_DIR prefix and any leading slashes
+            video_path = video_path[len(ASSETS_DIR) :].lstrip("/")
+
+        # Verify the actual file exists
+        full_path = os.path.join(ASSETS_DIR, video_path)
+        if not os.path.exists(full_path):
+            logger.error(f"Video file not found: {full_path}")
+            raise HTTPException(status_code=404, detail="Video file not found")
+
+        # Get video metadata
+        metadata = await media_executor.run(get_video_metadata, video_path)
+        if not metadata:
+            logger.error("Invalid video file metadata")
+            raise HTTPException(status_code=400, detail="Invalid video file")
+
+        async with AsyncProjectRepository(mongo_client) as project_repository:
+            # Optimistic concurrency: the append only applies if nobody else
+            # edited the project since we read it, otherwise re-read and retry
+            for _ in range(TRACK_APPEND_RETRIES):
+                project = await project_repository.get_project(request.project_id)
+                if not project:
+                    logger.error("Project not found")
+                    raise HTTPException(status_code=404, detail="Project not found")
+
+                head_version = project["project_versions"][-1]
+                project_tracks = head_version["project_tracks"]
+                missing_durations = {
+                    track["track_location"]
+                    for track in project_tracks
+                    if track.get("track_duration") is None
+                }
+
+                # Calculate start time for new video; tracks stored without a
+                # duration get it filled in here and persisted with the append
+                start_time = await media_executor.run(
+                    add_video_to_sequence, project_tracks, video_path
+                )
+                track_durations = {
+                    track["track_location"]: track["track_duration"]
+                    for track in project_tracks
+                    if track["track_location"] in missing_durations
+                }
+
+                new_track = {
+                    "track_location": video_path,
+                    "track_start_time": start_time,
+                    "track_duration": metadata["duration"],
+                    "track_type": "video",
+                }
+
+                if await project_repository.append_track(
+                    request.project_id,
+                    head_version.get("revision", 0),
+                    head_version["version"],
+                    new_track,
+                    track_durations,
+                ):
+                    return {
+                        "message": "Video added successfully",
+                        "track": new_track,
+                        "total_tracks": len(project_tracks) + 1,
+                    }
+
+            logger.error("Project kept changing while adding a video")
+            raise HTTPException(
+                status_code=409, detail="Project was modified concurrently, retry"
+            )
 
-            # Normalize video path - remove ASSETS_DIR prefix if present
-            video_path = request.video_path
-            if video_path.startswith(ASSETS_DIR):
-                # Remove the ASSETS_DIR prefix and any leading slashes
-                video_path = video_path[len(ASSETS_DIR) :].lstrip("/")
-
-            # Verify the actual file exists
-            full_path = os.path.join(ASSETS_DIR, video_path)
-            if not os.path.exists(full_path):
-                logger.error(f"Video file not found: {full_path}")
-                raise HTTPException(status_code=404, detail="Video file not found")
-
-            # Calculate start time for new video
-            start_time = add_video_to_sequence(project_tracks, video_path)
-
-            # Get video metadata
-            metadata = get_video_metadata(video_path)
-            if not metadata:
-                logger.error("Invalid video file metadata")
-                raise HTTPException(status_code=400, detail="Invalid video file")
-
-            # Create new track
-            new_track = {
-                "track_location": video_path,
-                "track_start_time": start_time,
-                "track_duration": metadata["duration"],
-                "track_type": "video",
-            }
+    except (HTTPException, MediaExecutorError):
+        raise
+    except Exception as e:
+        logger.error(f"Error adding video to project: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error adding video: {str(e)}")
 
-            # Add track to project
-            project_tracks.append(new_track)
 
-            # Update project in database
-            project_repository.update_project(
-                request.project_id, {"project_versions": project["project_versions"]}
+@router.post("/track_points")
+async def set_track_points(request: TrackPointsRequest):
+    """Set the part of its source clip a track plays, used by exports"""
+    if (
+        request.in_point is not None
+        and request.out_point is not None
+        and request.out_point <= request.in_point
+    ):
+        raise HTTPException(status_code=400, detail="out_point must follow in_point")
+    try:
+        mongo_client = AsyncMongoClientSingleton()
+
+        async with AsyncProjectRepository(mongo_client) as project_repository:
+            for _ in range(TRACK_APPEND_RETRIES):
+                project = await project_repository.get_project(request.project_id)
+                if not project:
+                    logger.error("Project not found")
+                    raise HTTPException(status_code=404, detail="Project not found")
+
+                head_version = project["project_versions"][-1]
+                project_tracks = head_version["project_tracks"]
+                if request.track_index >= len(project_tracks):
+                    raise HTTPException(status_code=404, detail="Track not found")
+                track = project_tracks[request.track_index]
+                duration = track.get("track_duration")
+                if duration is not None and (request.in_point or 0) >= duration:
+                    raise HTTPException(
+                        status_code=400, detail="in_point is past the end of the clip"
+                    )
+
+                if await project_repository.set_track_points(
+                    request.project_id,
+                    head_version.get("revision", 0),
+                    head_version["version"],
+                    request.track_index,
+                    request.in_point,
+                    request.out_point,
+                ):
+                    track["track_in_point"] = request.in_point
+                    track["track_out_point"] = request.out_point
+                    return {"message": "Track points updated", "track": track}
+
+            logger.error("Project kept changing while setting track points")
+            raise HTTPException(
+                status_code=409, detail="Project was modified concurrently, retry"
             )
 
-            return {
-                "message": "Video added successfully",
-                "track": new_track,
-                "total_tracks": len(project_tracks),
-            }
-
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error adding video to project: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error adding video: {str(e)}")
+        logger.error(f"Error setting track points: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error setting track points: {str(e)}"
+        )
 
 
 @router.post("/concatenate")
-async def concatenate_project_videos(request: ConcatenateRequest):
+async def concatenate_project_videos(
+    request: ConcatenateRequest, http_request: Request
+):
     """Concatenate all videos in a project into a single output file"""
     try:
-        mongo_client = MongoClientSingleton()
+        mongo_client = AsyncMongoClientSingleton()
 
-        with ProjectRepository(mongo_client) as project_repository:
-            project = project_repository.get_project(request.project_id)
+        async with AsyncProjectRepository(mongo_client) as project_repository:
+            project = await project_repository.get_project(request.project_id)
             if not project:
                 logger.error("Project not found")
                 raise HTTPException(status_code=404, detail="Project not found")
@@ -171,8 +293,15 @@ async def concatenate_project_videos(request: ConcatenateRequest):
                 logger.error("No videos to concatenate")
                 raise HTTPException(status_code=400, detail="No videos to concatenate")
 
-            # Extract video paths
-            video_paths = [track["track_location"] for track in project_tracks]
+            # Each track contributes the [in, out) part of its source clip
+            segments = [
+                (
+                    track["track_location"],
+                    track.get("track_in_point"),
+                    track.get("track_out_point"),
+                )
+                for track in project_tracks
+            ]
 
             # Generate output filename
             output_filename = (
@@ -180,8 +309,13 @@ async def concatenate_project_videos(request: ConcatenateRequest):
                 or f"{request.project_id}_concatenated_{gen_uuid_str()}.mp4"
             )
 
-            # Concatenate videos
-            output_path = concatenate_videos(video_paths, output_filename)
+            # Concatenate videos; segments render as parallel media jobs
+            output_path = await concatenate_videos(
+                segments,
+                output_filename,
+                preview=request.preview,
+                is_disconnected=http_request.is_disconnected,
+            )
 
             if not output_path:
                 logger.error("Failed to concatenate videos: output_path is None")
@@ -193,8 +327,11 @@ async def concatenate_project_videos(request: ConcatenateRequest):
                 "message": "Videos concatenated successfully",
                 "output_path": output_filename,
                 "url": f"/api/stream/{output_filename}",
+                "hls_url": f"/api/hls/assets/{output_filename}",
             }
 
+    except (HTTPException, MediaExecutorError):
+        raise
     except Exception as e:
         logger.error(f"Error concatenating videos: {str(e)}")
         raise HTTPException(
@@ -204,5 +341,5 @@ async def concatenate_project_videos(request: ConcatenateRequest):
 @router.get("/video_duration/{file_path:str}")
 async def get_video_duration_endpoint(file_path: str):
     """Get the duration of a video file"""
-    get_video_duration(file_path)
+    return {"duration": await media_executor.run(get_video_duration, file_path)}
 
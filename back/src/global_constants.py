@@ -2,4 +2,5 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.relpath(__file__))))
 ASSETS_DIR = os.path.join(BASE_DIR, "assets")
-THUMBNAILS_DIR = os.path.join(ASSETS_DIR, "thumbnails")
\ No newline at end of file
+THUMBNAILS_DIR = os.path.join(ASSETS_DIR, "thumbnails")
+WAVEFORMS_DIR = os.path.join(ASSETS_DIR, "waveforms")
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class BlobModel(BaseModel):
+    digest: str  # sha256 of the contents, also the blob's file name
+    size: int
+    # Files materialized from the blob, relative to ASSETS_DIR
+    refs: list[str] = Field(default_factory=list)
+    created_at: datetime
+    updated_at: datetime
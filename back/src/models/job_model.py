@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Any, Optional
+
+
+class JobStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobModel(BaseModel):
+    job_id: str
+    user_id: str
+    kind: str
+    status: str = JobStatus.QUEUED
+    payload: dict[str, Any] = Field(default_factory=dict)
+    progress: list[dict[str, Any]] = Field(default_factory=list)
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    # The worker running the job, which must renew the lease to keep it
+    worker_id: Optional[str] = None
+    lease_expires_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
@@ -1,12 +1,14 @@
 from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
 
 class ProjectTracksModel(BaseModel):
     track_location: str
     track_start_time: float 
     track_duration: Optional[float] = None  # Duration in seconds
+    track_in_point: Optional[float] = None  # Source seconds to start from
+    track_out_point: Optional[float] = None  # Source seconds to stop at
     track_type: str = "video" 
 
     @field_validator("track_start_time", mode="before")
@@ -30,13 +32,45 @@ class ProjectTracksModel(BaseModel):
 class ProjectFilesModel(BaseModel):
     version: str
     project_tracks: list[ProjectTracksModel] = Field(default_factory=list)
+    revision: int = 0  # Bumped by every edit, for optimistic concurrency
+
+
+class ProcessingStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    ACTIVE = (PENDING, RUNNING)
+
+
+class ProcessingStageModel(BaseModel):
+    """State of one post-upload processing stage (probe, thumbnail, ...)."""
+
+    status: str = ProcessingStatus.PENDING
+    error: Optional[str] = None
+    attempts: int = 0
+    result: Optional[dict[str, Any]] = None
+    updated_at: Optional[datetime] = None
 
 
 class ProjectModel(BaseModel):
     project_id: str
     user_id: str
     project_directory: str
+    # Stored in the `project_versions` collection; the project document only
+    # keeps `head_version`, and reads materialize the head version here
     project_versions: list[ProjectFilesModel] = Field(default_factory=list)
     thumbnail: str
     last_edited: datetime
     name: str
+    processing: dict[str, ProcessingStageModel] = Field(default_factory=dict)
+
+
+class ProjectSummaryModel(BaseModel):
+    """The fields a project list needs, without any track data."""
+
+    project_id: str
+    name: str
+    thumbnail: str
+    last_edited: datetime
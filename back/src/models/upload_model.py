@@ -0,0 +1,22 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+
+class UploadStatus:
+    UPLOADING = "uploading"
+    COMPLETE = "complete"
+
+
+class UploadSessionModel(BaseModel):
+    upload_id: str
+    user_id: str
+    project_id: str
+    filename: str
+    relative_path: str  # Final location of the file, relative to ASSETS_DIR
+    size: int
+    chunk_size: int
+    total_chunks: int
+    received_chunks: list[int] = Field(default_factory=list)
+    status: str = UploadStatus.UPLOADING
+    created_at: datetime
+    updated_at: datetime
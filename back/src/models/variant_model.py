@@ -0,0 +1,29 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class VariantStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class VariantPrompt(BaseModel):
+    image_prompt: str = Field(description="What the still image shows")
+    video_prompt: str = Field(description="How the image moves and transitions")
+
+
+class VariantPlan(BaseModel):
+    variants: list[VariantPrompt]
+
+
+class VariantResult(BaseModel):
+    index: int
+    session_id: str
+    image_prompt: str
+    video_prompt: str
+    status: str = VariantStatus.PENDING
+    response: Optional[str] = None
+    generated_video_path: Optional[str] = None
+    error: Optional[str] = None
@@ -1,5 +1,5 @@
-from pymongo import MongoClient
-from src.services.mongo_client import MongoClientSingleton
+from pymongo import AsyncMongoClient, MongoClient
+from src.services.mongo_client import AsyncMongoClientSingleton, MongoClientSingleton
 
 
 class BaseRepository:
@@ -16,5 +16,22 @@ class BaseRepository:
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self._mongo_instance.close_client()
-        self._mongo_instance = None
\ No newline at end of file
+        # The client and its pool live for the whole application; just let go
+        self._mongo_instance = None
+
+
+class AsyncBaseRepository:
+    def __init__(self, mongo: AsyncMongoClientSingleton):
+        self._mongo_instance = mongo
+        self._mongo_client = mongo.get_client()
+        self.database = self._mongo_client['Contentizer']
+
+    @property
+    def mongo_client(self) -> AsyncMongoClient:
+        return self._mongo_client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._mongo_instance = None
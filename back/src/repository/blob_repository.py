@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel
+
+from src.repository.base_repository import AsyncBaseRepository
+from src.models.blob_model import BlobModel
+from src.services.mongo_client import AsyncMongoClientSingleton
+
+BLOB_INDEXES = [
+    IndexModel([("digest", ASCENDING)], unique=True, name="digest_unique"),
+    IndexModel([("refs", ASCENDING)], name="blob_refs"),
+]
+UNREFERENCED = {"refs": {"$size": 0}}
+
+
+class AsyncBlobRepository(AsyncBaseRepository):
+    """Reference counts of the content-addressed blob store: a blob's `refs`
+    are the files materialized from it."""
+
+    def __init__(self, mongo: AsyncMongoClientSingleton):
+        super().__init__(mongo)
+
+    async def ensure_indexes(self):
+        await self.database["blobs"].create_indexes(BLOB_INDEXES)
+
+    async def get_blob(self, digest: str) -> BlobModel | None:
+        blob = await self.database["blobs"].find_one({"digest": digest}, {"_id": 0})
+        return BlobModel(**blob) if blob else None
+
+    async def add_reference(self, digest: str, size: int, ref: str):
+        now = datetime.now()
+        return await self.database["blobs"].update_one(
+            {"digest": digest},
+            {
+                "$setOnInsert": {"digest": digest, "size": size, "created_at": now},
+                "$addToSet": {"refs": ref},
+                "$set": {"updated_at": now},
+            },
+            upsert=True,
+        )
+
+    async def remove_reference(self, digest: str, ref: str):
+        return await self.database["blobs"].update_one(
+            {"digest": digest},
+            {"$pull": {"refs": ref}, "$set": {"updated_at": datetime.now()}},
+        )
+
+    async def get_references(self) -> list[tuple[str, list[str]]]:
+        cursor = self.database["blobs"].find({}, {"_id": 0, "digest": 1, "refs": 1})
+        return [(blob["digest"], blob["refs"]) async for blob in cursor]
+
+    async def get_unreferenced(self, before: datetime) -> list[str]:
+        cursor = self.database["blobs"].find(
+            {**UNREFERENCED, "updated_at": {"$lt": before}}, {"_id": 0, "digest": 1}
+        )
+        return [blob["digest"] async for blob in cursor]
+
+    async def delete_unreferenced(self, digest: str, before: datetime) -> bool:
+        """Forget a blob nothing has referenced since `before`; False when a
+        reference was added in the meantime."""
+        result = await self.database["blobs"].delete_one(
+            {"digest": digest, **UNREFERENCED, "updated_at": {"$lt": before}}
+        )
+        return result.deleted_count == 1
+
+    async def usage(self) -> dict:
+        """Unique bytes stored against the bytes all references add up to."""
+        cursor = await self.database["blobs"].aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": None,
+                        "blobs": {"$sum": 1},
+                        "stored_bytes": {"$sum": "$size"},
+                        "references": {"$sum": {"$size": "$refs"}},
+                        "referenced_bytes": {
+                            "$sum": {"$multiply": ["$size", {"$size": "$refs"}]}
+                        },
+                    }
+                },
+                {"$project": {"_id": 0}},
+            ]
+        )
+        totals = await cursor.to_list(length=1)
+        return totals[0] if totals else {
+            "blobs": 0,
+            "stored_bytes": 0,
+            "references": 0,
+            "referenced_bytes": 0,
+        }
@@ -0,0 +1,131 @@
+from datetime import datetime
+
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from src.repository.base_repository import AsyncBaseRepository
+from src.services.mongo_client import AsyncMongoClientSingleton
+
+# Mongo's TTL monitor deletes entries once their expires_at has passed
+GENERATION_CACHE_INDEXES = [
+    IndexModel([("key", ASCENDING)], unique=True, name="generation_key_unique"),
+    IndexModel(
+        [("expires_at", ASCENDING)], expireAfterSeconds=0, name="generation_expiry"
+    ),
+    IndexModel([("last_used_at", ASCENDING)], name="generation_lru"),
+]
+INDEX_OPTIONS_CONFLICT = 85
+# Least recently used entries read per query while evicting
+EVICTION_BATCH = 100
+
+
+class AsyncGenerationCacheRepository(AsyncBaseRepository):
+    """Generated assets by the hash of the request that produced them."""
+
+    def __init__(self, mongo: AsyncMongoClientSingleton):
+        super().__init__(mongo)
+
+    async def ensure_indexes(self):
+        try:
+            await self.database["generation_cache"].create_indexes(
+                GENERATION_CACHE_INDEXES
+            )
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # The expiry index predates TTL expiry; rebuild it as a TTL index
+            await self.database["generation_cache"].drop_index("generation_expiry")
+            await self.database["generation_cache"].create_indexes(
+                GENERATION_CACHE_INDEXES
+            )
+
+    async def get_entry(self, key: str) -> dict | None:
+        """The live entry for `key`, marked as just used."""
+        now = datetime.now()
+        return await self.database["generation_cache"].find_one_and_update(
+            {"key": key, "expires_at": {"$gt": now}},
+            {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+            projection={"_id": 0},
+        )
+
+    async def put_entry(
+        self,
+        key: str,
+        endpoint: str,
+        file: str,
+        digest: str,
+        size: int,
+        expires_at: datetime,
+    ):
+        now = datetime.now()
+        return await self.database["generation_cache"].update_one(
+            {"key": key},
+            {
+                "$set": {
+                    "endpoint": endpoint,
+                    "file": file,
+                    "digest": digest,
+                    "size": size,
+                    "created_at": now,
+                    "last_used_at": now,
+                    "expires_at": expires_at,
+                    "hits": 0,
+                }
+            },
+            upsert=True,
+        )
+
+    async def delete_entry(self, key: str):
+        return await self.database["generation_cache"].delete_one({"key": key})
+
+    async def evict(self, budget_bytes: int) -> list[str]:
+        """Delete least recently used entries until the rest fit
+        `budget_bytes`, reading them off the LRU index in batches. Expired
+        entries are left to the TTL index. Returns the deleted entries' files.
+        """
+        excess = (await self.usage())["bytes"] - budget_bytes
+        evicted = []
+        while excess > 0:
+            entries = (
+                await self.database["generation_cache"]
+                .find({}, {"_id": 0, "key": 1, "file": 1, "size": 1})
+                .sort([("last_used_at", ASCENDING)])
+                .limit(EVICTION_BATCH)
+                .to_list()
+            )
+            if not entries:
+                break
+            batch = []
+            for entry in entries:
+                if excess <= 0:
+                    break
+                batch.append(entry)
+                excess -= entry["size"]
+            await self.database["generation_cache"].delete_many(
+                {"key": {"$in": [entry["key"] for entry in batch]}}
+            )
+            evicted += batch
+        return [entry["file"] for entry in evicted]
+
+    async def live_keys(self, keys: list[str]) -> set[str]:
+        """Which of `keys` still have an entry."""
+        cursor = self.database["generation_cache"].find(
+            {"key": {"$in": keys}}, {"_id": 0, "key": 1}
+        )
+        return {entry["key"] async for entry in cursor}
+
+    async def usage(self) -> dict:
+        cursor = await self.database["generation_cache"].aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": None,
+                        "entries": {"$sum": 1},
+                        "bytes": {"$sum": "$size"},
+                    }
+                },
+                {"$project": {"_id": 0}},
+            ]
+        )
+        totals = await cursor.to_list(length=1)
+        return totals[0] if totals else {"entries": 0, "bytes": 0}
@@ -0,0 +1,127 @@
+from datetime import datetime
+from pymongo import ReturnDocument
+from src.repository.base_repository import BaseRepository
+from src.models.job_model import JobModel, JobStatus
+from src.services.mongo_client import MongoClientSingleton
+
+
+class JobRepository(BaseRepository):
+    def __init__(self, mongo: MongoClientSingleton):
+        super().__init__(mongo)
+
+    def create_job(self, data: JobModel):
+        return self.database["jobs"].insert_one(data.model_dump())
+
+    def get_job(self, job_id: str) -> JobModel | None:
+        job = self.database["jobs"].find_one({"job_id": job_id}, {"_id": 0})
+        return JobModel(**job) if job else None
+
+    def update_job(self, job_id: str, update_data: dict):
+        update_data = {**update_data, "updated_at": datetime.now()}
+        return self.database["jobs"].update_one(
+            {"job_id": job_id}, {"$set": update_data}
+        )
+
+    def push_progress(self, job_id: str, event: dict):
+        return self.database["jobs"].update_one(
+            {"job_id": job_id},
+            {"$push": {"progress": event}, "$set": {"updated_at": datetime.now()}},
+        )
+
+    def claim_job(
+        self, job_id: str, worker_id: str, lease_expires_at: datetime
+    ) -> JobModel | None:
+        """Atomically take a queued job for `worker_id`; None if another worker
+        got it first or it is no longer queued."""
+        job = self.database["jobs"].find_one_and_update(
+            {"job_id": job_id, "status": JobStatus.QUEUED},
+            {
+                "$set": {
+                    "status": JobStatus.RUNNING,
+                    "worker_id": worker_id,
+                    "lease_expires_at": lease_expires_at,
+                    "updated_at": datetime.now(),
+                },
+                "$inc": {"attempts": 1},
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        return JobModel(**job) if job else None
+
+    def renew_lease(
+        self, job_id: str, worker_id: str, lease_expires_at: datetime
+    ) -> bool:
+        """Extend the lease on a running job; False if the worker lost it."""
+        result = self.database["jobs"].update_one(
+            {"job_id": job_id, "worker_id": worker_id, "status": JobStatus.RUNNING},
+            {"$set": {"lease_expires_at": lease_expires_at}},
+        )
+        return result.matched_count == 1
+
+    def finish_job(self, job_id: str, worker_id: str, update_data: dict) -> bool:
+        """Record the outcome of a run; False (and nothing written) if the
+        worker lost the job to another one in the meantime."""
+        update_data = {
+            **update_data,
+            "worker_id": None,
+            "lease_expires_at": None,
+            "updated_at": datetime.now(),
+        }
+        result = self.database["jobs"].update_one(
+            {"job_id": job_id, "worker_id": worker_id, "status": JobStatus.RUNNING},
+            {"$set": update_data},
+        )
+        return result.matched_count == 1
+
+    def release_job(self, job_id: str, worker_id: str) -> bool:
+        """Hand a running job back to the queue, e.g. on a clean shutdown."""
+        result = self.database["jobs"].update_one(
+            {"job_id": job_id, "worker_id": worker_id, "status": JobStatus.RUNNING},
+            {
+                "$set": {
+                    "status": JobStatus.QUEUED,
+                    "worker_id": None,
+                    "lease_expires_at": None,
+                    "updated_at": datetime.now(),
+                }
+            },
+        )
+        return result.modified_count == 1
+
+    def cancel_queued_job(self, job_id: str) -> bool:
+        result = self.database["jobs"].update_one(
+            {"job_id": job_id, "status": JobStatus.QUEUED},
+            {"$set": {"status": JobStatus.CANCELLED, "updated_at": datetime.now()}},
+        )
+        return result.modified_count == 1
+
+    def requeue_expired_jobs(self, now: datetime) -> int:
+        """Put running jobs whose worker stopped renewing the lease back in the
+        queue. Jobs from before leases existed have none and count as expired."""
+        result = self.database["jobs"].update_many(
+            {
+                "status": JobStatus.RUNNING,
+                "$or": [
+                    {"lease_expires_at": {"$lt": now}},
+                    {"lease_expires_at": None},
+                ],
+            },
+            {
+                "$set": {
+                    "status": JobStatus.QUEUED,
+                    "worker_id": None,
+                    "lease_expires_at": None,
+                    "updated_at": datetime.now(),
+                }
+            },
+        )
+        return result.modified_count
+
+    def get_queued_jobs(self) -> list[JobModel]:
+        cursor = (
+            self.database["jobs"]
+            .find({"status": JobStatus.QUEUED}, {"_id": 0})
+            .sort("created_at", 1)
+        )
+        return [JobModel(**job) for job in cursor]
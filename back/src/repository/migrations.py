@@ -0,0 +1,26 @@
+from logging import Logger
+
+from src.repository.project_repository import ProjectRepository
+from src.services.mongo_client import MongoClientSingleton
+
+logger = Logger("migrations")
+
+
+def migrate_project_versions() -> int:
+    """Move versions embedded in project documents into `project_versions`.
+
+    Idempotent, and a no-op once every project has been migrated; it runs at
+    startup and can also be run by hand:
+
+        python -m src.repository.migrations
+    """
+    with ProjectRepository(MongoClientSingleton()) as project_repository:
+        project_repository.ensure_indexes()
+        migrated = project_repository.migrate_embedded_versions()
+    if migrated:
+        logger.info(f"Moved versions of {migrated} projects to project_versions")
+    return migrated
+
+
+if __name__ == "__main__":
+    print(f"Migrated {migrate_project_versions()} projects")
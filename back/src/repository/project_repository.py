@@ -1,28 +1,430 @@
-from src.repository.base_repository import BaseRepository
-from src.models.project_model import ProjectModel
-from src.services.mongo_client import MongoClientSingleton
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from src.repository.base_repository import AsyncBaseRepository, BaseRepository
+from src.models.project_model import (
+    ProcessingStatus,
+    ProjectModel,
+    ProjectSummaryModel,
+)
+from src.services.mongo_client import AsyncMongoClientSingleton, MongoClientSingleton
+
+PROJECT_INDEXES = [
+    IndexModel([("project_id", ASCENDING)], unique=True, name="project_id_unique"),
+    # Serves the per-user listing: equality on user_id, then already sorted
+    # newest first with project_id breaking ties between equal timestamps
+    IndexModel(
+        [
+            ("user_id", ASCENDING),
+            ("last_edited", DESCENDING),
+            ("project_id", DESCENDING),
+        ],
+        name="user_recent_projects",
+    ),
+]
+VERSION_INDEXES = [
+    IndexModel(
+        [("project_id", ASCENDING), ("version", ASCENDING)],
+        unique=True,
+        name="project_version_unique",
+    ),
+]
+# Projects whose versions are still embedded, i.e. not migrated yet
+EMBEDDED_VERSIONS = {"project_versions": {"$exists": True}}
+DUPLICATE_KEY = 11000
+PROJECT_LIST_SORT = [("last_edited", DESCENDING), ("project_id", DESCENDING)]
+PROJECT_SUMMARY_PROJECTION = {
+    "_id": 0,
+    **{field: 1 for field in ProjectSummaryModel.model_fields},
+}
+VERSION_PROJECTION = {"_id": 0, "project_id": 0}
+
+
+def split_project_document(data: ProjectModel) -> tuple[dict, list[dict]]:
+    """The project document (pointing at its head version) and its version
+    documents, which live in their own `project_versions` collection."""
+    project = data.model_dump()
+    versions = [
+        {**version, "project_id": data.project_id, "revision": 0}
+        for version in project.pop("project_versions")
+    ]
+    project["head_version"] = versions[-1]["version"] if versions else None
+    return project, versions
+
+
+def migrate_project_operations(project: dict) -> tuple[list[UpdateOne], dict]:
+    """Upserts that move a project's embedded versions into the versions
+    collection, plus the update that leaves the project with a head pointer.
+    Safe to re-run: existing version documents are left untouched."""
+    versions = project.get("project_versions") or []
+    upserts = [
+        UpdateOne(
+            {"project_id": project["project_id"], "version": version["version"]},
+            {
+                "$setOnInsert": {
+                    **version,
+                    "project_id": project["project_id"],
+                    "revision": project.get("revision", 0),
+                }
+            },
+            upsert=True,
+        )
+        for version in versions
+    ]
+    head_update = {
+        "$set": {"head_version": versions[-1]["version"] if versions else None},
+        "$unset": {"project_versions": "", "revision": ""},
+    }
+    return upserts, head_update
+
+
+def _raise_unless_duplicates(error: BulkWriteError):
+    """A concurrent migration of the same project inserted these versions
+    first; anything else is a real failure."""
+    if any(e["code"] != DUPLICATE_KEY for e in error.details["writeErrors"]):
+        raise error
+
+
+def track_append_update(
+    project_id: str,
+    revision: int,
+    head_version: str,
+    track: dict,
+    track_durations: dict[str, float] | None = None,
+) -> tuple[dict, dict, list[dict]]:
+    """(filter, update, array_filters) that push `track` onto the head version.
+
+    The update only applies while the version is still at `revision`, so two
+    concurrent edits can't both build on the same state. `track_durations`
+    fills in the duration of existing tracks (by location) stored without one.
+    """
+    query = {
+        "project_id": project_id,
+        "version": head_version,
+        # Versions written before revisions existed have no counter yet
+        "revision": revision if revision else {"$in": [0, None]},
+    }
+    update = {
+        "$push": {"project_tracks": track},
+        "$inc": {"revision": 1},
+    }
+    array_filters = []
+    for index, (location, duration) in enumerate((track_durations or {}).items()):
+        update.setdefault("$set", {})[
+            f"project_tracks.$[t{index}].track_duration"
+        ] = duration
+        array_filters.append(
+            {f"t{index}.track_location": location, f"t{index}.track_duration": None}
+        )
+    return query, update, array_filters
+
+
+def track_points_update(
+    project_id: str,
+    revision: int,
+    head_version: str,
+    track_index: int,
+    in_point: float | None,
+    out_point: float | None,
+) -> tuple[dict, dict]:
+    """(filter, update) setting the in/out points of one head version track.
+
+    Guarded by `revision` like track_append_update; None clears a point.
+    """
+    query = {
+        "project_id": project_id,
+        "version": head_version,
+        "revision": revision if revision else {"$in": [0, None]},
+        f"project_tracks.{track_index}": {"$exists": True},
+    }
+    update = {
+        "$set": {
+            f"project_tracks.{track_index}.track_in_point": in_point,
+            f"project_tracks.{track_index}.track_out_point": out_point,
+        },
+        "$inc": {"revision": 1},
+    }
+    return query, update
+
+
+def track_durations_update(
+    track_durations: dict[str, float],
+) -> tuple[dict, list[dict]]:
+    """(update, array_filters) setting the duration of tracks by location."""
+    update = {"$set": {}, "$inc": {"revision": 1}}
+    array_filters = []
+    for index, (location, duration) in enumerate(track_durations.items()):
+        update["$set"][f"project_tracks.$[t{index}].track_duration"] = duration
+        array_filters.append({f"t{index}.track_location": location})
+    return update, array_filters
+
+
+def user_projects_query(
+    user_id: str, after: tuple[datetime, str] | None = None
+) -> dict:
+    """Keyset query for the page after the (last_edited, project_id) of the
+    last project the caller has seen, so a page costs the same at any depth."""
+    query = {"user_id": user_id}
+    if after is not None:
+        last_edited, project_id = after
+        query["$or"] = [
+            {"last_edited": {"$lt": last_edited}},
+            {"last_edited": last_edited, "project_id": {"$lt": project_id}},
+        ]
+    return query
 
 
 class ProjectRepository(BaseRepository):
     def __init__(self, mongo: MongoClientSingleton):
         super().__init__(mongo)
 
-    def get_user_projects(self, user_id, count, index) -> list[ProjectModel]:
+    def ensure_indexes(self):
+        self.database["projects"].create_indexes(PROJECT_INDEXES)
+        self.database["project_versions"].create_indexes(VERSION_INDEXES)
+
+    def get_user_projects(
+        self, user_id, count, after: tuple[datetime, str] | None = None
+    ) -> list[ProjectSummaryModel]:
         cursor = (
             self.database["projects"]
-            .find({"user_id": user_id})
-            .skip(index)
+            .find(user_projects_query(user_id, after), PROJECT_SUMMARY_PROJECTION)
+            .sort(PROJECT_LIST_SORT)
             .limit(count)
         )
-        return [ProjectModel(**project) for project in cursor]
+        return [ProjectSummaryModel(**project) for project in cursor]
 
     def get_project(self, project_id: str) -> ProjectModel:
-        return self.database["projects"].find_one({"project_id": project_id})
+        """The project with its head version materialized as `project_versions`."""
+        project = self.database["projects"].find_one({"project_id": project_id})
+        if project is None or "head_version" not in project:
+            # Not migrated yet: versions are still embedded
+            return project
+        head = self.get_project_version(project_id, project["head_version"])
+        project["project_versions"] = [head] if head else []
+        return project
+
+    def get_project_version(self, project_id: str, version: str) -> dict | None:
+        return self.database["project_versions"].find_one(
+            {"project_id": project_id, "version": version}, VERSION_PROJECTION
+        )
 
     def create_project(self, data: ProjectModel):
-        return self.database["projects"].insert_one(data.dict())
+        project, versions = split_project_document(data)
+        if versions:
+            self.database["project_versions"].insert_many(versions)
+        return self.database["projects"].insert_one(project)
 
     def update_project(self, project_id: str, update_data: dict):
         return self.database["projects"].update_one(
             {"project_id": project_id}, {"$set": update_data}
         )
+
+    def append_track(
+        self,
+        project_id: str,
+        revision: int,
+        head_version: str,
+        track: dict,
+        track_durations: dict[str, float] | None = None,
+    ) -> bool:
+        """Atomically append `track` to the head version; False if the version
+        changed since `revision` was read (re-read and retry)."""
+        query, update, array_filters = track_append_update(
+            project_id, revision, head_version, track, track_durations
+        )
+        self.migrate_project(project_id)
+        result = self.database["project_versions"].update_one(
+            query, update, array_filters=array_filters or None
+        )
+        if result.matched_count != 1:
+            return False
+        self.update_project(project_id, {"last_edited": datetime.now()})
+        return True
+
+    def _migrate(self, project: dict):
+        upserts, head_update = migrate_project_operations(project)
+        if upserts:
+            try:
+                self.database["project_versions"].bulk_write(upserts, ordered=False)
+            except BulkWriteError as e:
+                _raise_unless_duplicates(e)
+        self.database["projects"].update_one({"_id": project["_id"]}, head_update)
+
+    def migrate_project(self, project_id: str) -> bool:
+        """Migrate one project if its versions are still embedded, e.g. when
+        the startup migration couldn't reach Mongo. Edits call this first."""
+        project = self.database["projects"].find_one(
+            {"project_id": project_id, **EMBEDDED_VERSIONS}
+        )
+        if project is None:
+            return False
+        self._migrate(project)
+        return True
+
+    def migrate_embedded_versions(self) -> int:
+        """Move embedded `project_versions` arrays into the versions collection."""
+        migrated = 0
+        for project in self.database["projects"].find(EMBEDDED_VERSIONS):
+            self._migrate(project)
+            migrated += 1
+        return migrated
+
+
+class AsyncProjectRepository(AsyncBaseRepository):
+    """ProjectRepository for async code; every method is awaited."""
+
+    def __init__(self, mongo: AsyncMongoClientSingleton):
+        super().__init__(mongo)
+
+    async def ensure_indexes(self):
+        await self.database["projects"].create_indexes(PROJECT_INDEXES)
+        await self.database["project_versions"].create_indexes(VERSION_INDEXES)
+
+    async def get_user_projects(
+        self, user_id, count, after: tuple[datetime, str] | None = None
+    ) -> list[ProjectSummaryModel]:
+        cursor = (
+            self.database["projects"]
+            .find(user_projects_query(user_id, after), PROJECT_SUMMARY_PROJECTION)
+            .sort(PROJECT_LIST_SORT)
+            .limit(count)
+        )
+        return [ProjectSummaryModel(**project) async for project in cursor]
+
+    async def get_project(self, project_id: str) -> ProjectModel:
+        """The project with its head version materialized as `project_versions`."""
+        project = await self.database["projects"].find_one({"project_id": project_id})
+        if project is None or "head_version" not in project:
+            # Not migrated yet: versions are still embedded
+            return project
+        head = await self.get_project_version(project_id, project["head_version"])
+        project["project_versions"] = [head] if head else []
+        return project
+
+    async def get_project_version(self, project_id: str, version: str) -> dict | None:
+        return await self.database["project_versions"].find_one(
+            {"project_id": project_id, "version": version}, VERSION_PROJECTION
+        )
+
+    async def create_project(self, data: ProjectModel):
+        project, versions = split_project_document(data)
+        if versions:
+            await self.database["project_versions"].insert_many(versions)
+        return await self.database["projects"].insert_one(project)
+
+    async def update_project(self, project_id: str, update_data: dict):
+        return await self.database["projects"].update_one(
+            {"project_id": project_id}, {"$set": update_data}
+        )
+
+    async def append_track(
+        self,
+        project_id: str,
+        revision: int,
+        head_version: str,
+        track: dict,
+        track_durations: dict[str, float] | None = None,
+    ) -> bool:
+        """Atomically append `track` to the head version; False if the version
+        changed since `revision` was read (re-read and retry)."""
+        query, update, array_filters = track_append_update(
+            project_id, revision, head_version, track, track_durations
+        )
+        await self.migrate_project(project_id)
+        result = await self.database["project_versions"].update_one(
+            query, update, array_filters=array_filters or None
+        )
+        if result.matched_count != 1:
+            return False
+        await self.update_project(project_id, {"last_edited": datetime.now()})
+        return True
+
+    async def set_track_points(
+        self,
+        project_id: str,
+        revision: int,
+        head_version: str,
+        track_index: int,
+        in_point: float | None,
+        out_point: float | None,
+    ) -> bool:
+        """Atomically set a track's in/out points; False if the version
+        changed since `revision` was read (re-read and retry)."""
+        query, update = track_points_update(
+            project_id, revision, head_version, track_index, in_point, out_point
+        )
+        await self.migrate_project(project_id)
+        result = await self.database["project_versions"].update_one(query, update)
+        if result.matched_count != 1:
+            return False
+        await self.update_project(project_id, {"last_edited": datetime.now()})
+        return True
+
+    async def migrate_project(self, project_id: str) -> bool:
+        """Migrate one project if its versions are still embedded, e.g. when
+        the startup migration couldn't reach Mongo. Edits call this first."""
+        project = await self.database["projects"].find_one(
+            {"project_id": project_id, **EMBEDDED_VERSIONS}
+        )
+        if project is None:
+            return False
+        upserts, head_update = migrate_project_operations(project)
+        if upserts:
+            try:
+                await self.database["project_versions"].bulk_write(
+                    upserts, ordered=False
+                )
+            except BulkWriteError as e:
+                _raise_unless_duplicates(e)
+        await self.database["projects"].update_one({"_id": project["_id"]}, head_update)
+        return True
+
+    async def set_head_track_durations(
+        self, project_id: str, track_durations: dict[str, float]
+    ):
+        """Record probed durations on the head version's tracks."""
+        await self.migrate_project(project_id)
+        project = await self.database["projects"].find_one(
+            {"project_id": project_id}, {"head_version": 1}
+        )
+        if not project or not track_durations:
+            return None
+        update, array_filters = track_durations_update(track_durations)
+        return await self.database["project_versions"].update_one(
+            {"project_id": project_id, "version": project["head_version"]},
+            update,
+            array_filters=array_filters,
+        )
+
+    async def set_processing_stage(
+        self,
+        project_id: str,
+        stage: str,
+        status: str,
+        error: str | None = None,
+        result: dict | None = None,
+    ):
+        """Update one processing stage; starting it counts as an attempt."""
+        prefix = f"processing.{stage}"
+        update = {
+            "$set": {
+                f"{prefix}.status": status,
+                f"{prefix}.error": error,
+                f"{prefix}.updated_at": datetime.now(),
+            }
+        }
+        if result is not None:
+            update["$set"][f"{prefix}.result"] = result
+        if status == ProcessingStatus.RUNNING:
+            update["$inc"] = {f"{prefix}.attempts": 1}
+        return await self.database["projects"].update_one(
+            {"project_id": project_id}, update
+        )
+
+    async def get_processing(self, project_id: str) -> dict | None:
+        project = await self.database["projects"].find_one(
+            {"project_id": project_id}, {"_id": 0, "processing": 1}
+        )
+        return project.get("processing", {}) if project else None
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from src.repository.base_repository import AsyncBaseRepository
+from src.models.upload_model import UploadSessionModel, UploadStatus
+from src.services.mongo_client import AsyncMongoClientSingleton
+
+
+class AsyncUploadRepository(AsyncBaseRepository):
+    def __init__(self, mongo: AsyncMongoClientSingleton):
+        super().__init__(mongo)
+
+    async def create_session(self, data: UploadSessionModel):
+        return await self.database["upload_sessions"].insert_one(data.model_dump())
+
+    async def get_session(self, upload_id: str) -> UploadSessionModel | None:
+        session = await self.database["upload_sessions"].find_one(
+            {"upload_id": upload_id}, {"_id": 0}
+        )
+        return UploadSessionModel(**session) if session else None
+
+    async def mark_chunk_received(self, upload_id: str, index: int):
+        # $addToSet keeps concurrent chunk requests from overwriting each other
+        return await self.database["upload_sessions"].update_one(
+            {"upload_id": upload_id},
+            {
+                "$addToSet": {"received_chunks": index},
+                "$set": {"updated_at": datetime.now()},
+            },
+        )
+
+    async def mark_complete(self, upload_id: str) -> bool:
+        """Flip the session to complete; False if another request already did."""
+        result = await self.database["upload_sessions"].update_one(
+            {"upload_id": upload_id, "status": UploadStatus.UPLOADING},
+            {"$set": {"status": UploadStatus.COMPLETE, "updated_at": datetime.now()}},
+        )
+        return result.modified_count == 1
+
+    async def reopen(self, upload_id: str):
+        """Undo `mark_complete` when finalizing failed, so it can be retried."""
+        return await self.database["upload_sessions"].update_one(
+            {"upload_id": upload_id},
+            {"$set": {"status": UploadStatus.UPLOADING, "updated_at": datetime.now()}},
+        )
@@ -1,7 +1,24 @@
+import asyncio
+
 from google.genai import types
 
+from src.models.variant_model import (
+    VariantPlan,
+    VariantPrompt,
+    VariantResult,
+    VariantStatus,
+)
+from src.services.session_store import get_session_store
+
+
+async def call_agent(
+    query: str, runner, user_id: str, session_id: str, on_event=None
+):
+    """Run the agent for one query and return its final response text.
 
-async def call_agent(query: str, runner, user_id: str, session_id: str):
+    `on_event` is an optional coroutine function that receives a small progress
+    dict for every event the runner yields.
+    """
     print(f"Received query: {query}")
 
     # Ensure session exists before running agent
@@ -29,6 +46,10 @@ async def call_agent(query: str, runner, user_id: str, session_id: str):
         print(
             f"  [Event] Author: {event.author}, Type: {type(event).__name__}, Final: {event.is_final_response()}, Content: {event.content}"
         )
+        if on_event is not None:
+            await on_event(
+                {"author": event.author, "final": event.is_final_response()}
+            )
 
         if event.is_final_response():
             print(f"  [DEBUG] Final response event details:")
@@ -71,3 +92,97 @@ async def call_agent(query: str, runner, user_id: str, session_id: str):
                 )
 
     return final_response_text
+
+
+def variant_session_id(session_id: str, index: int) -> str:
+    return f"{session_id}_v{index}"
+
+
+def variant_query(variant: VariantPrompt) -> str:
+    # The layout the director uses, so the creators find their prompt in it
+    return (
+        f"**Image Prompt:** {variant.image_prompt}\n"
+        f"**Video Prompt:** {variant.video_prompt}"
+    )
+
+
+async def call_agent_variants(
+    query: str,
+    director_runner,
+    variant_runner,
+    user_id: str,
+    session_id: str,
+    variants: int,
+    max_concurrency: int,
+    on_event=None,
+    bypass_cache: bool = False,
+) -> list[VariantResult]:
+    """Plan `variants` takes on one query, then generate them side by side.
+
+    The director runs once in `session_id`. Each planned variant then runs
+    the image -> video agents in a session of its own, so the tools never
+    mix up the images of two variants, with at most `max_concurrency`
+    variants generating at once. A failed variant is reported in its result
+    and doesn't stop the others.
+    """
+    await call_agent(
+        query=f"{query}\n\nNumber of variants: {variants}",
+        runner=director_runner,
+        user_id=user_id,
+        session_id=session_id,
+        on_event=on_event,
+    )
+    session = await director_runner.session_service.get_session(
+        app_name=director_runner.app_name, user_id=user_id, session_id=session_id
+    )
+    plan = VariantPlan.model_validate(session.state.get("variant_plan") or {})
+    if not plan.variants:
+        raise ValueError("The director did not plan any variant")
+
+    results = [
+        VariantResult(
+            index=index,
+            session_id=variant_session_id(session_id, index),
+            image_prompt=variant.image_prompt,
+            video_prompt=variant.video_prompt,
+        )
+        for index, variant in enumerate(plan.variants[:variants])
+    ]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def report(result: VariantResult, event: dict | None = None):
+        if on_event is not None:
+            await on_event(
+                {"variant": result.index, "status": result.status, **(event or {})}
+            )
+
+    async def run(result: VariantResult, variant: VariantPrompt):
+        async with semaphore:
+            result.status = VariantStatus.RUNNING
+            await report(result)
+            if bypass_cache:
+                await get_session_store().set_bypass_cache(result.session_id, True)
+            try:
+                result.response = await call_agent(
+                    query=variant_query(variant),
+                    runner=variant_runner,
+                    user_id=user_id,
+                    session_id=result.session_id,
+                    on_event=lambda event: report(result, event),
+                )
+                result.generated_video_path = await get_session_store().get_video_path(
+                    result.session_id
+                )
+                if result.generated_video_path is None:
+                    result.error = "No video was generated"
+            except Exception as e:
+                result.error = str(e)
+            result.status = (
+                VariantStatus.FAILED if result.error else VariantStatus.SUCCEEDED
+            )
+            await report(result)
+
+    await asyncio.gather(
+        *(run(result, variant) for result, variant in zip(results, plan.variants))
+    )
+    return results
@@ -0,0 +1,253 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from logging import Logger
+from typing import AsyncIterator
+
+from src.global_constants import ASSETS_DIR
+from src.models.job_model import JobModel
+from src.repository.blob_repository import AsyncBlobRepository
+from src.services.job_queue import job_queue
+from src.services.mongo_client import AsyncMongoClientSingleton
+from src.services.probe_cache import probe_cache
+
+logger = Logger("blob_store")
+
+BLOB_GC_JOB = "blob_gc"
+
+BLOBS_DIR = os.path.join(ASSETS_DIR, "blobs")
+# Unreferenced blobs and stray temp files are kept this long before
+# collection, so an ingest that is still in flight never loses its blob
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+HASH_CHUNK_SIZE = 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl sharing extents between two files
+
+
+class BlobStore:
+    """Immutable files stored once under the sha256 of their contents.
+
+    Project files are hard links to their blob (or reflinks, or as a last
+    resort copies when the two are on different filesystems), so identical
+    footage takes its space once, and anything keyed by file identity, like
+    the probe cache, is shared by all its copies.
+    """
+
+    def __init__(self, directory: str = BLOBS_DIR):
+        self.directory = directory
+        self.temp_directory = os.path.join(directory, "tmp")
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def temp_file(self) -> tuple[int, str]:
+        os.makedirs(self.temp_directory, exist_ok=True)
+        return tempfile.mkstemp(prefix="ingest-", dir=self.temp_directory)
+
+    async def receive(self, stream: AsyncIterator[bytes]) -> tuple[str, str, int]:
+        """Write `stream` to a temp file, hashing it on the way in.
+
+        Returns (temp_path, digest, size); `commit` the temp path afterwards.
+        """
+        fd, temp_path = self.temp_file()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for piece in stream:
+                    digest.update(piece)
+                    size += len(piece)
+                    await asyncio.to_thread(f.write, piece)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, digest.hexdigest(), size
+
+    @staticmethod
+    def hash_file(full_path: str) -> tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        with open(full_path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size
+
+    def commit(self, source_path: str, digest: str, keep_source: bool = False) -> bool:
+        """Make `source_path` the blob for `digest` unless one already exists.
+
+        The blob is linked rather than copied from the source; the source is
+        removed afterwards unless `keep_source`. Returns True when the blob
+        is new.
+        """
+        blob_path = self.path_for(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.chmod(source_path, 0o444)
+            os.link(source_path, blob_path)
+            created = True
+        except FileExistsError:
+            created = False
+        if not keep_source:
+            os.remove(source_path)
+        # Every copy of this blob shares its inode, so it is hashed only once
+        probe_cache.put(blob_path, "sha256", digest)
+        return created
+
+    def materialize(self, digest: str, full_path: str):
+        """Put the contents of blob `digest` at `full_path`, replacing any file."""
+        blob_path = self.path_for(digest)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        temp_path = f"{full_path}.{os.getpid()}.link"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        try:
+            os.link(blob_path, temp_path)
+        except OSError:
+            # Hard links can't cross filesystems; a reflink still shares
+            # extents where supported, a copy always works
+            with open(blob_path, "rb") as source, open(temp_path, "wb") as target:
+                try:
+                    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+                except OSError:
+                    shutil.copyfileobj(source, target, HASH_CHUNK_SIZE)
+        os.replace(temp_path, full_path)
+        probe_cache.put(full_path, "sha256", digest)
+
+    def adopt(self, full_path: str, digest: str):
+        """Turn an existing file into a link to its blob. A duplicate of a
+        stored blob is replaced by a link, freeing its bytes."""
+        if self.commit(full_path, digest, keep_source=True):
+            return
+        if not os.path.samefile(full_path, self.path_for(digest)):
+            self.materialize(digest, full_path)
+
+    def stale_files(self, older_than: float) -> list[str]:
+        """Stray temp files, and blobs with no record, untouched since `older_than`."""
+        stale = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_mtime < older_than:
+                        stale.append(path)
+                except FileNotFoundError:
+                    pass
+        return stale
+
+
+blob_store = BlobStore()
+
+
+def _ref(full_path: str) -> str:
+    return os.path.relpath(full_path, ASSETS_DIR)
+
+
+async def store_file(full_path: str, digest: str | None = None) -> str:
+    """Move an existing file (a finished upload or download) into the blob
+    store, leaving a link in its place. Returns the digest.
+
+    Pass `digest` when the contents were already hashed on the way in.
+    """
+    if digest is None:
+        digest, size = await asyncio.to_thread(blob_store.hash_file, full_path)
+    else:
+        size = await asyncio.to_thread(os.path.getsize, full_path)
+    # Referenced before the blob is linked, so collection can't race us
+    async with AsyncBlobRepository(AsyncMongoClientSingleton()) as repository:
+        await repository.add_reference(digest, size, _ref(full_path))
+    await asyncio.to_thread(blob_store.adopt, full_path, digest)
+    return digest
+
+
+async def store_stream(stream: AsyncIterator[bytes], full_path: str) -> str:
+    """Store `stream` in the blob store and materialize it at `full_path`.
+
+    Hashing happens while the bytes arrive, so a duplicate costs no extra
+    pass over the data. Returns the digest.
+    """
+    temp_path, digest, size = await blob_store.receive(stream)
+    try:
+        async with AsyncBlobRepository(AsyncMongoClientSingleton()) as repository:
+            await repository.add_reference(digest, size, _ref(full_path))
+        await asyncio.to_thread(blob_store.commit, temp_path, digest)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    await asyncio.to_thread(blob_store.materialize, digest, full_path)
+    return digest
+
+
+async def link_blob(digest: str, full_path: str):
+    """Materialize a stored blob at `full_path` as one more reference to it."""
+    size = await asyncio.to_thread(os.path.getsize, blob_store.path_for(digest))
+    async with AsyncBlobRepository(AsyncMongoClientSingleton()) as repository:
+        await repository.add_reference(digest, size, _ref(full_path))
+    await asyncio.to_thread(blob_store.materialize, digest, full_path)
+
+
+async def collect_garbage(grace_seconds: int = BLOB_GC_GRACE_SECONDS) -> dict:
+    """Delete blobs that no file references any more.
+
+    References to files that no longer exist are dropped first. A blob has
+    to stay unreferenced for `grace_seconds` before it is deleted; blob and
+    temp files with no record at all get the same grace.
+    """
+    cutoff = datetime.now() - timedelta(seconds=grace_seconds)
+    dropped = 0
+    deleted = []
+    async with AsyncBlobRepository(AsyncMongoClientSingleton()) as repository:
+        known = set()
+        for digest, refs in await repository.get_references():
+            known.add(digest)
+            for ref in refs:
+                if not await asyncio.to_thread(
+                    os.path.exists, os.path.join(ASSETS_DIR, ref)
+                ):
+                    await repository.remove_reference(digest, ref)
+                    dropped += 1
+
+        for digest in await repository.get_unreferenced(before=cutoff):
+            if await repository.delete_unreferenced(digest, before=cutoff):
+                known.discard(digest)
+                deleted.append(digest)
+
+    freed = 0
+    for digest in deleted:
+        try:
+            freed += os.stat(blob_store.path_for(digest)).st_size
+            os.remove(blob_store.path_for(digest))
+        except FileNotFoundError:
+            pass
+
+    stale = await asyncio.to_thread(
+        blob_store.stale_files, time.time() - grace_seconds
+    )
+    orphans = [path for path in stale if os.path.basename(path) not in known]
+    for path in orphans:
+        try:
+            freed += os.stat(path).st_size
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    logger.info(f"Blob collection freed {freed} bytes")
+    return {
+        "dropped_references": dropped,
+        "deleted_blobs": len(deleted),
+        "deleted_orphans": len(orphans),
+        "freed_bytes": freed,
+    }
+
+
+async def run_blob_gc(job: JobModel, report) -> dict:
+    return await collect_garbage(
+        job.payload.get("grace_seconds", BLOB_GC_GRACE_SECONDS)
+    )
+
+
+job_queue.register_handler(BLOB_GC_JOB, run_blob_gc)
@@ -0,0 +1,176 @@
+import asyncio
+import hashlib
+import os
+import threading
+from typing import AsyncIterator
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(20 * 1024 * 1024 * 1024)))
+# Written chunks are read back this much at a time to hash them
+HASH_READ_SIZE = 1024 * 1024
+
+
+class ChunkError(Exception):
+    pass
+
+
+class ChunkIntegrityError(ChunkError):
+    pass
+
+
+def partial_path(full_path: str) -> str:
+    return f"{full_path}.part"
+
+
+def total_chunks(size: int, chunk_size: int) -> int:
+    return max(1, -(-size // chunk_size))
+
+
+def chunk_bounds(index: int, size: int, chunk_size: int) -> tuple[int, int]:
+    """(offset, length) of chunk `index` in a file of `size` bytes."""
+    if not 0 <= index < total_chunks(size, chunk_size):
+        raise ChunkError(f"Chunk {index} is out of range")
+    offset = index * chunk_size
+    return offset, min(chunk_size, size - offset)
+
+
+def allocate(full_path: str, size: int):
+    """Create the partial file at its final size so chunks can land anywhere.
+
+    The file is sparse until written, and lives next to its final name so
+    `finalize` is a rename rather than a copy.
+    """
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    _content_hashes.pop(full_path, None)
+    with open(partial_path(full_path), "wb") as f:
+        f.truncate(size)
+
+
+class UploadClosedError(ChunkError):
+    """The partial file is gone because the upload was completed."""
+
+
+def _pwrite_all(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+class _ContentHash:
+    """sha256 of an upload, advanced over the prefix of chunks written so far.
+
+    A chunk that lands right after the hashed prefix is hashed from memory
+    as it is written; one that arrives early is read back (from the page
+    cache) once the prefix reaches it. Completion then only has to hash what
+    other processes wrote, instead of the whole file.
+    """
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.hashed = 0
+        self.early: dict[int, int] = {}  # offset -> length, written not hashed
+        self.lock = threading.Lock()
+
+    def add(self, fd: int, offset: int, data: bytes):
+        with self.lock:
+            if offset > self.hashed:
+                self.early[offset] = len(data)
+                return
+            if offset < self.hashed:
+                return  # A retry of a chunk that is already hashed
+            self.digest.update(data)
+            self.hashed += len(data)
+            while self.hashed in self.early:
+                self._hash_from(fd, self.hashed + self.early.pop(self.hashed))
+
+    def _hash_from(self, fd: int, end: int | None = None):
+        while end is None or self.hashed < end:
+            size = HASH_READ_SIZE
+            if end is not None:
+                size = min(size, end - self.hashed)
+            data = os.pread(fd, size, self.hashed)
+            if not data:
+                break
+            self.digest.update(data)
+            self.hashed += len(data)
+
+
+_content_hashes: dict[str, _ContentHash] = {}
+
+
+def _commit_chunk(full_path: str, offset: int, data: bytes):
+    try:
+        fd = os.open(partial_path(full_path), os.O_RDWR)
+    except FileNotFoundError:
+        raise UploadClosedError("Upload is already complete")
+    try:
+        _pwrite_all(fd, data, offset)
+        _content_hashes.setdefault(full_path, _ContentHash()).add(fd, offset, data)
+    finally:
+        os.close(fd)
+
+
+async def write_chunk(
+    full_path: str,
+    offset: int,
+    length: int,
+    stream: AsyncIterator[bytes],
+    expected_sha256: str,
+):
+    """Receive one chunk from `stream` and write it into the partial file.
+
+    The chunk (at most MAX_UPLOAD_CHUNK_SIZE) is hashed as it streams in and
+    held in memory until its length and sha256 check out, then written once
+    at its own offset, so a corrupt retry never overwrites an accepted chunk
+    and any number of chunks can be accepted in parallel. Raises ChunkError
+    when the body is not exactly `length` bytes, ChunkIntegrityError when its
+    sha256 doesn't match and UploadClosedError when the upload was completed
+    in the meantime.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    async for piece in stream:
+        if len(buffer) + len(piece) > length:
+            raise ChunkError(f"Chunk is larger than {length} bytes")
+        digest.update(piece)
+        buffer += piece
+
+    if len(buffer) != length:
+        raise ChunkError(f"Chunk has {len(buffer)} bytes, expected {length}")
+    if digest.hexdigest() != expected_sha256.strip().lower():
+        raise ChunkIntegrityError("Chunk sha256 does not match")
+    await asyncio.to_thread(_commit_chunk, full_path, offset, bytes(buffer))
+
+
+def content_digest(full_path: str) -> str:
+    """sha256 of a fully received upload, before or after `finalize`.
+
+    Picks up the hash the chunks built while they were written; anything
+    this process didn't see, e.g. after a restart, is read from disk.
+    """
+    content_hash = _content_hashes.pop(full_path, None) or _ContentHash()
+    path = partial_path(full_path)
+    if not os.path.exists(path):
+        path = full_path  # Finalized by an earlier attempt
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        with content_hash.lock:
+            content_hash._hash_from(fd)
+    finally:
+        os.close(fd)
+    return content_hash.digest.hexdigest()
+
+
+def finalize(full_path: str):
+    """Flush the assembled file to disk and move it to its final name."""
+    if not os.path.exists(partial_path(full_path)) and os.path.exists(full_path):
+        return  # Finalized by an earlier attempt
+    fd = os.open(partial_path(full_path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.rename(partial_path(full_path), full_path)
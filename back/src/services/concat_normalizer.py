@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+from collections import Counter
+
+import ffmpeg
+
+from src.services.media_executor import run_process
+from src.services.probe_cache import probe_cache
+
+PROFILE_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+DEFAULT_PROFILE = {
+    "video_codec": "h264",
+    "width": 1280,
+    "height": 720,
+    "fps": "30/1",
+    "pix_fmt": "yuv420p",
+    "time_base": "1/15360",
+    "audio_codec": "aac",
+    "sample_rate": 44100,
+    "channels": 2,
+}
+
+
+def encoder_threads(parallel):
+    """Encoder threads for each of `parallel` encodes of one export, so that
+    together they use every CPU."""
+    return max(1, (os.cpu_count() or 1) // max(1, parallel))
+
+
+def clip_profile(full_path):
+    """The stream parameters that must match for a concat demuxer stream copy."""
+    probe_result = probe_cache.probe(full_path)
+    video = next(s for s in probe_result["streams"] if s["codec_type"] == "video")
+    audio = next(
+        (s for s in probe_result["streams"] if s["codec_type"] == "audio"), None
+    )
+    return {
+        "video_codec": video.get("codec_name"),
+        "width": int(video.get("width", 0)),
+        "height": int(video.get("height", 0)),
+        "fps": video.get("r_frame_rate"),
+        "pix_fmt": video.get("pix_fmt"),
+        "time_base": video.get("time_base"),
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "sample_rate": int(audio.get("sample_rate", 0)) if audio else None,
+        "channels": int(audio.get("channels", 0)) if audio else None,
+    }
+
+
+def target_profile(profiles):
+    """The profile most clips already have, so the fewest need transcoding.
+
+    Clips are only ever transcoded into a codec we can encode, and when any
+    clip has audio the target keeps an audio track (silent clips get one).
+    """
+    counts = Counter(json.dumps(profile, sort_keys=True) for profile in profiles)
+    target = dict(json.loads(counts.most_common(1)[0][0]))
+    if target["video_codec"] not in PROFILE_ENCODERS:
+        target.update(
+            {
+                key: DEFAULT_PROFILE[key]
+                for key in ("video_codec", "pix_fmt", "time_base")
+            }
+        )
+    if target["audio_codec"] is None and any(p["audio_codec"] for p in profiles):
+        with_audio = next(p for p in profiles if p["audio_codec"])
+        target.update(
+            {
+                "audio_codec": "aac",
+                "sample_rate": with_audio["sample_rate"],
+                "channels": with_audio["channels"],
+            }
+        )
+    elif target["audio_codec"] not in (None, "aac"):
+        target["audio_codec"] = "aac"
+    return target
+
+
+def content_hash(full_path):
+    """sha256 of the file contents, cached per file identity."""
+
+    def compute(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    return probe_cache.get(full_path, "sha256", compute)
+
+
+def segment_key(full_path, start, end, target):
+    """Render cache key of [start, end) of a clip rendered in `target`."""
+    key = json.dumps(
+        [content_hash(full_path), round(start, 3), round(end, 3), target],
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def transcode(
+    full_path, output_path, target, has_audio, threads, start=None, duration=None
+):
+    """Re-encode a clip (or the [start, start + duration) part of it) into `target`."""
+    fps = target["fps"]
+    width, height = target["width"], target["height"]
+    video_filter = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps}"
+    )
+    args = ["ffmpeg", "-y"]
+    if start is not None:
+        args += ["-ss", f"{start:.6f}"]
+    args += ["-i", full_path]
+    if target["audio_codec"] and not has_audio:
+        layout = "mono" if target["channels"] == 1 else "stereo"
+        args += [
+            "-f",
+            "lavfi",
+            "-i",
+            f"anullsrc=channel_layout={layout}:sample_rate={target['sample_rate']}",
+        ]
+    if duration is not None:
+        args += ["-t", f"{duration:.6f}"]
+    args += ["-map", "0:v:0"]
+    if target["audio_codec"]:
+        args += ["-map", "0:a:0" if has_audio else "1:a:0", "-shortest"]
+    args += [
+        "-vf",
+        video_filter,
+        "-c:v",
+        PROFILE_ENCODERS[target["video_codec"]],
+        "-pix_fmt",
+        target["pix_fmt"],
+        "-threads",
+        str(threads),
+    ]
+    if target["time_base"] and "/" in target["time_base"]:
+        args += ["-video_track_timescale", target["time_base"].split("/")[1]]
+    if target["audio_codec"]:
+        args += [
+            "-c:a",
+            "aac",
+            "-ar",
+            str(target["sample_rate"]),
+            "-ac",
+            str(target["channels"]),
+        ]
+    stdout, stderr, returncode = run_process([*args, output_path])
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", stdout, stderr)
@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import os
+import re
+from logging import Logger
+
+import httpx
+
+logger = Logger("download_manager")
+
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "4"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "5"))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DownloadIntegrityError(DownloadError):
+    pass
+
+
+class _Retry(Exception):
+    pass
+
+
+def partial_path(file_name: str) -> str:
+    return f"{file_name}.part"
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _hash_prefix(path: str, length: int):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = length
+        while remaining:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+class DownloadManager:
+    """Streams remote files to disk, resuming interrupted transfers.
+
+    Bytes go to `<file>.part` as they arrive and the file only appears under
+    its name, by an atomic rename, once its length (and sha256, when given)
+    checks out. After a dropped connection the next attempt asks for the
+    rest with a Range request, guarded by If-Range so a changed file starts
+    over. At most `concurrency` transfers run at once.
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        concurrency: int = DOWNLOAD_CONCURRENCY,
+        retries: int = DOWNLOAD_RETRIES,
+        retry_delay: float = 0.5,
+        max_retry_delay: float = 10.0,
+    ):
+        self._http = http
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+
+    async def download(
+        self,
+        url: str,
+        file_name: str,
+        expected_sha256: str | None = None,
+        expected_size: int | None = None,
+    ) -> str:
+        """Download `url` to `file_name` and return the path.
+
+        Raises DownloadIntegrityError when the result has the wrong length
+        or hash, DownloadError when the server refuses or retries run out.
+        Whatever arrived is deleted when the download fails for good.
+        """
+        async with self._semaphore:
+            state = {"validator": None, "digest": None, "hashed": 0}
+            delay = self.retry_delay
+            try:
+                for attempt in range(1, self.retries + 1):
+                    try:
+                        total = await self._attempt(url, file_name, state)
+                        break
+                    except (_Retry, httpx.TransportError) as e:
+                        if attempt == self.retries:
+                            raise DownloadError(
+                                f"Could not download {url} after {attempt} "
+                                f"attempts: {e}"
+                            ) from e
+                        logger.warning(
+                            f"Download of {url} interrupted ({e}); resuming"
+                        )
+                        await asyncio.sleep(delay)
+                        delay = min(delay * 2, self.max_retry_delay)
+            except BaseException:
+                # Also on cancellation: without its validator a later call
+                # couldn't safely resume the partial file
+                await asyncio.to_thread(_discard, partial_path(file_name))
+                raise
+
+            await asyncio.to_thread(
+                self._finish, file_name, total, state, expected_sha256, expected_size
+            )
+        return file_name
+
+    async def download_many(self, items: list[tuple[str, str]]) -> list[str]:
+        """Download (url, file_name) pairs, `concurrency` at a time."""
+        return await asyncio.gather(
+            *(self.download(url, file_name) for url, file_name in items)
+        )
+
+    async def _attempt(self, url: str, file_name: str, state: dict) -> int | None:
+        """Fetch whatever `<file>.part` is missing; returns the full size if known."""
+        part = partial_path(file_name)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if state["validator"]:
+                headers["If-Range"] = state["validator"]
+
+        async with self._http.stream("GET", url, headers=headers) as response:
+            if response.status_code in RETRYABLE_STATUS:
+                raise _Retry(f"status {response.status_code}")
+            if response.status_code == 416 and offset:
+                # Nothing past the end: the earlier attempt got everything
+                match = CONTENT_RANGE.match(response.headers.get("content-range", ""))
+                total = match and match.group(3)
+                if total and total != "*" and int(total) == offset:
+                    return offset
+                os.remove(part)
+                raise _Retry("stale partial file")
+            if response.status_code not in (200, 206):
+                raise DownloadError(
+                    f"Could not download {url}. Status code: {response.status_code}"
+                )
+
+            if response.status_code == 206:
+                match = CONTENT_RANGE.match(response.headers.get("content-range", ""))
+                if not match or int(match.group(1)) != offset:
+                    raise DownloadError(f"Unexpected Content-Range from {url}")
+                total = None if match.group(3) == "*" else int(match.group(3))
+            else:
+                offset = 0  # Full body: the server ignored or refused the range
+                length = response.headers.get("content-length")
+                total = int(length) if length is not None else None
+            state["validator"] = response.headers.get("etag") or response.headers.get(
+                "last-modified"
+            )
+
+            if state["digest"] is None or state["hashed"] != offset:
+                state["digest"] = (
+                    await asyncio.to_thread(_hash_prefix, part, offset)
+                    if offset
+                    else hashlib.sha256()
+                )
+                state["hashed"] = offset
+
+            with open(part, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                buffer = bytearray()
+                try:
+                    async for chunk in response.aiter_bytes():
+                        buffer += chunk
+                        if len(buffer) >= DOWNLOAD_CHUNK_SIZE:
+                            await self._write(f, buffer, state)
+                finally:
+                    # Keep what did arrive, so the retry resumes after it
+                    await self._write(f, buffer, state)
+        return total
+
+    @staticmethod
+    async def _write(f, buffer: bytearray, state: dict):
+        data = bytes(buffer)
+        buffer.clear()
+        state["digest"].update(data)
+        state["hashed"] += len(data)
+        await asyncio.to_thread(f.write, data)
+
+    @staticmethod
+    def _finish(file_name, total, state, expected_sha256, expected_size):
+        part = partial_path(file_name)
+        size = os.path.getsize(part)
+        problem = None
+        if total is not None and size != total:
+            problem = f"got {size} of {total} bytes"
+        elif expected_size is not None and size != expected_size:
+            problem = f"got {size} bytes, expected {expected_size}"
+        elif expected_sha256 is not None:
+            digest = state["digest"]
+            if state["hashed"] != size:
+                digest = _hash_prefix(part, size)
+            if digest.hexdigest() != expected_sha256.strip().lower():
+                problem = "sha256 does not match"
+        if problem:
+            os.remove(part)
+            raise DownloadIntegrityError(
+                f"Download of {file_name} is corrupt: {problem}"
+            )
+
+        fd = os.open(part, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(part, file_name)
@@ -0,0 +1,282 @@
+import asyncio
+import base64
+import json
+import os
+import time
+import uuid
+from collections.abc import AsyncIterator, Callable
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from dotenv import load_dotenv
+from logging import Logger
+
+from src.services.download_manager import DownloadError, DownloadManager
+
+logger = Logger("freepik_client")
+
+# get from environment variables
+load_dotenv()
+FREEPIK_API_KEY = os.getenv("FREEPICK_KEY")
+FREEPIK_BASE_URL = os.getenv("FREEPIK_BASE_URL", "https://api.freepik.com/v1")
+
+DEFAULT_TASK_TIMEOUT = 600  # 10 minutes
+# How long a generated asset URL stays valid when the URL doesn't say
+GENERATED_URL_TTL = int(os.getenv("FREEPIK_GENERATED_URL_TTL", "1800"))
+INLINE_CHUNK_SIZE = 3 * 256 * 1024  # A multiple of 3, so chunks encode alone
+
+
+class FreepikError(Exception):
+    """Raised when a Freepik request or task does not produce a result.
+
+    Network errors and timeouts are raised as this too, never as httpx errors.
+    """
+
+
+class FreepikTaskFailed(FreepikError):
+    pass
+
+
+class FreepikTimeout(FreepikError):
+    pass
+
+
+class InlineFile:
+    """A local file sent as a base64 data URL inside a JSON payload.
+
+    The request body is encoded while it is sent, so the file is never held
+    in memory whole, neither raw nor encoded.
+    """
+
+    def __init__(self, path: str, mime_type: str = "image/jpeg"):
+        self.path = path
+        self.prefix = f"data:{mime_type};base64,".encode()
+
+    def encoded_size(self) -> int:
+        return len(self.prefix) + 4 * -(-os.path.getsize(self.path) // 3)
+
+    async def encode(self):
+        yield self.prefix
+        with open(self.path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, INLINE_CHUNK_SIZE):
+                yield base64.b64encode(chunk)
+
+
+def _json_body(payload: dict) -> tuple[int, Callable[[], AsyncIterator[bytes]]]:
+    """Content length and a body factory for a payload holding InlineFiles."""
+    tokens = {
+        key: f"inline-{uuid.uuid4().hex}"
+        for key, value in payload.items()
+        if isinstance(value, InlineFile)
+    }
+    rest = json.dumps({key: tokens.get(key, value) for key, value in payload.items()})
+    parts = []
+    for key, token in tokens.items():
+        before, rest = rest.split(token)
+        parts += [before.encode(), payload[key]]
+    parts.append(rest.encode())
+    length = sum(
+        part.encoded_size() if isinstance(part, InlineFile) else len(part)
+        for part in parts
+    )
+
+    async def body():
+        for part in parts:
+            if isinstance(part, InlineFile):
+                async for chunk in part.encode():
+                    yield chunk
+            else:
+                yield part
+
+    return length, body
+
+
+def url_expiry(url: str, default_ttl: int = GENERATED_URL_TTL) -> float:
+    """When a (signed) asset URL stops working, as a unix timestamp.
+
+    Understands S3 and GCS V4 signatures and a plain `Expires` timestamp;
+    anything else is assumed valid for `default_ttl` from now.
+    """
+    query = {
+        key.lower(): values[0] for key, values in parse_qs(urlsplit(url).query).items()
+    }
+    for prefix in ("x-amz", "x-goog"):
+        signed_at = query.get(f"{prefix}-date")
+        expires = query.get(f"{prefix}-expires")
+        if signed_at and expires and expires.isdigit():
+            try:
+                start = datetime.strptime(signed_at, "%Y%m%dT%H%M%SZ")
+            except ValueError:
+                continue
+            return start.replace(tzinfo=timezone.utc).timestamp() + int(expires)
+    if query.get("expires", "").isdigit():
+        return float(query["expires"])
+    return time.time() + default_ttl
+
+
+class FreepikClient:
+    """Async client for Freepik's task based generation endpoints.
+
+    A task is created with a POST to the model endpoint and then polled on
+    `<endpoint>/<task_id>` until it is COMPLETED. Polling backs off from
+    `initial_interval` up to `max_interval` so long video renders don't hammer
+    the API. All requests share one pooled `httpx.AsyncClient`, and every wait
+    is an `await`, so cancelling the calling task stops polling immediately.
+    """
+
+    def __init__(
+        self,
+        base_url: str = FREEPIK_BASE_URL,
+        api_key: str | None = FREEPIK_API_KEY,
+        max_connections: int = 20,
+        request_timeout: float = 30.0,
+        initial_interval: float = 1.0,
+        max_interval: float = 10.0,
+        backoff_factor: float = 1.5,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self._http = httpx.AsyncClient(
+            headers={"x-freepik-api-key": f"{api_key}"},
+            timeout=httpx.Timeout(request_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            follow_redirects=True,
+        )
+        self._downloads = DownloadManager(self._http)
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        return self._http
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def create_task(self, path: str, payload: dict) -> dict:
+        """Create a generation task and return its `data` block.
+
+        InlineFile values in `payload` are streamed into the body as base64.
+        """
+        try:
+            if any(isinstance(value, InlineFile) for value in payload.values()):
+                length, body = _json_body(payload)
+                response = await self._http.post(
+                    f"{self.base_url}/{path}",
+                    content=body(),
+                    headers={
+                        "content-type": "application/json",
+                        "content-length": str(length),
+                    },
+                )
+            else:
+                response = await self._http.post(
+                    f"{self.base_url}/{path}", json=payload
+                )
+        except httpx.HTTPError as e:
+            raise FreepikError(f"Error while creating task on {path}: {e!r}") from e
+        if response.status_code != 200:
+            raise FreepikError(
+                f"Error while creating task on {path}. Status code: "
+                f"{response.status_code}, message: {_error_message(response)}"
+            )
+        return response.json()["data"]
+
+    async def get_task(self, path: str, task_id: str) -> dict | None:
+        """Return the task `data` block, or None on a non-200 response or a
+        network error; `wait_for_task` keeps polling until its deadline."""
+        try:
+            response = await self._http.get(f"{self.base_url}/{path}/{task_id}")
+        except httpx.HTTPError as e:
+            logger.warning(f"Error while checking the task status: {e!r}")
+            return None
+        if response.status_code != 200:
+            logger.warning(
+                f"Error while checking the task status: {response.status_code}"
+            )
+            return None
+        return response.json()["data"]
+
+    async def wait_for_task(
+        self, path: str, task: dict, timeout: float = DEFAULT_TASK_TIMEOUT
+    ) -> dict:
+        """Poll a task until it is COMPLETED, backing off between checks."""
+        task_id = task["task_id"]
+        status = task.get("status")
+        interval = self.initial_interval
+        deadline = time.monotonic() + timeout
+
+        while status != "COMPLETED":
+            if status == "FAILED":
+                raise FreepikTaskFailed(f"Task {task_id} on {path} failed")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise FreepikTimeout(
+                    f"Task {task_id} on {path} did not complete in {timeout}s"
+                )
+            print(f"Waiting for the task to complete... (current status: {status})")
+            await asyncio.sleep(min(interval, remaining))
+            interval = min(interval * self.backoff_factor, self.max_interval)
+
+            data = await self.get_task(path, task_id)
+            if data is not None:
+                task = data
+                status = data.get("status")
+
+        return task
+
+    async def run_task(
+        self, path: str, payload: dict, timeout: float = DEFAULT_TASK_TIMEOUT
+    ) -> list[str]:
+        """Create a task, wait for it and return the generated asset URLs."""
+        task = await self.create_task(path, payload)
+        task = await self.wait_for_task(path, task, timeout=timeout)
+        generated = task.get("generated")
+        if not generated:
+            raise FreepikError(f"Task {task['task_id']} returned no generated assets")
+        return generated
+
+    async def download(
+        self, url: str, file_name: str, expected_sha256: str | None = None
+    ) -> str:
+        """Stream a generated asset to `file_name` and return the path.
+
+        Interrupted transfers are resumed; see DownloadManager.
+        """
+        try:
+            return await self._downloads.download(
+                url, file_name, expected_sha256=expected_sha256
+            )
+        except DownloadError as e:
+            raise FreepikError(str(e)) from e
+        except httpx.HTTPError as e:
+            raise FreepikError(f"Error while downloading {url}: {e!r}") from e
+
+
+def _error_message(response: httpx.Response) -> str:
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text
+
+
+_client: FreepikClient | None = None
+
+
+def get_freepik_client() -> FreepikClient:
+    """Return the process wide client so every tool call shares one pool."""
+    global _client
+    if _client is None:
+        _client = FreepikClient()
+    return _client
+
+
+async def close_freepik_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
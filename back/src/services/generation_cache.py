@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from logging import Logger
+
+from src.global_constants import ASSETS_DIR
+from src.repository.generation_cache_repository import AsyncGenerationCacheRepository
+from src.services.blob_store import blob_store, link_blob
+from src.services.mongo_client import AsyncMongoClientSingleton
+
+logger = Logger("generation_cache")
+
+GENERATION_CACHE_DIR = os.path.join(ASSETS_DIR, "generation_cache")
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true") == "true"
+GENERATION_CACHE_TTL = int(os.getenv("GENERATION_CACHE_TTL", str(7 * 24 * 3600)))
+GENERATION_CACHE_BUDGET_MB = int(os.getenv("GENERATION_CACHE_BUDGET_MB", "5120"))
+# Seconds between budget checks; the cache may overshoot its budget meanwhile
+GENERATION_CACHE_EVICT_INTERVAL = int(
+    os.getenv("GENERATION_CACHE_EVICT_INTERVAL", "300")
+)
+# Cache files linked this recently may still be waiting for their entry
+LINK_GRACE_SECONDS = 60
+
+
+def _normalize(value):
+    """Make requests that only differ in spacing or number types hash alike."""
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def generation_key(endpoint: str, payload: dict) -> str:
+    """sha256 of the endpoint and normalized payload. Large inputs like a
+    source image belong in the payload as their hash, not their bytes."""
+    normalized = json.dumps(
+        [endpoint.strip("/"), _normalize(payload)],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class GenerationCache:
+    """Generated assets kept by the request that produced them.
+
+    Each entry keeps a link to its blob under GENERATION_CACHE_DIR, which
+    keeps the blob alive; a hit links the same blob to the new file, so a
+    repeated prompt costs a database lookup and a hard link. Entries expire
+    after `ttl` seconds through a TTL index. At most every `evict_interval`
+    seconds an insert checks the budget, evicting the least recently used
+    entries and removing the links of expired ones.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = GENERATION_CACHE_ENABLED,
+        ttl: int = GENERATION_CACHE_TTL,
+        budget_bytes: int = GENERATION_CACHE_BUDGET_MB * 1024 * 1024,
+        evict_interval: int = GENERATION_CACHE_EVICT_INTERVAL,
+    ):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.budget_bytes = budget_bytes
+        self.evict_interval = evict_interval
+        self._evicted_at = None
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    async def fetch(self, key: str, file_name: str, bypass: bool = False) -> bool:
+        """Put the cached result for `key` at `file_name`; False on a miss."""
+        if bypass or not self.enabled:
+            self.bypassed += 1
+            return False
+        async with AsyncGenerationCacheRepository(
+            AsyncMongoClientSingleton()
+        ) as repository:
+            entry = await repository.get_entry(key)
+            if entry is not None and not await asyncio.to_thread(
+                os.path.exists, blob_store.path_for(entry["digest"])
+            ):
+                await repository.delete_entry(key)
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return False
+
+        await link_blob(entry["digest"], file_name)
+        self.hits += 1
+        logger.info(f"Generation cache hit for {entry['endpoint']}")
+        return True
+
+    async def put(self, key: str, endpoint: str, file_name: str, digest: str):
+        """Remember `file_name` (already in the blob store) as the result of `key`."""
+        if not self.enabled:
+            return
+        extension = os.path.splitext(file_name)[1]
+        cache_file = os.path.join(GENERATION_CACHE_DIR, f"{key}{extension}")
+        await link_blob(digest, cache_file)
+        size = await asyncio.to_thread(os.path.getsize, cache_file)
+        async with AsyncGenerationCacheRepository(
+            AsyncMongoClientSingleton()
+        ) as repository:
+            await repository.put_entry(
+                key,
+                endpoint,
+                os.path.relpath(cache_file, ASSETS_DIR),
+                digest,
+                size,
+                datetime.now() + timedelta(seconds=self.ttl),
+            )
+            now = time.monotonic()
+            if (
+                self._evicted_at is not None
+                and now - self._evicted_at < self.evict_interval
+            ):
+                return
+            self._evicted_at = now
+            evicted = [
+                os.path.join(ASSETS_DIR, file)
+                for file in await repository.evict(self.budget_bytes)
+            ]
+            evicted += await self._expired_files(repository)
+        for path in evicted:
+            # The blob store drops the reference on its next collection
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def _expired_files(self, repository) -> list[str]:
+        """Cache files whose entry the TTL index has deleted."""
+        now = time.time()
+
+        def settled_files():
+            try:
+                names = os.listdir(GENERATION_CACHE_DIR)
+            except FileNotFoundError:
+                return {}
+            files = {}
+            for name in names:
+                path = os.path.join(GENERATION_CACHE_DIR, name)
+                try:
+                    # Linking a file updates its ctime, even for an old blob
+                    if os.stat(path).st_ctime < now - LINK_GRACE_SECONDS:
+                        files[os.path.splitext(name)[0]] = path
+                except FileNotFoundError:
+                    pass
+            return files
+
+        files = await asyncio.to_thread(settled_files)
+        if not files:
+            return []
+        live = await repository.live_keys(list(files))
+        return [path for key, path in files.items() if key not in live]
+
+    async def usage(self) -> dict:
+        async with AsyncGenerationCacheRepository(
+            AsyncMongoClientSingleton()
+        ) as repository:
+            return {**await repository.usage(), **self.metrics()}
+
+
+generation_cache = GenerationCache()
@@ -0,0 +1,519 @@
+import asyncio
+import functools
+import hashlib
+import json
+import math
+import os
+import tempfile
+import threading
+from array import array
+from logging import Logger
+
+import ffmpeg
+
+from src.global_constants import ASSETS_DIR
+from src.services.media_executor import (
+    MediaExecutor,
+    MediaExecutorError,
+    MediaQueueFull,
+    media_executor,
+    run_process,
+)
+from src.services.probe_cache import probe_cache
+from src.services.render_cache import RenderCache
+
+logger = Logger("hls_packager")
+
+HLS_DIR = os.path.join(ASSETS_DIR, "hls")
+HLS_MANIFEST_DIR = os.path.join(HLS_DIR, "manifests")
+HLS_SEGMENT_SECONDS = float(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+HLS_CACHE_BUDGET_MB = int(os.getenv("HLS_CACHE_BUDGET_MB", "10240"))
+HLS_AUDIO_CACHE_BUDGET_MB = int(os.getenv("HLS_AUDIO_CACHE_BUDGET_MB", "1024"))
+# Segments encoded ahead of the one a player asks for
+HLS_PREFETCH_SEGMENTS = int(os.getenv("HLS_PREFETCH_SEGMENTS", "2"))
+# Prefetching has its own small pool, so it never takes the media executor
+# slots that requests (segments a player is waiting for included) need
+HLS_PREFETCH_WORKERS = int(os.getenv("HLS_PREFETCH_WORKERS", "1"))
+HLS_FPS = 30
+HLS_AUDIO_SAMPLE_RATE = 48000
+AAC_FRAME_SAMPLES = 1024
+AAC_PRIMING_FRAMES = 1  # The encoder delay of ffmpeg's AAC encoder
+# H.264 High@4.0 + AAC-LC, which every rung below is encoded as
+HLS_CODECS = "avc1.640028,mp4a.40.2"
+HLS_LADDER = [
+    {"name": "360p", "height": 360, "video_bitrate": 800_000, "audio_bitrate": 96_000},
+    {"name": "540p", "height": 540, "video_bitrate": 1_800_000, "audio_bitrate": 128_000},
+    {"name": "720p", "height": 720, "video_bitrate": 3_500_000, "audio_bitrate": 128_000},
+    {"name": "1080p", "height": 1080, "video_bitrate": 6_000_000, "audio_bitrate": 192_000},
+]
+# Bumped whenever the encoding changes, so old cached segments are not reused
+HLS_FORMAT_VERSION = 2
+
+segment_cache = RenderCache(
+    os.path.join(HLS_DIR, "segments"), HLS_CACHE_BUDGET_MB * 1024 * 1024, suffix=".ts"
+)
+audio_cache = RenderCache(
+    os.path.join(HLS_DIR, "audio"),
+    HLS_AUDIO_CACHE_BUDGET_MB * 1024 * 1024,
+    suffix=".aac",
+)
+_audio_locks: dict[str, threading.Lock] = {}
+_audio_locks_lock = threading.Lock()
+prefetch_executor = MediaExecutor(
+    workers=HLS_PREFETCH_WORKERS, queue_limit=HLS_PREFETCH_WORKERS * 2
+)
+
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def ladder_for(width, height, ladder=HLS_LADDER):
+    """The rungs of `ladder` for a source of `width`x`height`, never upscaled.
+
+    Every rung keeps the source aspect ratio; a source smaller than the lowest
+    rung still gets that one so there is always something to play.
+    """
+    rungs = [rung for rung in ladder if rung["height"] <= height] or ladder[:1]
+    return [
+        {**rung, "width": _even(rung["height"] * width / height)} for rung in rungs
+    ]
+
+
+def plan_segments(sources, segment_seconds=HLS_SEGMENT_SECONDS):
+    """Split (video_path, start, end) sources into HLS segments on one timeline.
+
+    Segments never span two sources, so each is cut from a single file; a
+    tail shorter than half a segment is merged into the one before it.
+    `offset` is where the segment starts on the output timeline.
+    """
+    segments = []
+    offset = 0.0
+    for video_path, start, end in sources:
+        count = max(1, math.floor((end - start) / segment_seconds + 0.5))
+        for index in range(count):
+            segment_start = start + index * segment_seconds
+            segment_end = end if index == count - 1 else segment_start + segment_seconds
+            duration = round(segment_end - segment_start, 6)
+            segments.append(
+                {
+                    "source": video_path,
+                    "start": round(segment_start, 6),
+                    "duration": duration,
+                    "offset": round(offset, 6),
+                }
+            )
+            offset += duration
+    return segments
+
+
+def master_playlist(renditions):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for rendition in renditions:
+        bandwidth = rendition["video_bitrate"] + rendition["audio_bitrate"]
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},"
+            f"RESOLUTION={rendition['width']}x{rendition['height']},"
+            f'FRAME-RATE={HLS_FPS:.3f},CODECS="{HLS_CODECS}"'
+        )
+        lines.append(f"{rendition['name']}.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def media_playlist(rendition, segments):
+    """A complete VOD playlist. Every segment is listed up front even though
+    it is only encoded when first requested."""
+    target_duration = math.ceil(max(segment["duration"] for segment in segments))
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    for index, segment in enumerate(segments):
+        lines.append(f"#EXTINF:{segment['duration']:.6f},")
+        lines.append(f"{rendition['name']}/{index}.ts")
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def _source_range(full_path, in_point, out_point):
+    duration = float(probe_cache.probe(full_path)["format"]["duration"])
+    start = max(in_point or 0.0, 0.0)
+    end = duration if out_point is None else min(out_point, duration)
+    if end <= start:
+        raise ValueError(f"Empty range [{start}, {end}) of {full_path}")
+    return start, end
+
+
+def _has_audio(full_path):
+    return any(
+        stream["codec_type"] == "audio"
+        for stream in probe_cache.probe(full_path)["streams"]
+    )
+
+
+def _video_size(full_path):
+    video = next(
+        s for s in probe_cache.probe(full_path)["streams"] if s["codec_type"] == "video"
+    )
+    return int(video["width"]), int(video["height"])
+
+
+def build_manifest(sources):
+    """Plan the package of (video_path, in_point, out_point) sources.
+
+    The manifest is stored under a key derived from the identity of every
+    source file and the cut points, so its playlists and segments never
+    change and can be cached forever. Returns the manifest.
+    """
+    ranges = []
+    identities = []
+    for video_path, in_point, out_point in sources:
+        full_path = os.path.join(ASSETS_DIR, video_path)
+        start, end = _source_range(full_path, in_point, out_point)
+        stat_result = os.stat(full_path)
+        ranges.append((video_path, start, end))
+        identities.append(
+            [video_path, stat_result.st_size, stat_result.st_mtime_ns, start, end]
+        )
+
+    key = hashlib.sha256(
+        json.dumps(
+            [identities, HLS_SEGMENT_SECONDS, HLS_LADDER, HLS_FORMAT_VERSION]
+        ).encode()
+    ).hexdigest()
+    manifest_path = os.path.join(HLS_MANIFEST_DIR, f"{key}.json")
+    if os.path.exists(manifest_path):
+        return load_manifest(key)
+
+    width, height = _video_size(os.path.join(ASSETS_DIR, ranges[0][0]))
+    manifest = {
+        "key": key,
+        "renditions": ladder_for(width, height),
+        "segments": plan_segments(ranges),
+    }
+    os.makedirs(HLS_MANIFEST_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".json", dir=HLS_MANIFEST_DIR)
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path)
+    return manifest
+
+
+_manifests: dict[str, dict] = {}
+
+
+def load_manifest(key):
+    """The stored manifest for `key`, or None. Manifests never change, so
+    each is read from disk once."""
+    if key not in _manifests:
+        try:
+            with open(os.path.join(HLS_MANIFEST_DIR, f"{key}.json")) as f:
+                _manifests[key] = json.load(f)
+        except FileNotFoundError:
+            return None
+    return _manifests[key]
+
+
+def source_ranges(segments):
+    """(source, start, duration) runs of consecutive segments cut from one
+    stretch of one file, in timeline order."""
+    ranges = []
+    for segment in segments:
+        if ranges:
+            source, start, duration = ranges[-1]
+            if (
+                source == segment["source"]
+                and abs(start + duration - segment["start"]) < 1e-3
+            ):
+                ranges[-1] = (source, start, round(duration + segment["duration"], 6))
+                continue
+        ranges.append((segment["source"], segment["start"], segment["duration"]))
+    return ranges
+
+
+def render_audio(manifest, rendition, output_path):
+    """Encode the audio of the whole timeline as one continuous AAC stream.
+
+    Encoding each segment's audio on its own restarts the encoder with
+    priming samples at every boundary, which clicks. Segments instead copy
+    their AAC frames out of this stream, so playback decodes one unbroken
+    stream; clips without audio contribute silence.
+    """
+    args = ["ffmpeg", "-y"]
+    filters = []
+    ranges = source_ranges(manifest["segments"])
+    for index, (source, start, duration) in enumerate(ranges):
+        full_path = os.path.join(ASSETS_DIR, source)
+        if _has_audio(full_path):
+            args += ["-ss", f"{start:.6f}", "-t", f"{duration:.6f}", "-i", full_path]
+        else:
+            args += [
+                "-f",
+                "lavfi",
+                "-t",
+                f"{duration:.6f}",
+                "-i",
+                f"anullsrc=channel_layout=stereo:sample_rate={HLS_AUDIO_SAMPLE_RATE}",
+            ]
+        # Padded/trimmed to the exact video duration so the clips stay in sync
+        filters.append(
+            f"[{index}:a:0]aresample={HLS_AUDIO_SAMPLE_RATE},"
+            "aformat=sample_fmts=fltp:channel_layouts=stereo,"
+            f"apad,atrim=end={duration:.6f},asetpts=N/SR/TB[a{index}]"
+        )
+    inputs = "".join(f"[a{index}]" for index in range(len(ranges)))
+    filters.append(f"{inputs}concat=n={len(ranges)}:v=0:a=1[audio]")
+    args += [
+        "-filter_complex",
+        ";".join(filters),
+        "-map",
+        "[audio]",
+        "-c:a",
+        "aac",
+        "-b:a",
+        str(rendition["audio_bitrate"]),
+        "-ar",
+        str(HLS_AUDIO_SAMPLE_RATE),
+        "-ac",
+        "2",
+        "-f",
+        "adts",
+        output_path,
+    ]
+    stdout, stderr, returncode = run_process(args)
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", stdout, stderr)
+
+
+def adts_frame_offsets(data):
+    """Byte offset of every ADTS frame in `data`, plus the end offset."""
+    offsets = array("Q")
+    position = 0
+    while position + 7 <= len(data):
+        if data[position] != 0xFF or data[position + 1] & 0xF0 != 0xF0:
+            raise ValueError(f"No ADTS frame at byte {position}")
+        offsets.append(position)
+        position += (
+            (data[position + 3] & 0x03) << 11
+            | data[position + 4] << 3
+            | data[position + 5] >> 5
+        )
+    offsets.append(position)
+    return offsets
+
+
+@functools.lru_cache(maxsize=64)
+def _audio_index(path, size, mtime_ns):
+    with open(path, "rb") as f:
+        return adts_frame_offsets(f.read())
+
+
+def audio_frame(seconds):
+    """The AAC frame of the timeline that starts closest to `seconds`."""
+    return round(seconds * HLS_AUDIO_SAMPLE_RATE / AAC_FRAME_SAMPLES)
+
+
+def audio_slice(audio_path, first_frame, end_frame=None):
+    """The ADTS bytes that play timeline frames [first_frame, end_frame).
+
+    The encoder's first frame is priming, so timeline frame n is stream
+    frame n + 1; None runs to the end of the stream.
+    """
+    stat_result = os.stat(audio_path)
+    offsets = _audio_index(audio_path, stat_result.st_size, stat_result.st_mtime_ns)
+    frames = len(offsets) - 1
+    first = min(first_frame + AAC_PRIMING_FRAMES, frames)
+    end = frames if end_frame is None else min(end_frame + AAC_PRIMING_FRAMES, frames)
+    with open(audio_path, "rb") as f:
+        f.seek(offsets[first])
+        return f.read(offsets[end] - offsets[first])
+
+
+def _audio_key(manifest, rendition):
+    return f"{manifest['key']}-{rendition['name']}"
+
+
+def _pinned_audio(manifest, rendition):
+    """Path of the rendition's continuous audio, pinned; encoded once even
+    when several segments ask for it at the same time."""
+    key = _audio_key(manifest, rendition)
+    with _audio_locks_lock:
+        lock = _audio_locks.setdefault(key, threading.Lock())
+    with lock:
+        return audio_cache.get_or_render(
+            key, lambda output_path: render_audio(manifest, rendition, output_path)
+        )
+
+
+def render_segment(manifest, rendition, index, output_path):
+    """Encode one segment of one rendition as MPEG-TS.
+
+    Timestamps are shifted to the segment's place on the output timeline and
+    each segment starts on a keyframe, so segments encoded independently (and
+    in any order) play back as one continuous stream. The audio is copied
+    from the rendition's continuous AAC stream, cut on AAC frame boundaries
+    next to the segment's.
+    """
+    segment = manifest["segments"][index]
+    full_path = os.path.join(ASSETS_DIR, segment["source"])
+    width, height = rendition["width"], rendition["height"]
+    first_frame = audio_frame(segment["offset"])
+    end_frame = None
+    if index + 1 < len(manifest["segments"]):
+        end_frame = audio_frame(manifest["segments"][index + 1]["offset"])
+
+    audio_path = _pinned_audio(manifest, rendition)
+    try:
+        with tempfile.NamedTemporaryFile(
+            suffix=".aac", dir=os.path.dirname(output_path)
+        ) as audio_part:
+            audio_part.write(audio_slice(audio_path, first_frame, end_frame))
+            audio_part.flush()
+            audio_start = first_frame * AAC_FRAME_SAMPLES / HLS_AUDIO_SAMPLE_RATE
+            args = [
+                "ffmpeg",
+                "-y",
+                "-ss",
+                f"{segment['start']:.6f}",
+                "-t",
+                f"{segment['duration']:.6f}",
+                "-i",
+                full_path,
+                # Raw ADTS gets exact timestamps from its frame count
+                "-itsoffset",
+                f"{audio_start - segment['offset']:.6f}",
+                "-f",
+                "aac",
+                "-i",
+                audio_part.name,
+                "-map",
+                "0:v:0",
+                "-map",
+                "1:a:0",
+                "-vf",
+                f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={HLS_FPS}",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-profile:v",
+                "high",
+                "-level:v",
+                "4.0",
+                "-pix_fmt",
+                "yuv420p",
+                "-b:v",
+                str(rendition["video_bitrate"]),
+                "-maxrate",
+                str(rendition["video_bitrate"]),
+                "-bufsize",
+                str(rendition["video_bitrate"] * 2),
+                "-force_key_frames",
+                "expr:eq(n,0)",
+                "-c:a",
+                "copy",
+                # Shifting away negative B-frame timestamps would move only the
+                # first segment (the others start past 0), breaking continuity
+                "-avoid_negative_ts",
+                "disabled",
+                "-output_ts_offset",
+                f"{segment['offset']:.6f}",
+                "-f",
+                "mpegts",
+                output_path,
+            ]
+            stdout, stderr, returncode = run_process(args)
+            if returncode != 0:
+                raise ffmpeg.Error("ffmpeg", stdout, stderr)
+    finally:
+        audio_cache.release(audio_path)
+
+
+def find_rendition(manifest, name):
+    return next((r for r in manifest["renditions"] if r["name"] == name), None)
+
+
+def _segment_key(manifest, rendition, index):
+    return f"{manifest['key']}-{rendition['name']}-{index}"
+
+
+def _render_cached(manifest, rendition, index):
+    path = segment_cache.get_or_render(
+        _segment_key(manifest, rendition, index),
+        lambda output_path: render_segment(manifest, rendition, index, output_path),
+    )
+    # Whoever serves the segment pins it again with `acquire`
+    segment_cache.release(path)
+    return path
+
+
+class SegmentPackager:
+    """Encodes segments on demand, at most once each at a time, and keeps
+    the next few of a rendition encoding ahead of the player. Prefetches run
+    on the small `prefetch_executor` and are skipped when it is busy, so
+    they never crowd out requests on the media executor."""
+
+    def __init__(self, prefetch=HLS_PREFETCH_SEGMENTS):
+        self.prefetch = prefetch
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def _render(self, manifest, rendition, index, prefetch=False) -> asyncio.Task:
+        key = _segment_key(manifest, rendition, index)
+        task = self._in_flight.get(key)
+        if task is None:
+            render = _prefetch_render if prefetch else media_executor.run
+            task = asyncio.ensure_future(
+                render(_render_cached, manifest, rendition, index)
+            )
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return task
+
+    async def get_segment(self, manifest, rendition, index) -> str:
+        """Path of the segment, pinned so eviction leaves it alone while it
+        is sent; `segment_cache.release` it once the response is done."""
+        key = _segment_key(manifest, rendition, index)
+        path = segment_cache.acquire(key)
+        while path is None:
+            # Shielded: a player that gives up doesn't waste the encode
+            await asyncio.shield(self._render(manifest, rendition, index))
+            # None if it was evicted again before we could pin it, or this
+            # was a prefetch that had no room to run; render it (again) then
+            path = segment_cache.acquire(key)
+        self._prefetch(manifest, rendition, index)
+        return path
+
+    def _prefetch(self, manifest, rendition, index):
+        last = min(index + self.prefetch, len(manifest["segments"]) - 1)
+        for next_index in range(index + 1, last + 1):
+            key = _segment_key(manifest, rendition, next_index)
+            if os.path.exists(segment_cache.path_for(key)):
+                continue
+            self._render(
+                manifest, rendition, next_index, prefetch=True
+            ).add_done_callback(_log_prefetch_failure)
+
+
+async def _prefetch_render(func, *args):
+    try:
+        return await prefetch_executor.run(func, *args)
+    except MediaQueueFull:
+        return None  # Busy; rendered when a player asks for it
+
+
+def _log_prefetch_failure(task: asyncio.Task):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if isinstance(error, MediaExecutorError):
+        return  # Timed out; the player will ask for it again
+    if error is not None:
+        logger.error(f"Prefetching an HLS segment failed: {error}")
+
+
+segment_packager = SegmentPackager()
@@ -0,0 +1,319 @@
+import asyncio
+import os
+import socket
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from logging import Logger
+from typing import Any, Awaitable, Callable
+
+from src.models.job_model import JobModel, JobStatus
+from src.repository.job_repository import JobRepository
+from src.services.mongo_client import MongoClientSingleton
+from src.services.uuid import gen_uuid_str
+
+logger = Logger("job_queue")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_PER_USER_LIMIT = int(os.getenv("JOB_PER_USER_LIMIT", "2"))
+# A running job whose worker hasn't renewed its lease for this long is
+# considered abandoned and goes back in the queue
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+ProgressReporter = Callable[[dict[str, Any]], Awaitable[None]]
+JobHandler = Callable[[JobModel, ProgressReporter], Awaitable[dict[str, Any]]]
+
+
+class MongoJobStore:
+    """Persists jobs in the `jobs` collection without blocking the event loop."""
+
+    async def _call(self, method: str, *args):
+        def run():
+            with JobRepository(MongoClientSingleton()) as job_repository:
+                return getattr(job_repository, method)(*args)
+
+        return await asyncio.to_thread(run)
+
+    async def create_job(self, job: JobModel):
+        await self._call("create_job", job)
+
+    async def get_job(self, job_id: str) -> JobModel | None:
+        return await self._call("get_job", job_id)
+
+    async def update_job(self, job_id: str, update_data: dict):
+        await self._call("update_job", job_id, update_data)
+
+    async def push_progress(self, job_id: str, event: dict):
+        await self._call("push_progress", job_id, event)
+
+    async def claim_job(
+        self, job_id: str, worker_id: str, lease_expires_at: datetime
+    ) -> JobModel | None:
+        return await self._call("claim_job", job_id, worker_id, lease_expires_at)
+
+    async def renew_lease(
+        self, job_id: str, worker_id: str, lease_expires_at: datetime
+    ) -> bool:
+        return await self._call("renew_lease", job_id, worker_id, lease_expires_at)
+
+    async def finish_job(self, job_id: str, worker_id: str, update_data: dict) -> bool:
+        return await self._call("finish_job", job_id, worker_id, update_data)
+
+    async def release_job(self, job_id: str, worker_id: str) -> bool:
+        return await self._call("release_job", job_id, worker_id)
+
+    async def cancel_queued_job(self, job_id: str) -> bool:
+        return await self._call("cancel_queued_job", job_id)
+
+    async def requeue_expired_jobs(self, now: datetime) -> int:
+        return await self._call("requeue_expired_jobs", now)
+
+    async def get_queued_jobs(self) -> list[JobModel]:
+        return await self._call("get_queued_jobs")
+
+
+class JobQueue:
+    """Bounded worker pool for long running jobs with a persistent job table.
+
+    Jobs are written to the store before they are queued. Several processes
+    can share the store: a worker claims a job atomically before running it
+    and holds a lease it renews while the job runs, so each job runs once.
+    Every process polls the store for queued jobs, and requeues running jobs
+    whose lease expired because their process died. A worker skips over jobs
+    whose user already has `per_user_limit` jobs running here, which keeps
+    one user from starving everyone else. Progress events are stored on the
+    job and fanned out to live subscribers (SSE).
+    """
+
+    def __init__(
+        self,
+        store=None,
+        workers: int = JOB_WORKERS,
+        per_user_limit: int = JOB_PER_USER_LIMIT,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+    ):
+        self._store = store or MongoJobStore()
+        self._workers = workers
+        self._per_user_limit = per_user_limit
+        self._lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{gen_uuid_str()}"
+        self._handlers: dict[str, JobHandler] = {}
+        self._pending: deque[JobModel] = deque()
+        self._running: dict[str, asyncio.Task] = {}
+        self._cancel_requested: set[str] = set()
+        self._lease_lost: set[str] = set()
+        self._running_per_user: dict[str, int] = {}
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._condition = asyncio.Condition()
+        self._worker_tasks: list[asyncio.Task] = []
+
+    def register_handler(self, kind: str, handler: JobHandler):
+        self._handlers[kind] = handler
+
+    async def start(self):
+        try:
+            await self._poll_store()
+        except Exception as e:
+            # Don't hold up startup on a store outage; the poller retries
+            logger.error(f"Could not load queued jobs, retrying in background: {e}")
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self._workers)
+        ]
+        self._worker_tasks.append(
+            asyncio.create_task(self._poll_forever(), name="job-poller")
+        )
+
+    async def stop(self):
+        """Stop the workers and hand running jobs back to the queue, where
+        this or another process picks them up again."""
+        interrupted = list(self._running)
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        for job_id in interrupted:
+            try:
+                await self._store.release_job(job_id, self.worker_id)
+            except Exception as e:
+                # The lease runs out on its own and the job is requeued then
+                logger.error(f"Could not release job {job_id}: {e}")
+
+    async def submit(self, kind: str, user_id: str, payload: dict) -> JobModel:
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+        now = datetime.now()
+        job = JobModel(
+            job_id=gen_uuid_str(),
+            user_id=user_id,
+            kind=kind,
+            payload=payload,
+            created_at=now,
+            updated_at=now,
+        )
+        await self._store.create_job(job)
+        async with self._condition:
+            self._pending.append(job)
+            self._condition.notify_all()
+        return job
+
+    async def get_job(self, job_id: str) -> JobModel | None:
+        return await self._store.get_job(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it isn't active."""
+        async with self._condition:
+            for job in self._pending:
+                if job.job_id == job_id:
+                    self._pending.remove(job)
+                    break
+        if await self._store.cancel_queued_job(job_id):
+            self._publish(job_id, {"type": "status", "status": JobStatus.CANCELLED})
+            return True
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        self._cancel_requested.add(job_id)
+        task.cancel()
+        return True
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                self._subscribers.pop(job_id, None)
+
+    def _publish(self, job_id: str, event: dict):
+        for queue in self._subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+
+    def _lease_expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self._lease_seconds)
+
+    async def _poll_store(self):
+        """Requeue abandoned jobs and pick up queued jobs this process doesn't
+        know about yet, e.g. ones submitted to a process that has since died."""
+        requeued = await self._store.requeue_expired_jobs(datetime.now(timezone.utc))
+        if requeued:
+            logger.warning(f"Requeued {requeued} jobs whose worker stopped")
+        queued = await self._store.get_queued_jobs()
+        async with self._condition:
+            known = {job.job_id for job in self._pending} | set(self._running)
+            new = [job for job in queued if job.job_id not in known]
+            self._pending.extend(new)
+            if new:
+                self._condition.notify_all()
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self._lease_seconds / 2)
+            try:
+                await self._poll_store()
+            except Exception as e:
+                logger.error(f"Could not poll the job store: {e}")
+
+    async def _renew_lease(self, job_id: str, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self._lease_seconds / 3)
+            try:
+                if not await self._store.renew_lease(
+                    job_id, self.worker_id, self._lease_expiry()
+                ):
+                    # Requeued and maybe running elsewhere; stop this run
+                    logger.warning(f"Lost the lease on job {job_id}, stopping it")
+                    self._lease_lost.add(job_id)
+                    task.cancel()
+                    return
+            except Exception as e:
+                logger.error(f"Could not renew the lease on job {job_id}: {e}")
+
+    def _next_runnable(self) -> JobModel | None:
+        for job in self._pending:
+            if self._running_per_user.get(job.user_id, 0) < self._per_user_limit:
+                self._pending.remove(job)
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._condition:
+                job = self._next_runnable()
+                while job is None:
+                    await self._condition.wait()
+                    job = self._next_runnable()
+                self._running_per_user[job.user_id] = (
+                    self._running_per_user.get(job.user_id, 0) + 1
+                )
+            try:
+                await self._run(job)
+            except Exception as e:
+                # Most likely the store is unreachable; the job stays as the
+                # store last saw it, and the worker moves on to the next one
+                logger.error(f"Job worker failed on job {job.job_id}: {e}")
+            finally:
+                async with self._condition:
+                    self._running_per_user[job.user_id] -= 1
+                    if not self._running_per_user[job.user_id]:
+                        del self._running_per_user[job.user_id]
+                    self._condition.notify_all()
+
+    async def _run(self, job: JobModel):
+        job = await self._store.claim_job(
+            job.job_id, self.worker_id, self._lease_expiry()
+        )
+        if job is None:
+            return  # Another process took it first, or it was cancelled
+        handler = self._handlers.get(job.kind)
+        if handler is None:
+            await self._finish(job.job_id, JobStatus.FAILED, error="Unknown job kind")
+            return
+
+        async def report(event: dict):
+            event = {**event, "at": datetime.now().isoformat()}
+            await self._store.push_progress(job.job_id, event)
+            self._publish(job.job_id, {"type": "progress", **event})
+
+        self._publish(job.job_id, {"type": "status", "status": JobStatus.RUNNING})
+
+        task = asyncio.create_task(handler(job, report))
+        self._running[job.job_id] = task
+        heartbeat = asyncio.create_task(self._renew_lease(job.job_id, task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if job.job_id in self._lease_lost:
+                return  # Whoever holds the job now reports its outcome
+            if job.job_id not in self._cancel_requested:
+                # The worker itself is shutting down; stop() requeues the job
+                raise
+            await self._finish(job.job_id, JobStatus.CANCELLED)
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e}")
+            await self._finish(job.job_id, JobStatus.FAILED, error=str(e))
+        else:
+            await self._finish(job.job_id, JobStatus.SUCCEEDED, result=result)
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job.job_id, None)
+            self._cancel_requested.discard(job.job_id)
+            self._lease_lost.discard(job.job_id)
+
+    async def _finish(self, job_id: str, status: str, result=None, error=None):
+        if not await self._store.finish_job(
+            job_id,
+            self.worker_id,
+            {"status": status, "result": result, "error": error},
+        ):
+            logger.warning(f"Job {job_id} was taken over, dropped its result")
+            return
+        self._publish(
+            job_id, {"type": "status", "status": status, "result": result, "error": error}
+        )
+
+
+job_queue = JobQueue()
@@ -0,0 +1,199 @@
+import asyncio
+import contextvars
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logging import Logger
+
+import ffmpeg
+
+logger = Logger("media_executor")
+
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", str(os.cpu_count() or 2)))
+MEDIA_QUEUE_LIMIT = int(os.getenv("MEDIA_QUEUE_LIMIT", str(MEDIA_WORKERS * 4)))
+MEDIA_JOB_TIMEOUT = float(os.getenv("MEDIA_JOB_TIMEOUT", "600"))  # 10 minutes
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class MediaExecutorError(Exception):
+    pass
+
+
+class MediaQueueFull(MediaExecutorError):
+    pass
+
+
+class MediaJobTimeout(MediaExecutorError):
+    pass
+
+
+class MediaJobCancelled(MediaExecutorError):
+    pass
+
+
+class MediaJob:
+    """Tracks the processes started by one submitted call so they can be killed."""
+
+    def __init__(self):
+        self.cancelled = False
+        self._processes: set[subprocess.Popen] = set()
+        self._lock = threading.Lock()
+
+    def register(self, process: subprocess.Popen):
+        with self._lock:
+            if self.cancelled:
+                process.kill()
+                raise MediaJobCancelled()
+            self._processes.add(process)
+
+    def unregister(self, process: subprocess.Popen):
+        with self._lock:
+            self._processes.discard(process)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            processes = list(self._processes)
+        for process in processes:
+            process.kill()
+
+
+_current_job: contextvars.ContextVar[MediaJob | None] = contextvars.ContextVar(
+    "media_job", default=None
+)
+
+
+def run_process(args: list[str]) -> tuple[bytes, bytes, int]:
+    """Run a media command and return (stdout, stderr, returncode).
+
+    When called inside a MediaExecutor job the process is killed if the job
+    times out or is cancelled, and MediaJobCancelled is raised.
+    """
+    job = _current_job.get()
+    process = subprocess.Popen(
+        args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if job is not None:
+        job.register(process)
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        if job is not None:
+            job.unregister(process)
+    if job is not None and job.cancelled:
+        raise MediaJobCancelled()
+    return stdout, stderr, process.returncode
+
+
+def run_ffmpeg(stream, overwrite_output: bool = False) -> tuple[bytes, bytes]:
+    """Drop-in for `stream.run()` that goes through run_process."""
+    args = stream.compile(overwrite_output=overwrite_output)
+    stdout, stderr, returncode = run_process(args)
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", stdout, stderr)
+    return stdout, stderr
+
+
+def run_ffprobe(full_path: str, *extra_args: str) -> dict:
+    """Drop-in for `ffmpeg.probe()` that goes through run_process."""
+    args = ["ffprobe", "-show_format", "-show_streams", "-of", "json", *extra_args]
+    stdout, stderr, returncode = run_process([*args, full_path])
+    if returncode != 0:
+        raise ffmpeg.Error("ffprobe", stdout, stderr)
+    return json.loads(stdout.decode("utf-8"))
+
+
+class MediaExecutor:
+    """Runs blocking media work off the event loop on a bounded thread pool.
+
+    ffmpeg does the heavy lifting in its own process, so a thread per job is
+    enough to keep the event loop free. At most `queue_limit` jobs may be
+    running or waiting; beyond that `run` raises MediaQueueFull (HTTP 429).
+    Jobs that exceed their timeout or whose client disconnects have their
+    ffmpeg processes killed.
+    """
+
+    def __init__(
+        self,
+        workers: int = MEDIA_WORKERS,
+        queue_limit: int = MEDIA_QUEUE_LIMIT,
+        timeout: float = MEDIA_JOB_TIMEOUT,
+    ):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media")
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def _release(self, _future):
+        with self._depth_lock:
+            self._depth -= 1
+
+    async def run(
+        self, func, *args, timeout: float | None = None, is_disconnected=None, **kwargs
+    ):
+        """Run `func(*args, **kwargs)` on the pool and await its result.
+
+        `is_disconnected` is an optional coroutine function (for example
+        `Request.is_disconnected`); when it returns True the job is cancelled.
+        """
+        with self._depth_lock:
+            if self._depth >= self.queue_limit:
+                raise MediaQueueFull(
+                    f"Media queue is full ({self._depth}/{self.queue_limit} jobs)"
+                )
+            self._depth += 1
+
+        job = MediaJob()
+        context = contextvars.copy_context()
+        context.run(_current_job.set, job)
+        pool_future = self._pool.submit(context.run, func, *args, **kwargs)
+        # The slot is freed when the thread finishes, not when we stop waiting
+        pool_future.add_done_callback(self._release)
+        future = asyncio.wrap_future(pool_future)
+
+        watcher = None
+        if is_disconnected is not None:
+            watcher = asyncio.create_task(_wait_for_disconnect(is_disconnected))
+        try:
+            waiting = {future} if watcher is None else {future, watcher}
+            done, _ = await asyncio.wait(
+                waiting,
+                timeout=timeout or self.timeout,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if future in done:
+                return future.result()
+            job.cancel()
+            future.cancel()
+            if watcher is not None and watcher in done:
+                logger.warning(f"Client disconnected, cancelled {func.__name__}")
+                raise MediaJobCancelled("Client disconnected")
+            raise MediaJobTimeout(
+                f"{func.__name__} did not finish in {timeout or self.timeout}s"
+            )
+        except asyncio.CancelledError:
+            job.cancel()
+            future.cancel()
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _wait_for_disconnect(is_disconnected):
+    while not await is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+media_executor = MediaExecutor()
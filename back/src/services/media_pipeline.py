@@ -0,0 +1,156 @@
+import asyncio
+import os
+from logging import Logger
+
+from src.global_constants import ASSETS_DIR
+from src.models.job_model import JobModel
+from src.models.project_model import ProcessingStageModel, ProcessingStatus
+from src.repository.project_repository import AsyncProjectRepository
+from src.services.job_queue import job_queue
+from src.services.media_executor import MediaJobCancelled, media_executor
+from src.services.mongo_client import AsyncMongoClientSingleton
+from src.services.probe_cache import probe_cache
+from src.services.thumbnails import POSTER_SIZE, gen_thumbnails
+from src.services.video_edit import (
+    gen_proxy,
+    gen_waveform,
+    has_fresh_proxy,
+    proxy_path,
+)
+
+logger = Logger("media_pipeline")
+
+MEDIA_PIPELINE_JOB = "media_pipeline"
+MEDIA_PROXY_JOB = "media_proxy"
+
+STAGE_PROBE = "probe"
+STAGE_THUMBNAIL = "thumbnail"
+STAGE_PROXY = "proxy"
+STAGE_WAVEFORM = "waveform"
+PIPELINE_STAGES = (STAGE_PROBE, STAGE_THUMBNAIL, STAGE_PROXY, STAGE_WAVEFORM)
+
+
+def probe_stage(video_path):
+    probe_result = probe_cache.probe(os.path.join(ASSETS_DIR, video_path))
+    return {"duration": float(probe_result["format"]["duration"])}
+
+
+def thumbnail_stage(video_path):
+    thumbnails = gen_thumbnails(video_path)
+    return {"path": thumbnails["posters"][POSTER_SIZE], **thumbnails}
+
+
+def proxy_stage(video_path):
+    return {"path": gen_proxy(video_path)}
+
+
+def waveform_stage(video_path):
+    return {"path": gen_waveform(video_path)}
+
+
+STAGE_FUNCTIONS = {
+    STAGE_PROBE: probe_stage,
+    STAGE_THUMBNAIL: thumbnail_stage,
+    STAGE_PROXY: proxy_stage,
+    STAGE_WAVEFORM: waveform_stage,
+}
+
+
+def initial_processing() -> dict[str, ProcessingStageModel]:
+    return {stage: ProcessingStageModel() for stage in PIPELINE_STAGES}
+
+
+async def _apply_result(project_repository, project_id, video_path, stage, result):
+    """Copy what other code reads from a stage result onto the project."""
+    if stage == STAGE_PROBE:
+        await project_repository.set_head_track_durations(
+            project_id, {video_path: result["duration"]}
+        )
+    elif stage == STAGE_THUMBNAIL:
+        await project_repository.update_project(
+            project_id, {"thumbnail": result["path"]}
+        )
+
+
+async def run_media_pipeline(job: JobModel, report) -> dict:
+    """Run the requested stages for an uploaded video, in pipeline order.
+
+    Each stage records its own status on the project, so a failed stage can be
+    retried alone. Every later stage reads the file, so a failed probe stops
+    the run; the others are independent and run regardless.
+    """
+    project_id = job.payload["project_id"]
+    video_path = job.payload["video_path"]
+    stages = [s for s in PIPELINE_STAGES if s in job.payload["stages"]]
+    statuses = {}
+    async with AsyncProjectRepository(AsyncMongoClientSingleton()) as repository:
+        for stage in stages:
+            await repository.set_processing_stage(
+                project_id, stage, ProcessingStatus.RUNNING
+            )
+            await report({"stage": stage, "status": ProcessingStatus.RUNNING})
+            try:
+                result = await media_executor.run(STAGE_FUNCTIONS[stage], video_path)
+                await _apply_result(repository, project_id, video_path, stage, result)
+            except MediaJobCancelled:
+                await repository.set_processing_stage(
+                    project_id, stage, ProcessingStatus.FAILED, error="Cancelled"
+                )
+                raise
+            except Exception as e:
+                logger.error(f"{stage} failed for {video_path}: {e}")
+                await repository.set_processing_stage(
+                    project_id, stage, ProcessingStatus.FAILED, error=str(e)
+                )
+                statuses[stage] = ProcessingStatus.FAILED
+                await report({"stage": stage, "status": ProcessingStatus.FAILED})
+                if stage == STAGE_PROBE:
+                    for skipped in stages[stages.index(stage) + 1 :]:
+                        await repository.set_processing_stage(
+                            project_id,
+                            skipped,
+                            ProcessingStatus.FAILED,
+                            error="Skipped because probe failed",
+                        )
+                    break
+                continue
+
+            await repository.set_processing_stage(
+                project_id, stage, ProcessingStatus.DONE, result=result
+            )
+            statuses[stage] = ProcessingStatus.DONE
+            await report({"stage": stage, "status": ProcessingStatus.DONE})
+    return {"project_id": project_id, "stages": statuses}
+
+
+async def start_media_pipeline(
+    project_id: str, user_id: str, video_path: str, stages=PIPELINE_STAGES
+) -> JobModel:
+    return await job_queue.submit(
+        MEDIA_PIPELINE_JOB,
+        user_id=user_id,
+        payload={
+            "project_id": project_id,
+            "video_path": video_path,
+            "stages": list(stages),
+        },
+    )
+
+
+async def run_proxy_job(job: JobModel, report) -> dict:
+    """Make the editing proxy of a clip that has no project of its own,
+    such as an AI generated one."""
+    video_path = job.payload["video_path"]
+    if await asyncio.to_thread(has_fresh_proxy, video_path):
+        return {"path": os.path.relpath(proxy_path(video_path), ASSETS_DIR)}
+    return {"path": await media_executor.run(gen_proxy, video_path)}
+
+
+async def start_proxy_job(video_path: str, user_id: str) -> JobModel:
+    return await job_queue.submit(
+        MEDIA_PROXY_JOB, user_id=user_id, payload={"video_path": video_path}
+    )
+
+
+job_queue.register_handler(MEDIA_PIPELINE_JOB, run_media_pipeline)
+job_queue.register_handler(MEDIA_PROXY_JOB, run_proxy_job)
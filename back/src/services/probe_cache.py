@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import OrderedDict
+
+from src.services.media_executor import run_ffprobe
+
+PROBE_CACHE_SIZE = int(os.getenv("PROBE_CACHE_SIZE", "512"))
+# Content hashes are tiny, keyframe lists grow with the clip's length; each
+# kind gets its own LRU so neither can push probe results out
+HASH_CACHE_SIZE = int(os.getenv("HASH_CACHE_SIZE", "4096"))
+KEYFRAME_CACHE_SIZE = int(os.getenv("KEYFRAME_CACHE_SIZE", "128"))
+
+
+class ProbeCache:
+    """LRU caches of ffprobe results keyed by (device, inode, size, mtime).
+
+    A file that is rewritten in place gets a new size/mtime and therefore a
+    new key, so stale results are never returned; they simply age out. Keying
+    on the inode rather than the path lets every hard link of a stored blob
+    share one entry.
+
+    Every `name` of result (ffprobe output, sha256, keyframe times) has its
+    own LRU, sized from `budgets` or else `max_entries`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = PROBE_CACHE_SIZE,
+        prober=run_ffprobe,
+        budgets: dict[str, int] | None = None,
+    ):
+        self._max_entries = max_entries
+        self._budgets = budgets or {}
+        self._prober = prober
+        self._entries: dict[str, OrderedDict[tuple, object]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key_for(full_path: str) -> tuple:
+        stat_result = os.stat(full_path)
+        return (
+            stat_result.st_dev,
+            stat_result.st_ino,
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+        )
+
+    def probe(self, full_path: str) -> dict:
+        """Return the ffprobe result for `full_path`, probing only on a miss.
+
+        Raises ffmpeg.Error when ffprobe fails.
+        """
+        return self.get(full_path, "probe", self._prober)
+
+    def put(self, full_path: str, name: str, result):
+        """Seed the entry `get` would compute, when the caller already knows it."""
+        self._store((*self.key_for(full_path), name), result)
+
+    def _store(self, key: tuple, result):
+        name = key[-1]
+        with self._lock:
+            entries = self._entries.setdefault(name, OrderedDict())
+            entries[key] = result
+            entries.move_to_end(key)
+            while len(entries) > self._budgets.get(name, self._max_entries):
+                entries.popitem(last=False)
+
+    def get(self, full_path: str, name: str, compute):
+        """Return `compute(full_path)` cached under the file's identity and `name`."""
+        key = (*self.key_for(full_path), name)
+        with self._lock:
+            entries = self._entries.get(name, {})
+            result = entries.get(key)
+            if result is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+
+        result = compute(full_path)
+        self._store(key, result)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+probe_cache = ProbeCache(
+    budgets={"sha256": HASH_CACHE_SIZE, "keyframes": KEYFRAME_CACHE_SIZE}
+)
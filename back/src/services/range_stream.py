@@ -0,0 +1,251 @@
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from secrets import token_hex
+
+import anyio
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(256 * 1024)))
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def parse_range_header(
+    header: str, file_size: int
+) -> list[tuple[int, int]] | None:
+    """Parse a `Range` header into sorted, merged half-open byte ranges.
+
+    Returns None when the header is syntactically invalid or not a bytes range,
+    in which case the caller serves the full file as RFC 9110 requires. Raises
+    RangeNotSatisfiable when every requested range lies beyond the file.
+    """
+    units, _, spec = header.partition("=")
+    if units.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        first, last = first.strip(), last.strip()
+        if not sep or (first and not first.isdigit()) or (last and not last.isdigit()):
+            return None
+        if not first:
+            # suffix range: the last N bytes
+            if not last:
+                return None
+            length = int(last)
+            if length > 0 and file_size > 0:
+                ranges.append((max(file_size - length, 0), file_size))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < file_size:
+            end = int(last) + 1 if last else file_size
+            ranges.append((start, min(end, file_size)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+
+    if len(merged) > MAX_RANGES:
+        # Too many small ranges; answer with one span instead of a huge multipart body
+        return [(merged[0][0], merged[-1][1])]
+    return merged
+
+
+class RangeFileResponse(Response):
+    """Serve a file with conditional request and byte range support.
+
+    Handles 200/206/304/416, suffix and multi-range requests, and
+    ETag/Last-Modified validators including If-Range. The body is never held
+    in memory: each part is sent with the ASGI zero-copy extension when the
+    server offers it (sendfile), otherwise in `chunk_size` reads.
+    `background` runs once the response is over, however it ended.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        media_type: str | None = None,
+        headers: dict[str, str] | None = None,
+        stat_result: os.stat_result | None = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        background: BackgroundTask | None = None,
+    ):
+        self.path = path
+        self.status_code = 200
+        self.media_type = media_type or mimetypes.guess_type(path)[0] or "video/mp4"
+        self.background = background
+        self.chunk_size = chunk_size
+        self.stat_result = stat_result
+        self.init_headers(headers)
+        self.headers["accept-ranges"] = "bytes"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self._send_file(scope, send)
+        finally:
+            # Also after a failed or aborted send, e.g. to release a cache pin
+            if self.background is not None:
+                await self.background()
+
+    async def _send_file(self, scope: Scope, send: Send) -> None:
+        if self.stat_result is None:
+            self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+        file_size = self.stat_result.st_size
+        etag = file_etag(self.stat_result)
+        last_modified = formatdate(self.stat_result.st_mtime, usegmt=True)
+        self.headers["etag"] = etag
+        self.headers["last-modified"] = last_modified
+
+        request_headers = Headers(scope=scope)
+        send_header_only = scope["method"].upper() == "HEAD"
+
+        if _is_not_modified(request_headers, etag, self.stat_result.st_mtime):
+            del self.headers["content-type"]
+            self.status_code = 304
+            await send(
+                {"type": "http.response.start", "status": 304, "headers": self.raw_headers}
+            )
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        ranges = None
+        range_header = request_headers.get("range")
+        if range_header is not None and _if_range_matches(
+            request_headers.get("if-range"), etag, last_modified
+        ):
+            try:
+                ranges = parse_range_header(range_header, file_size)
+            except RangeNotSatisfiable:
+                self.status_code = 416
+                self.headers["content-range"] = f"bytes */{file_size}"
+                self.headers["content-length"] = "0"
+                await send(
+                    {"type": "http.response.start", "status": 416, "headers": self.raw_headers}
+                )
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        if ranges is None:
+            self.headers["content-length"] = str(file_size)
+            parts = [(0, file_size, b"")]
+            closing = b""
+        elif len(ranges) == 1:
+            self.status_code = 206
+            start, end = ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+            self.headers["content-length"] = str(end - start)
+            parts = [(start, end, b"")]
+            closing = b""
+        else:
+            self.status_code = 206
+            boundary = token_hex(13)
+            parts = [
+                (
+                    start,
+                    end,
+                    (b"\r\n" if index else b"")
+                    + (
+                        f"--{boundary}\r\n"
+                        f"Content-Type: {self.media_type}\r\n"
+                        f"Content-Range: bytes {start}-{end - 1}/{file_size}\r\n\r\n"
+                    ).encode("latin-1"),
+                )
+                for index, (start, end) in enumerate(ranges)
+            ]
+            closing = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            self.headers["content-type"] = (
+                f"multipart/byteranges; boundary={boundary}"
+            )
+            self.headers["content-length"] = str(
+                sum(len(prefix) + end - start for start, end, prefix in parts)
+                + len(closing)
+            )
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if send_header_only:
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        zerocopy = "http.response.zerocopysend" in scope.get("extensions", {})
+        with open(self.path, "rb") as file:
+            for start, end, prefix in parts:
+                if prefix:
+                    await send(
+                        {"type": "http.response.body", "body": prefix, "more_body": True}
+                    )
+                if zerocopy:
+                    await send(
+                        {
+                            "type": "http.response.zerocopysend",
+                            "file": file,
+                            "offset": start,
+                            "count": end - start,
+                            "more_body": True,
+                        }
+                    )
+                else:
+                    await self._send_chunks(send, file.fileno(), start, end)
+        await send({"type": "http.response.body", "body": closing})
+
+    async def _send_chunks(self, send: Send, fd: int, start: int, end: int):
+        while start < end:
+            chunk = await anyio.to_thread.run_sync(
+                os.pread, fd, min(self.chunk_size, end - start), start
+            )
+            if not chunk:
+                break
+            start += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+
+def _is_not_modified(headers: Headers, etag: str, mtime: float) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_matches(if_range: str | None, etag: str, last_modified: str) -> bool:
+    """A Range is only honoured when If-Range is absent or still matches."""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    return if_range == etag or if_range == last_modified
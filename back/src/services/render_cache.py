@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+from collections import Counter
+from logging import Logger
+
+from src.global_constants import ASSETS_DIR
+
+logger = Logger("render_cache")
+
+RENDER_CACHE_DIR = os.path.join(ASSETS_DIR, "render_cache")
+RENDER_CACHE_BUDGET_MB = int(os.getenv("RENDER_CACHE_BUDGET_MB", "10240"))
+
+
+class RenderCache:
+    """Disk cache of rendered timeline segments under a size budget.
+
+    Entries are files named by their key. Every hit touches the file's mtime,
+    and when the directory grows past the budget the least recently used
+    files are deleted. Segments handed out by `get_or_render` stay pinned
+    until `release`d so an export in progress never loses its inputs.
+    """
+
+    def __init__(
+        self,
+        directory: str = RENDER_CACHE_DIR,
+        budget_bytes: int = RENDER_CACHE_BUDGET_MB * 1024 * 1024,
+        suffix: str = ".mp4",
+    ):
+        self.directory = directory
+        self.suffix = suffix
+        self.budget_bytes = budget_bytes
+        self._pinned: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get_or_render(self, key: str, render) -> str:
+        """Return the cached segment for `key`, calling `render(path)` on a miss.
+
+        The returned path is pinned; call `release` once it is no longer read.
+        """
+        path = self.path_for(key)
+        with self._lock:
+            self._pinned[path] += 1
+            if os.path.exists(path):
+                os.utime(path)
+                self.hits += 1
+                return path
+            self.misses += 1
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(
+                prefix=".render-", suffix=self.suffix, dir=self.directory
+            )
+            os.close(fd)
+            try:
+                render(temp_path)
+                os.replace(temp_path, path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        except BaseException:
+            self.release(path)
+            raise
+
+        self.evict()
+        return path
+
+    def acquire(self, key: str) -> str | None:
+        """Pin and touch the cached segment for `key`; None if it isn't cached.
+
+        Like a hit in `get_or_render`, the path must be `release`d.
+        """
+        path = self.path_for(key)
+        with self._lock:
+            if not os.path.exists(path):
+                return None
+            self._pinned[path] += 1
+            os.utime(path)
+            self.hits += 1
+            return path
+
+    def release(self, path: str):
+        with self._lock:
+            self._pinned[path] -= 1
+            if self._pinned[path] <= 0:
+                del self._pinned[path]
+
+    def evict(self):
+        """Delete least recently used, unpinned segments until under budget."""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if not entry.is_file() or entry.name.startswith("."):
+                        continue
+                    stat_result = entry.stat()
+                    total += stat_result.st_size
+                    entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+
+            for _, size, path in sorted(entries):
+                if total <= self.budget_bytes:
+                    break
+                if path in self._pinned:
+                    continue
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+                logger.info(f"Evicted render cache segment {path}")
+
+
+render_cache = RenderCache()
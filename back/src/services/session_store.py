@@ -0,0 +1,189 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from logging import Logger
+from typing import Any
+
+from src.services.mongo_client import MongoClientSingleton
+
+logger = Logger("session_store")
+
+SESSION_STATE_TTL = int(os.getenv("SESSION_STATE_TTL", "3600"))  # 1 hour
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")
+
+IMAGE_PATH = "image_path"
+VIDEO_PATH = "video_path"
+IMAGE_URL = "image_url"
+BYPASS_CACHE = "bypass_cache"
+
+
+class InMemorySessionBackend:
+    """Process local backend; expired sessions are dropped lazily and on writes."""
+
+    def __init__(self):
+        self._sessions: dict[str, tuple[float, dict[str, Any]]] = {}
+
+    async def get(self, session_id: str) -> dict[str, Any] | None:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, artifacts = entry
+        if expires_at <= time.monotonic():
+            del self._sessions[session_id]
+            return None
+        return dict(artifacts)
+
+    async def set(self, session_id: str, key: str, value: Any, ttl: int):
+        self.purge_expired()
+        entry = self._sessions.get(session_id)
+        artifacts = entry[1] if entry else {}
+        artifacts[key] = value
+        self._sessions[session_id] = (time.monotonic() + ttl, artifacts)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        expired = [
+            session_id
+            for session_id, (expires_at, _) in self._sessions.items()
+            if expires_at <= now
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+
+class MongoSessionBackend:
+    """Shares session artifacts between workers through the `session_artifacts`
+    collection. A TTL index on `expires_at` lets Mongo evict stale sessions;
+    Mongo reads that field as UTC, so it is always written timezone-aware."""
+
+    def __init__(self, collection_name: str = "session_artifacts"):
+        self._collection_name = collection_name
+        self._indexes_ready = False
+
+    def _collection(self):
+        client = MongoClientSingleton().get_client()
+        return client["Contentizer"][self._collection_name]
+
+    def _ensure_indexes(self, collection):
+        if not self._indexes_ready:
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self._indexes_ready = True
+
+    async def get(self, session_id: str) -> dict[str, Any] | None:
+        def run():
+            now = datetime.now(timezone.utc)
+            return self._collection().find_one(
+                {"session_id": session_id, "expires_at": {"$gt": now}}
+            )
+
+        document = await asyncio.to_thread(run)
+        return document["artifacts"] if document else None
+
+    async def set(self, session_id: str, key: str, value: Any, ttl: int):
+        def run():
+            collection = self._collection()
+            self._ensure_indexes(collection)
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+            collection.update_one(
+                {"session_id": session_id},
+                {
+                    "$set": {
+                        f"artifacts.{key}": value,
+                        "expires_at": expires_at,
+                    }
+                },
+                upsert=True,
+            )
+
+        await asyncio.to_thread(run)
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(
+            lambda: self._collection().delete_one({"session_id": session_id})
+        )
+
+
+class SessionArtifactStore:
+    """Artifacts produced during one agent run, keyed by the ADK session id.
+
+    Tools look artifacts up by the session they run in, so concurrent agent
+    runs never see each other's images or videos. Every write extends the
+    session's TTL.
+    """
+
+    def __init__(self, backend=None, ttl: int = SESSION_STATE_TTL):
+        self._backend = backend or InMemorySessionBackend()
+        self._ttl = ttl
+
+    async def set_artifact(self, session_id: str, key: str, value: Any):
+        await self._backend.set(session_id, key, value, self._ttl)
+        logger.info(f"[SessionArtifactStore] {session_id}: {key}={value}")
+
+    async def get_artifact(self, session_id: str, key: str) -> Any:
+        artifacts = await self._backend.get(session_id)
+        return artifacts.get(key) if artifacts else None
+
+    async def clear(self, session_id: str):
+        await self._backend.delete(session_id)
+
+    async def set_image_path(self, session_id: str, path: str):
+        await self.set_artifact(session_id, IMAGE_PATH, path)
+
+    async def get_image_path(self, session_id: str) -> str | None:
+        return await self.get_artifact(session_id, IMAGE_PATH)
+
+    async def set_image_url(
+        self, session_id: str, path: str, url: str, expires_at: float
+    ):
+        """Remember the remote copy of the image at `path`, valid until
+        `expires_at` (a unix timestamp)."""
+        await self.set_artifact(
+            session_id, IMAGE_URL, {"path": path, "url": url, "expires_at": expires_at}
+        )
+
+    async def get_image_url(
+        self, session_id: str, path: str, valid_for: float = 0
+    ) -> str | None:
+        """The remote copy of the image at `path` if it stays valid for at
+        least `valid_for` more seconds."""
+        remote = await self.get_artifact(session_id, IMAGE_URL)
+        if not remote or remote["path"] != path:
+            return None
+        if remote["expires_at"] - valid_for <= time.time():
+            return None
+        return remote["url"]
+
+    async def set_video_path(self, session_id: str, path: str):
+        await self.set_artifact(session_id, VIDEO_PATH, path)
+
+    async def get_video_path(self, session_id: str) -> str | None:
+        return await self.get_artifact(session_id, VIDEO_PATH)
+
+    async def set_bypass_cache(self, session_id: str, bypass: bool):
+        await self.set_artifact(session_id, BYPASS_CACHE, bypass)
+
+    async def get_bypass_cache(self, session_id: str) -> bool:
+        return bool(await self.get_artifact(session_id, BYPASS_CACHE))
+
+
+_BACKENDS = {
+    "memory": InMemorySessionBackend,
+    "mongo": MongoSessionBackend,
+}
+
+_store: SessionArtifactStore | None = None
+
+
+def get_session_store() -> SessionArtifactStore:
+    """Return the store configured by SESSION_STORE_BACKEND (memory or mongo)."""
+    global _store
+    if _store is None:
+        backend = _BACKENDS.get(SESSION_STORE_BACKEND)
+        if backend is None:
+            raise ValueError(f"Unknown session store backend: {SESSION_STORE_BACKEND}")
+        _store = SessionArtifactStore(backend())
+    return _store
@@ -0,0 +1,202 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+
+import ffmpeg
+
+from src.global_constants import ASSETS_DIR, THUMBNAILS_DIR
+from src.services.concat_normalizer import content_hash
+from src.services.media_executor import run_process
+from src.services.probe_cache import probe_cache
+from src.services.video_edit import get_keyframe_times
+
+# Poster widths; heights follow the video's aspect ratio
+THUMBNAIL_SIZES = {"small": 320, "medium": 640, "large": 1280}
+POSTER_SIZE = "medium"
+POSTER_TIME = 1.0
+SPRITE_INTERVAL = float(os.getenv("SPRITE_INTERVAL", "2"))
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+# Part of every output directory name, so changing the settings above can't
+# serve stale files under a URL that was cached as immutable
+THUMBNAIL_FORMAT_VERSION = 1
+THUMBNAIL_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".vtt": "text/vtt",
+    ".json": "application/json",
+}
+
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def thumbnails_dir(video_path):
+    """Output directory of `video_path`'s thumbnails, relative to THUMBNAILS_DIR.
+
+    It is named after the file's contents, so new contents get new URLs and
+    every copy of the same footage shares one set of thumbnails.
+    """
+    digest = content_hash(os.path.join(ASSETS_DIR, video_path))
+    return f"{digest}-v{THUMBNAIL_FORMAT_VERSION}"
+
+
+def resolve_thumbnail_path(filepath):
+    """The file under THUMBNAILS_DIR that `filepath` names, or None when it
+    points anywhere else. Paths stored before thumbnails were served relative
+    to THUMBNAILS_DIR still carry it as a prefix."""
+    root = os.path.realpath(THUMBNAILS_DIR)
+    legacy_prefix = THUMBNAILS_DIR.rstrip(os.sep) + os.sep
+    if filepath.startswith(legacy_prefix):
+        filepath = filepath[len(legacy_prefix) :]
+    full_path = os.path.realpath(os.path.join(root, filepath))
+    if os.path.commonpath([root, full_path]) != root or not os.path.isfile(full_path):
+        return None
+    return full_path
+
+
+def _vtt_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def sprite_index(duration, tile_width, tile_height, interval=SPRITE_INTERVAL):
+    """Where each scrub tile is: its sheet and pixel rectangle, plus the span
+    of the timeline it stands for."""
+    per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+    tiles = []
+    for index in range(max(1, math.ceil(duration / interval))):
+        sheet, position = divmod(index, per_sheet)
+        row, column = divmod(position, SPRITE_COLUMNS)
+        tiles.append(
+            {
+                "start": round(index * interval, 3),
+                "end": round(min((index + 1) * interval, duration), 3),
+                "sheet": f"sprite-{sheet}.jpg",
+                "x": column * tile_width,
+                "y": row * tile_height,
+            }
+        )
+    return {
+        "interval": interval,
+        "tile_width": tile_width,
+        "tile_height": tile_height,
+        "columns": SPRITE_COLUMNS,
+        "rows": SPRITE_ROWS,
+        "sheets": sorted({tile["sheet"] for tile in tiles}),
+        "tiles": tiles,
+    }
+
+
+def sprite_vtt(index):
+    """The sprite index as WebVTT cues of `sheet#xywh=` fragments, the form
+    most web players read scrub previews from."""
+    lines = ["WEBVTT", ""]
+    for tile in index["tiles"]:
+        lines.append(f"{_vtt_time(tile['start'])} --> {_vtt_time(tile['end'])}")
+        lines.append(
+            f"{tile['sheet']}#xywh={tile['x']},{tile['y']},"
+            f"{index['tile_width']},{index['tile_height']}"
+        )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def gen_thumbnails(video_path):
+    """Make the posters and scrub sprite sheets of `video_path` in one ffmpeg run,
+    unless the same footage already has them.
+
+    The posters come from a single frame after a fast seek. When keyframes
+    are at least as dense as the sprite tiles, the sprites decode keyframes
+    only, so even long videos take a fraction of their duration.
+    Returns paths relative to THUMBNAILS_DIR; raises ffmpeg.Error.
+    """
+    relative_dir = thumbnails_dir(video_path)
+    output_dir = os.path.join(THUMBNAILS_DIR, relative_dir)
+    if not os.path.isdir(output_dir):
+        _render_thumbnails(video_path, output_dir)
+
+    return {
+        "posters": {
+            size: os.path.join(relative_dir, f"poster-{size}.jpg")
+            for size in THUMBNAIL_SIZES
+        },
+        "sprites_vtt": os.path.join(relative_dir, "sprites.vtt"),
+        "sprites_json": os.path.join(relative_dir, "sprites.json"),
+    }
+
+
+def _render_thumbnails(video_path, output_dir):
+    full_path = os.path.join(ASSETS_DIR, video_path)
+    probe_result = probe_cache.probe(full_path)
+    duration = float(probe_result["format"]["duration"])
+    video = next(s for s in probe_result["streams"] if s["codec_type"] == "video")
+    tile_height = _even(
+        SPRITE_TILE_WIDTH * int(video["height"]) / int(video["width"])
+    )
+    index = sprite_index(duration, SPRITE_TILE_WIDTH, tile_height)
+    keyframes_only = len(get_keyframe_times(full_path)) >= len(index["tiles"])
+
+    os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+    work_dir = tempfile.mkdtemp(
+        prefix=".thumbnails-", dir=os.path.dirname(output_dir)
+    )
+    try:
+        splits = "".join(f"[p{size}]" for size in THUMBNAIL_SIZES)
+        filters = [f"[0:v]split={len(THUMBNAIL_SIZES)}{splits}"]
+        filters += [
+            f"[p{size}]scale={width}:-2[{size}]"
+            for size, width in THUMBNAIL_SIZES.items()
+        ]
+        filters.append(
+            # The clone covers the tiles after the last decoded frame
+            f"[1:v]tpad=stop_mode=clone:stop_duration={SPRITE_INTERVAL},"
+            f"fps=1/{SPRITE_INTERVAL},"
+            f"scale={SPRITE_TILE_WIDTH}:{tile_height},"
+            f"tile={SPRITE_COLUMNS}x{SPRITE_ROWS}[sprites]"
+        )
+        args = [
+            "ffmpeg",
+            "-y",
+            "-ss",
+            f"{min(POSTER_TIME, duration / 2):.3f}",
+            "-i",
+            full_path,
+            *(["-skip_frame", "nokey"] if keyframes_only else []),
+            "-i",
+            full_path,
+            "-filter_complex",
+            ";".join(filters),
+        ]
+        for size in THUMBNAIL_SIZES:
+            args += ["-map", f"[{size}]", "-frames:v", "1"]
+            args.append(os.path.join(work_dir, f"poster-{size}.jpg"))
+        args += [
+            "-map",
+            "[sprites]",
+            "-start_number",
+            "0",
+            os.path.join(work_dir, "sprite-%d.jpg"),
+        ]
+        stdout, stderr, returncode = run_process(args)
+        if returncode != 0:
+            raise ffmpeg.Error("ffmpeg", stdout, stderr)
+
+        with open(os.path.join(work_dir, "sprites.json"), "w") as f:
+            json.dump(index, f)
+        with open(os.path.join(work_dir, "sprites.vtt"), "w") as f:
+            f.write(sprite_vtt(index))
+
+        try:
+            os.rename(work_dir, output_dir)
+        except OSError:
+            if not os.path.isdir(output_dir):
+                raise
+            # The same footage was done concurrently; keep that copy
+    finally:
+        if os.path.exists(work_dir):
+            shutil.rmtree(work_dir)
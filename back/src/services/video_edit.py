@@ -1,14 +1,35 @@
+import asyncio
 import os
 import ffmpeg
 import subprocess
 import json
-from src.global_constants import ASSETS_DIR, THUMBNAILS_DIR
+import sys
+import tempfile
+from array import array
+from src.global_constants import ASSETS_DIR, WAVEFORMS_DIR
+from src.services.probe_cache import probe_cache
+from src.services.media_executor import (
+    MEDIA_WORKERS,
+    MediaExecutorError,
+    media_executor,
+    run_ffmpeg,
+    run_ffprobe,
+    run_process,
+)
+from src.services.concat_normalizer import (
+    clip_profile,
+    encoder_threads,
+    segment_key,
+    target_profile,
+    transcode,
+)
+from src.services.render_cache import render_cache
 
 
 def probe(video_path):
     try:
         full_path = os.path.join(ASSETS_DIR, video_path)
-        probe_result = ffmpeg.probe(full_path)
+        probe_result = probe_cache.probe(full_path)
     except ffmpeg.Error as e:
         print(f"An error occurred while probing the video: {e}")
         return None
@@ -19,7 +40,7 @@ def get_video_duration(video_path):
     """Get video duration in seconds"""
     try:
         full_path = os.path.join(ASSETS_DIR, video_path)
-        probe_result = ffmpeg.probe(full_path)
+        probe_result = probe_cache.probe(full_path)
         duration = float(probe_result["format"]["duration"])
         return duration
     except ffmpeg.Error as e:
@@ -31,7 +52,7 @@ def get_video_metadata(video_path):
     """Get comprehensive video metadata including duration, resolution, fps"""
     try:
         full_path = os.path.join(ASSETS_DIR, video_path)
-        probe_result = ffmpeg.probe(full_path)
+        probe_result = probe_cache.probe(full_path)
         video_stream = next(
             (
                 stream
@@ -56,89 +77,583 @@ def get_video_metadata(video_path):
         return None
 
 
-def gen_thumbnail(video_path):
-    try:
-        full_path = os.path.join(ASSETS_DIR, video_path)
-        # Generate thumbnail directly in the thumbnails directory
-        thumbnail_path = os.path.join(
-            THUMBNAILS_DIR, f"{os.path.basename(video_path)}.jpg"
-        )
+PROXY_HEIGHT = 540
+PROXY_KEYFRAME_INTERVAL = 1.0  # Seconds; short GOPs keep proxy seeks cheap
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_PEAKS_PER_SECOND = 50
 
-        # Ensure thumbnails directory exists
-        os.makedirs(THUMBNAILS_DIR, exist_ok=True)
 
-        ffmpeg.input(full_path, ss="00:00:01").filter("scale", 1280, -1).output(
-            thumbnail_path, vframes=1
-        ).run(overwrite_output=True)
+PROXY_SUFFIX = ".proxy.mp4"
 
-        return thumbnail_path
-    except ffmpeg.Error as e:
-        print(f"An error occurred while generating thumbnail: {e}")
-        return "https://placehold.co/400"
+
+def proxy_path(video_path):
+    """Where the proxy of `video_path` (relative to ASSETS_DIR) is stored:
+    next to the original, so it moves and gets deleted with it."""
+    return os.path.join(ASSETS_DIR, f"{os.path.splitext(video_path)[0]}{PROXY_SUFFIX}")
 
 
-def trim(video_path, output_path, start, end):
+def has_fresh_proxy(video_path):
+    """True when a proxy exists and is newer than its original."""
     try:
-        full_path = os.path.join(ASSETS_DIR, video_path)
-        ffmpeg.input(full_path).trim(start=start, end=end).setpts(
-            "PTS-STARTPTS"
-        ).output(output_path).run()
-    except ffmpeg.Error as e:
-        print(f"An error occurred while trimming the video: {e}")
+        proxy_mtime = os.stat(proxy_path(video_path)).st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return proxy_mtime >= os.stat(os.path.join(ASSETS_DIR, video_path)).st_mtime_ns
 
 
-def concatenate_videos(video_paths, output_path):
-    """Concatenate multiple videos in sequence"""
-    try:
-        # Create a temporary file list for ffmpeg concat
-        concat_file_path = os.path.join(ASSETS_DIR, "concat_list.txt")
+def preview_path(video_path):
+    """The proxy of `video_path` when it has one, for previews and scrubbing;
+    the original otherwise. Final exports always read originals."""
+    if video_path.endswith(PROXY_SUFFIX) or not has_fresh_proxy(video_path):
+        return video_path
+    return os.path.relpath(proxy_path(video_path), ASSETS_DIR)
 
-        with open(concat_file_path, "w") as f:
-            for video_path in video_paths:
-                full_path = os.path.join(ASSETS_DIR, video_path)
-                # Escape single quotes in the path
-                escaped_path = full_path.replace("'", "'\\\\''")
-                f.write(f"file '{escaped_path}'\n")
 
-        # Use ffmpeg concat demuxer
-        output_full_path = os.path.join(ASSETS_DIR, output_path)
+def gen_proxy(video_path):
+    """Encode a low resolution, short GOP editing proxy of `video_path`.
 
-        subprocess.run(
+    Returns the proxy path relative to ASSETS_DIR; raises ffmpeg.Error.
+    """
+    full_path = os.path.join(ASSETS_DIR, video_path)
+    output_path = proxy_path(video_path)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(output_path))
+    os.close(fd)
+    try:
+        stdout, stderr, returncode = run_process(
             [
                 "ffmpeg",
-                "-f",
-                "concat",
-                "-safe",
-                "0",
+                "-y",
                 "-i",
-                concat_file_path,
-                "-c",
-                "copy",
-                output_full_path,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
+                full_path,
+                "-map",
+                "0:v:0",
+                "-map",
+                "0:a:0?",
+                "-vf",
+                f"scale=-2:'min({PROXY_HEIGHT},ih)'",
+                "-c:v",
+                "libx264",
+                "-preset",
+                "veryfast",
+                "-crf",
+                "28",
+                "-pix_fmt",
+                "yuv420p",
+                "-force_key_frames",
+                f"expr:gte(t,n_forced*{PROXY_KEYFRAME_INTERVAL})",
+                "-sc_threshold",
+                "0",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "96k",
+                "-movflags",
+                "+faststart",
+                temp_path,
+            ]
+        )
+        if returncode != 0:
+            raise ffmpeg.Error("ffmpeg", stdout, stderr)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return os.path.relpath(output_path, ASSETS_DIR)
+
+
+def waveform_peaks(samples, bucket_size):
+    """Peak amplitude (0..1) of every `bucket_size` signed 16 bit samples."""
+    return [
+        round(
+            max(-min(samples[i : i + bucket_size]), max(samples[i : i + bucket_size]))
+            / 32768,
+            3,
         )
+        for i in range(0, len(samples), bucket_size)
+    ]
+
+
+def gen_waveform(video_path):
+    """Write the audio peaks of `video_path` as JSON for the timeline.
+
+    Returns the JSON path relative to ASSETS_DIR, or None for silent clips;
+    raises ffmpeg.Error.
+    """
+    full_path = os.path.join(ASSETS_DIR, video_path)
+    probe_result = probe_cache.probe(full_path)
+    if not any(s["codec_type"] == "audio" for s in probe_result["streams"]):
+        return None
+
+    stdout, stderr, returncode = run_process(
+        [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-i",
+            full_path,
+            "-map",
+            "0:a:0",
+            "-ac",
+            "1",
+            "-ar",
+            str(WAVEFORM_SAMPLE_RATE),
+            "-f",
+            "s16le",
+            "-",
+        ]
+    )
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", stdout, stderr)
+    samples = array("h")
+    samples.frombytes(stdout[: len(stdout) - len(stdout) % 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+
+    output_path = os.path.join(WAVEFORMS_DIR, f"{video_path}.json")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=os.path.dirname(output_path), suffix=".json", delete=False
+    ) as f:
+        json.dump(
+            {
+                "peaks_per_second": WAVEFORM_PEAKS_PER_SECOND,
+                "peaks": waveform_peaks(
+                    samples, WAVEFORM_SAMPLE_RATE // WAVEFORM_PEAKS_PER_SECOND
+                ),
+            },
+            f,
+        )
+    os.replace(f.name, output_path)
+    return os.path.relpath(output_path, ASSETS_DIR)
+
+
+TRIM_AUTO = "auto"
+TRIM_COPY = "copy"
+TRIM_SMART = "smart"
+TRIM_REENCODE = "reencode"
+
+# Seconds a cut point may be off a keyframe and still count as on it
+KEYFRAME_TOLERANCE = 0.02
+# Encoders whose output can be stream-joined with copied packets of the same codec
+SMART_TRIM_ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+# ffprobe profile names -> encoder profiles, per codec. Sources in any other
+# profile can't be matched and are re-encoded whole instead of smart trimmed.
+SMART_TRIM_PROFILES = {
+    "h264": {
+        "Constrained Baseline": "baseline",
+        "Baseline": "baseline",
+        "Main": "main",
+        "High": "high",
+        "High 10": "high10",
+        "High 4:2:2": "high422",
+        "High 4:4:4 Predictive": "high444",
+    },
+    "hevc": {"Main": "main", "Main 10": "main10"},
+}
+# Stream parameters the re-encoded edges must share with the copied middle
+SMART_TRIM_MATCHED_FIELDS = (
+    "codec_name",
+    "profile",
+    "level",
+    "pix_fmt",
+    "width",
+    "height",
+    "time_base",
+)
+
+
+def get_keyframe_times(full_path):
+    """Presentation times (seconds) of the video keyframes, cached per file."""
+
+    def read_keyframes(path):
+        stdout, stderr, returncode = run_process(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "packet=pts_time,flags",
+                "-of",
+                "csv=print_section=0",
+                path,
+            ]
+        )
+        if returncode != 0:
+            raise ffmpeg.Error("ffprobe", stdout, stderr)
+        keyframes = []
+        for line in stdout.decode("utf-8").splitlines():
+            pts_time, _, flags = line.partition(",")
+            if "K" in flags and pts_time not in ("", "N/A"):
+                keyframes.append(float(pts_time))
+        return sorted(keyframes)
+
+    return probe_cache.get(full_path, "keyframes", read_keyframes)
+
+
+def plan_trim(keyframes, duration, start, end):
+    """Pick how to cut [start, end) given the source keyframe times.
+
+    Returns (mode, copy_start, copy_end). In smart mode only [start,
+    copy_start) and [copy_end, end) are re-encoded; the GOP aligned middle is
+    stream copied. Copy mode means both cut points already sit on GOP
+    boundaries (or the end of the file).
+    """
+    end = min(end, duration)
+    inside = [k for k in keyframes if start - KEYFRAME_TOLERANCE <= k <= end]
+    if not inside:
+        return TRIM_REENCODE, None, None
+
+    copy_start = inside[0]
+    copy_end = end
+    end_on_boundary = end >= duration - KEYFRAME_TOLERANCE or any(
+        abs(k - end) <= KEYFRAME_TOLERANCE for k in keyframes
+    )
+    if not end_on_boundary:
+        copy_end = inside[-1]
+
+    if copy_end - copy_start <= KEYFRAME_TOLERANCE:
+        return TRIM_REENCODE, None, None
+    if abs(copy_start - start) <= KEYFRAME_TOLERANCE and end_on_boundary:
+        return TRIM_COPY, copy_start, copy_end
+    return TRIM_SMART, copy_start, copy_end
+
+
+def _encode_args(video_stream, audio_stream):
+    """Encoder settings that keep re-encoded parts joinable with copied ones."""
+    args = [
+        "-c:v",
+        SMART_TRIM_ENCODERS.get(video_stream.get("codec_name"), "libx264"),
+        "-pix_fmt",
+        video_stream.get("pix_fmt", "yuv420p"),
+        "-bf",
+        "0",
+    ]
+    time_base = video_stream.get("time_base", "")
+    if "/" in time_base:
+        args += ["-video_track_timescale", time_base.split("/")[1]]
+    if audio_stream is not None:
+        args += [
+            "-c:a",
+            "aac",
+            "-ar",
+            str(audio_stream.get("sample_rate", 44100)),
+            "-ac",
+            str(audio_stream.get("channels", 2)),
+        ]
+    return args
+
+
+def _smart_encode_args(video_stream, audio_stream):
+    """Encoder settings for the re-encoded edges of a smart trim.
+
+    On top of `_encode_args` the edges get the source's profile, level and
+    colour description, and repeat their parameter sets in band so decoders
+    pick up the right SPS/PPS on both sides of each join. Returns None when
+    the source's profile or level can't be reproduced by the encoder.
+    """
+    codec = video_stream.get("codec_name")
+    profile = SMART_TRIM_PROFILES.get(codec, {}).get(video_stream.get("profile"))
+    level = video_stream.get("level")
+    if profile is None or not isinstance(level, int) or level <= 0:
+        return None
 
-        # Clean up temp file
-        os.remove(concat_file_path)
+    args = _encode_args(video_stream, audio_stream)
+    video_args = ["-profile:v", profile]
+    if codec == "h264":
+        # ffprobe reports H.264 levels as level_idc, e.g. 31 for 3.1
+        video_args += ["-level:v", f"{level // 10}.{level % 10}"]
+        video_args += ["-x264-params", "repeat-headers=1"]
+    else:
+        # and HEVC ones as general_level_idc, 30 times the level
+        video_args += ["-x265-params", f"level-idc={level // 3}:repeat-headers=1"]
+    for field, flag in (
+        ("color_range", "-color_range"),
+        ("color_space", "-colorspace"),
+        ("color_transfer", "-color_trc"),
+        ("color_primaries", "-color_primaries"),
+    ):
+        if video_stream.get(field) not in (None, "", "unknown"):
+            video_args += [flag, video_stream[field]]
+    index = args.index("-c:v") + 2
+    return args[:index] + video_args + args[index:]
+
+
+def _matches_source(video_stream, part_path):
+    """Whether a re-encoded part came out with the source's stream parameters."""
+    part_stream = next(
+        s for s in run_ffprobe(part_path)["streams"] if s["codec_type"] == "video"
+    )
+    return all(
+        part_stream.get(field) == video_stream.get(field)
+        for field in SMART_TRIM_MATCHED_FIELDS
+    )
+
+
+def _cut(full_path, output_path, start, duration, codec_args):
+    stdout, stderr, returncode = run_process(
+        [
+            "ffmpeg",
+            "-y",
+            "-ss",
+            f"{start:.6f}",
+            "-i",
+            full_path,
+            "-t",
+            f"{duration:.6f}",
+            *codec_args,
+            "-avoid_negative_ts",
+            "make_zero",
+            output_path,
+        ]
+    )
+    if returncode != 0:
+        raise ffmpeg.Error("ffmpeg", stdout, stderr)
+
+
+def _concat_copy(part_paths, output_path):
+    """Stream copy `part_paths` into `output_path` with the concat demuxer.
+
+    The list file and the partial output live in a private temp directory
+    next to the output, so concurrent jobs never share files, nothing is left
+    behind when ffmpeg fails, and readers only ever see a complete output
+    (it is moved into place with an atomic rename).
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(prefix=".concat-", dir=output_dir) as work_dir:
+        list_path = os.path.join(work_dir, "concat_list.txt")
+        with open(list_path, "w") as f:
+            for part_path in part_paths:
+                # Escape single quotes in the path
+                escaped_path = os.path.abspath(part_path).replace("'", "'\\''")
+                f.write(f"file '{escaped_path}'\n")
+
+        temp_output = os.path.join(work_dir, os.path.basename(output_path))
+        command = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+        command += ["-c", "copy", temp_output]
+        stdout, stderr, returncode = run_process(command)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(
+                returncode, command, stdout, stderr.decode("utf-8", "replace")
+            )
+        os.replace(temp_output, output_path)
+
+
+def trim(full_path, output_path, start, end, mode=TRIM_AUTO):
+    """Cut [start, end) seconds of `full_path` into `output_path`.
+
+    With mode "auto" the cheapest exact method is picked from the keyframe
+    layout: "copy" when both cuts are on GOP boundaries, "smart" to re-encode
+    only the partial GOPs at the edges, or "reencode" for the whole range.
+    Both paths are full paths. Returns the mode that was used, or None if
+    ffmpeg failed.
+    """
+    try:
+        probe_result = probe_cache.probe(full_path)
+        video_stream = next(
+            s for s in probe_result["streams"] if s["codec_type"] == "video"
+        )
+        audio_stream = next(
+            (s for s in probe_result["streams"] if s["codec_type"] == "audio"), None
+        )
+        reencode_args = _encode_args(video_stream, audio_stream)
+        end = min(end, float(probe_result["format"]["duration"]))
+
+        copy_start = copy_end = None
+        if mode == TRIM_REENCODE or (
+            video_stream.get("codec_name") not in SMART_TRIM_ENCODERS
+        ):
+            mode = TRIM_REENCODE
+        else:
+            planned, copy_start, copy_end = plan_trim(
+                get_keyframe_times(full_path),
+                float(probe_result["format"]["duration"]),
+                start,
+                end,
+            )
+            if mode == TRIM_AUTO or planned == TRIM_REENCODE:
+                mode = planned
+            elif mode == TRIM_COPY and planned != TRIM_COPY:
+                # Cuts off a GOP boundary can't be copied exactly
+                mode = TRIM_SMART
+
+        smart_args = None
+        if mode == TRIM_SMART:
+            smart_args = _smart_encode_args(video_stream, audio_stream)
+            if smart_args is None:
+                # Edges in other stream parameters would break the joins
+                mode = TRIM_REENCODE
+
+        if mode == TRIM_REENCODE:
+            _cut(full_path, output_path, start, end - start, reencode_args)
+            return mode
+
+        copy_args = ["-c", "copy"]
+        if audio_stream is not None and audio_stream.get("codec_name") != "aac":
+            copy_args = ["-c:v", "copy", *reencode_args[reencode_args.index("-c:a") :]]
+        if mode == TRIM_COPY:
+            _cut(full_path, output_path, copy_start, copy_end - copy_start, copy_args)
+            return mode
+
+        # Parts live next to the output so the final concat stays on one disk
+        with tempfile.TemporaryDirectory(
+            dir=os.path.dirname(os.path.abspath(output_path))
+        ) as parts_dir:
+            parts = []
+            edges = []
+            if copy_start - start > KEYFRAME_TOLERANCE:
+                parts.append(os.path.join(parts_dir, "head.mp4"))
+                edges.append(parts[-1])
+                _cut(full_path, parts[-1], start, copy_start - start, smart_args)
+            parts.append(os.path.join(parts_dir, "middle.mp4"))
+            _cut(full_path, parts[-1], copy_start, copy_end - copy_start, copy_args)
+            if end - copy_end > KEYFRAME_TOLERANCE:
+                parts.append(os.path.join(parts_dir, "tail.mp4"))
+                edges.append(parts[-1])
+                _cut(full_path, parts[-1], copy_end, end - copy_end, smart_args)
+            if not all(_matches_source(video_stream, edge) for edge in edges):
+                print(f"Smart trim of {full_path} can't match its stream, re-encoding")
+                _cut(full_path, output_path, start, end - start, reencode_args)
+                return TRIM_REENCODE
+            _concat_copy(parts, output_path)
+        return mode
+    except (ffmpeg.Error, subprocess.CalledProcessError, StopIteration) as e:
+        print(f"An error occurred while trimming the video: {e}")
+        return None
+
+
+def _render_segment(full_path, profile, target, in_point, out_point, threads):
+    """Return (path, pinned) for the [in_point, out_point) part of a clip in `target`.
+
+    A whole clip already in the target profile is used as is. Anything else
+    comes from the render cache: compatible clips are smart trimmed (only the
+    partial GOPs at the cuts are re-encoded), mismatched ones transcoded.
+    """
+    duration = float(probe_cache.probe(full_path)["format"]["duration"])
+    start = max(in_point or 0.0, 0.0)
+    end = duration if out_point is None else min(out_point, duration)
+    whole = start <= KEYFRAME_TOLERANCE and end >= duration - KEYFRAME_TOLERANCE
+    if whole and profile == target:
+        return full_path, False
+
+    def render(output_path):
+        if profile == target:
+            if trim(full_path, output_path, start, end) is None:
+                raise RuntimeError(f"Failed to trim {full_path}")
+            return
+        transcode(
+            full_path,
+            output_path,
+            target,
+            profile["audio_codec"] is not None,
+            threads,
+            start=None if whole else start,
+            duration=None if whole else end - start,
+        )
+
+    key = segment_key(full_path, start, end, target)
+    return render_cache.get_or_render(key, render), True
+
+
+def _clip_profiles(full_paths):
+    return [clip_profile(full_path) for full_path in full_paths]
+
+
+async def concatenate_videos(
+    segments, output_path, preview=False, is_disconnected=None
+):
+    """Concatenate (video_path, in_point, out_point) segments in sequence.
+
+    In/out points may be None for the start/end of the clip. Each segment is
+    rendered into the common target profile through the render cache, so a
+    re-export only rebuilds segments whose source, cut points or profile
+    changed and then stream copies everything together. A preview renders
+    from the editing proxies wherever they exist. Every segment renders as
+    its own media executor job, so mismatched clips transcode in parallel,
+    at most MEDIA_WORKERS of them at a time for one export.
+    """
+    try:
+        full_paths = [
+            os.path.join(
+                ASSETS_DIR, preview_path(video_path) if preview else video_path
+            )
+            for video_path, _, _ in segments
+        ]
+        profiles = await media_executor.run(
+            _clip_profiles, full_paths, is_disconnected=is_disconnected
+        )
+        target = target_profile(profiles)
+        to_render = sum(
+            profile != target or in_point is not None or out_point is not None
+            for profile, (_, in_point, out_point) in zip(profiles, segments)
+        )
+        parallel = min(max(1, to_render), MEDIA_WORKERS)
+        threads = encoder_threads(parallel)
+        slots = asyncio.Semaphore(parallel)
+
+        async def render(full_path, profile, in_point, out_point):
+            async with slots:
+                return await media_executor.run(
+                    _render_segment,
+                    full_path,
+                    profile,
+                    target,
+                    in_point,
+                    out_point,
+                    threads,
+                    is_disconnected=is_disconnected,
+                )
+
+        results = await asyncio.gather(
+            *(
+                render(full_path, profile, in_point, out_point)
+                for full_path, profile, (_, in_point, out_point) in zip(
+                    full_paths, profiles, segments
+                )
+            ),
+            return_exceptions=True,
+        )
+        rendered = [r for r in results if not isinstance(r, BaseException)]
+        try:
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            output_full_path = os.path.join(ASSETS_DIR, output_path)
+            await media_executor.run(
+                _concat_copy,
+                [path for path, _ in rendered],
+                output_full_path,
+                is_disconnected=is_disconnected,
+            )
+        finally:
+            for path, pinned in rendered:
+                if pinned:
+                    render_cache.release(path)
 
         return output_full_path
     except subprocess.CalledProcessError as e:
         print(f"An error occurred while concatenating videos: {e.stderr}")
         return None
+    except MediaExecutorError:
+        raise
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
 
 
 def add_video_to_sequence(existing_videos, new_video_path):
-    """Calculate the start time for adding a new video after existing ones"""
+    """Calculate the start time for adding a new video after existing ones.
+
+    Uses the stored `track_duration` of each track and only probes tracks that
+    don't have one yet, filling it in so the caller can persist it.
+    """
     total_duration = 0.0
     for video in existing_videos:
-        duration = get_video_duration(video["track_location"])
-        total_duration += duration
+        if video.get("track_duration") is None:
+            video["track_duration"] = get_video_duration(video["track_location"])
+        total_duration += video["track_duration"]
 
     return total_duration
 
@@ -1,27 +1,35 @@
 import os
-import requests
-from dotenv import load_dotenv
-import time
-import base64
+import asyncio
 from src.services.uuid import gen_uuid_str
+from src.services.freepik_client import (
+    DEFAULT_TASK_TIMEOUT,
+    FreepikError,
+    InlineFile,
+    get_freepik_client,
+    url_expiry,
+)
+from src.services.session_store import get_session_store
+from src.services.media_pipeline import start_proxy_job
+from src.services.blob_store import store_file
+from src.services.concat_normalizer import content_hash
+from src.services.generation_cache import generation_cache, generation_key
 from src.global_constants import ASSETS_DIR
-from src.shared_state import SharedState
+from google.adk.tools import ToolContext
 
-_shared_state = SharedState()
+VIDEO_ENDPOINT = "ai/image-to-video/kling-v2-5-pro"
+IMAGE_ENDPOINT = "ai/text-to-image/flux-pro-v1-1"
 
+timeout = DEFAULT_TASK_TIMEOUT
+# Freepik fetches the source image when the task is created; leave room for
+# clock skew so an URL doesn't expire on the way
+IMAGE_URL_MARGIN = 120
 
-# get from environment variables
-load_dotenv()
-FREEPIK_API_KEY = os.getenv("FREEPICK_KEY")
-BASE_URL = "https://api.freepik.com/v1"
 
-timeout = 600  # 10 minutes
-
-
-def gen_vid(
+async def gen_vid(
     prompt: str = "",
     negative_prompt: str = "",
     duration: int = 5,
+    tool_context: ToolContext = None,
 ):
     """
     This tool generate video from and image using prompt and negative prompt.
@@ -41,32 +49,15 @@ def gen_vid(
         str: The absolute path to the generated video file, or None if generation failed.
     """
 
-    image = _shared_state.get_image_path()
+    session_id = tool_context.session.id
+    image = await get_session_store().get_image_path(session_id)
     if image:
-        print(f"[gen_vid] Using image from shared state: {image}")
+        print(f"[gen_vid] Using image from session {session_id}: {image}")
     else:
-        print("[gen_vid] Warning: No image found in shared state")
-        print(f"[gen_vid] _shared_state object: {_shared_state}")
-        print(f"[gen_vid] _shared_state.__dict__: {_shared_state.__dict__}")
+        print(f"[gen_vid] Warning: No image found for session {session_id}")
         return None
 
-    endpoint = f"{BASE_URL}/ai/image-to-video/kling-v2-5-pro"
-
-    headers = {
-        "x-freepik-api-key": f"{FREEPIK_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
-    # prepare image payload
-    if image.startswith("http://") or image.startswith("https://"):
-        pass  # image is already a URL
-    else:
-        # assume image is an image path and should be converted to base64 string
-        with open(image, "rb") as image_file:
-            image = "data:image/jpeg;base64," + base64.b64encode(
-                image_file.read()
-            ).decode("utf-8")
-
+    bypass_cache = await get_session_store().get_bypass_cache(session_id)
     payload = {
         "image": image,
         "prompt": prompt,
@@ -74,72 +65,42 @@ def gen_vid(
         "duration": str(duration),
         "cfg_scale": 0.5,
     }
-
-    start_time = time.time()
-    generation_ok = True
-    response = requests.post(endpoint, headers=headers, json=payload)
-
-    if response.status_code == 200:
-        task_id = response.json()["data"]["task_id"]
-        status = response.json()["data"]["status"]
-
-        # Polling until the status is "COMPLETED"
-        while status != "COMPLETED":
-            print(f"Waiting for the task to complete... (current status: {status})")
-            time.sleep(2)  # Wait 2 seconds before checking again
-            status_url = (
-                f"https://api.freepik.com/v1/ai/image-to-video/kling-v2-5-pro/{task_id}"
-            )
-            response = requests.get(
-                status_url,
-                headers={"x-freepik-api-key": f"{FREEPIK_API_KEY}"},
-            )
-            if response.status_code == 200:
-                status = response.json()["data"]["status"]
-            else:
-                print(f"Error while checking the task status: {response.status_code}")
-                time.sleep(2)
-            if time.time() - start_time > timeout:
-                print("Timeout reached")
-                generation_ok = False
-                break
-
-        if generation_ok:
-            print("COMPLETED")
-            # Download the video ---------------------------------------------------------------
-            generated_list = response.json()["data"].get("generated")
-            if not generated_list:
-                print("[gen_vid] Error: No generated video URLs in response")
-                return None
-            VIDEO_URL = generated_list[0]
-            video_uuid = gen_uuid_str()
-            video_path = os.path.join(ASSETS_DIR, video_uuid)
-            os.makedirs(video_path, exist_ok=True)
-            file_name = os.path.join(video_path, f"{video_uuid}.mp4")
-            video_response = requests.get(VIDEO_URL)
-            if video_response.status_code == 200:
-                with open(file_name, "wb") as f:
-                    f.write(video_response.content)
-                print(f"Video successfully downloaded as {file_name}")
-                # Store video path in shared state
-                if _shared_state is not None:
-                    _shared_state.set_video_path(file_name)
-                return file_name
-            else:
-                print(
-                    f"Could not download the video. Status code: {video_response.status_code}"
-                )
-                return None
-    else:
-        print(
-            f"Error while generating the video. Status code: {response.status_code}, message: {response.json()['message']}"
-        )
-        return None
-
-
-def gen_image(
+    # A local image is keyed by its contents, not by where it happens to live
+    image_ref = image
+    if not _is_url(image):
+        image_ref = await asyncio.to_thread(content_hash, image)
+    cache_key = generation_key(VIDEO_ENDPOINT, {**payload, "image": image_ref})
+
+    video_uuid = gen_uuid_str()
+    file_name = os.path.join(ASSETS_DIR, video_uuid, f"{video_uuid}.mp4")
+    if not await generation_cache.fetch(cache_key, file_name, bypass_cache):
+        if not _is_url(image):
+            # Hand over the URL gen_image got the image from while it is valid;
+            # otherwise the API takes the local image as a base64 data URL
+            payload["image"] = await get_session_store().get_image_url(
+                session_id, image, valid_for=IMAGE_URL_MARGIN
+            ) or InlineFile(image)
+        try:
+            digest, _ = await _generate(VIDEO_ENDPOINT, payload, file_name)
+        except FreepikError as e:
+            print(f"[gen_vid] Error while generating the video: {e}")
+            return None
+        await generation_cache.put(cache_key, VIDEO_ENDPOINT, file_name, digest)
+
+    print(f"Video successfully downloaded as {file_name}")
+    # Store video path for this session
+    await get_session_store().set_video_path(session_id, file_name)
+    # Previews and scrubbing use a light proxy; make it in the background
+    await start_proxy_job(
+        os.path.relpath(file_name, ASSETS_DIR), user_id=tool_context.session.user_id
+    )
+    return file_name
+
+
+async def gen_image(
     prompt: str,
     aspect_ratio: str = "widescreen_16_9",
+    tool_context: ToolContext = None,
 ):
     """
     Generate an image from a text prompt and save it with a unique UUID.
@@ -156,12 +117,6 @@ def gen_image(
         str: The absolute path to the generated image file, or None if generation failed.
     """
 
-    endpoint = f"{BASE_URL}/ai/text-to-image/flux-pro-v1-1"
-    headers = {
-        "x-freepik-api-key": f"{FREEPIK_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "prompt": prompt,
         "prompt_upsampling": True,
@@ -170,67 +125,43 @@ def gen_image(
         "output_format": "jpeg",
     }
 
-    response = requests.post(endpoint, headers=headers, json=payload)
-
-    if response.status_code == 200:
-        task_id = response.json()["data"]["task_id"]
-        status = response.json()["data"]["status"]
-
-        start_time = time.time()
-        generation_ok = True
-        # Polling until the status is "COMPLETED"
-        while status != "COMPLETED":
-            print(f"Waiting for the task to complete... (current status: {status})")
-            time.sleep(2)  # Wait 2 seconds before checking again
-            status_url = f"{BASE_URL}/ai/text-to-image/flux-pro-v1-1/{task_id}"
-            response = requests.get(
-                status_url,
-                headers={"x-freepik-api-key": f"{FREEPIK_API_KEY}"},
-            )
-            if response.status_code == 200:
-                status = response.json()["data"]["status"]
-            else:
-                print(f"Error while checking the task status: {response.status_code}")
-                time.sleep(2)
-            if time.time() - start_time > timeout:
-                print("Timeout reached")
-                generation_ok = False
-                break
-
-        if generation_ok:
-            print("COMPLETED")
-            # Download the image ---------------------------------------------------------------
-            IMAGE_URL = response.json()["data"]["generated"][0]
-
-            # Generate unique ID and create assets directory structure
-            image_uuid = gen_uuid_str()
-
-            assets_dir = os.path.join(ASSETS_DIR, image_uuid)
-            os.makedirs(assets_dir, exist_ok=True)
-
-            file_name = os.path.join(assets_dir, f"{image_uuid}.jpeg")
-            image_response = requests.get(IMAGE_URL)
-            if image_response.status_code == 200:
-                with open(file_name, "wb") as f:
-                    f.write(image_response.content)
-                print(f"Image successfully downloaded as {file_name}")
-                # Store image path in shared state
-                print(
-                    f"[gen_image] About to store image path in SharedState (ID: {id(_shared_state)})"
-                )
-                if _shared_state is not None:
-                    _shared_state.set_image_path(file_name)
-                    print(
-                        f"[gen_image] After storing, state is: {_shared_state.__dict__}"
-                    )
-                return file_name
-            else:
-                print(
-                    f"Could not download the image. Status code: {image_response.status_code}"
-                )
-                return None
-    else:
-        print(
-            f"Error while generating the image. Status code: {response.status_code}, message: {response.json()['message']}"
+    session_id = tool_context.session.id
+    bypass_cache = await get_session_store().get_bypass_cache(session_id)
+    cache_key = generation_key(IMAGE_ENDPOINT, payload)
+
+    # Generate unique ID for the image's assets directory
+    image_uuid = gen_uuid_str()
+    file_name = os.path.join(ASSETS_DIR, image_uuid, f"{image_uuid}.jpeg")
+    if not await generation_cache.fetch(cache_key, file_name, bypass_cache):
+        try:
+            digest, url = await _generate(IMAGE_ENDPOINT, payload, file_name)
+        except FreepikError as e:
+            print(f"[gen_image] Error while generating the image: {e}")
+            return None
+        await generation_cache.put(cache_key, IMAGE_ENDPOINT, file_name, digest)
+        # gen_vid can pass the hosted copy on instead of uploading the file
+        await get_session_store().set_image_url(
+            session_id, file_name, url, url_expiry(url)
         )
-        return None
+
+    print(f"Image successfully downloaded as {file_name}")
+    # Store image path so gen_vid in the same session picks it up
+    await get_session_store().set_image_path(session_id, file_name)
+    return file_name
+
+
+async def _generate(endpoint: str, payload: dict, file_name: str) -> tuple[str, str]:
+    """Run a generation task, download its result to `file_name` and store it
+    in the blob store. Returns the digest and the URL it was downloaded from."""
+    client = get_freepik_client()
+    generated_list = await client.run_task(endpoint, payload, timeout=timeout)
+    print("COMPLETED")
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    await client.download(generated_list[0], file_name)
+    # A generation that was already downloaded is stored only once
+    return await store_file(file_name), generated_list[0]
+
+
+def _is_url(image: str) -> bool:
+    return image.startswith("http://") or image.startswith("https://")
+
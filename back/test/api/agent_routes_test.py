@@ -0,0 +1,25 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import agent_routes
+from src.services.job_queue import JobQueue
+from test.services.job_queue_test import InMemoryJobStore
+
+
+def test_cancelling_an_unknown_or_finished_job(monkeypatch):
+    queue = JobQueue(store=InMemoryJobStore())
+    queue.register_handler("test", lambda job, report: None)
+    monkeypatch.setattr(agent_routes, "job_queue", queue)
+    app = FastAPI()
+    app.include_router(agent_routes.router, prefix="/api/agent")
+    client = TestClient(app)
+
+    with client:
+        job = client.portal.call(queue.submit, "test", "a", {})
+        cancelled = client.delete(f"/api/agent/jobs/{job.job_id}")
+        again = client.delete(f"/api/agent/jobs/{job.job_id}")
+        unknown = client.delete("/api/agent/jobs/nope")
+
+    assert cancelled.status_code == 200
+    assert again.status_code == 409
+    assert unknown.status_code == 404
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import routes
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(routes, "ASSETS_DIR", "assets")
+    os.makedirs("assets/p1/proxies")
+    with open("assets/p1/clip.mp4", "wb") as f:
+        f.write(b"original" * 100)
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_stream_stays_bound_to_one_file_when_a_proxy_appears(client, monkeypatch):
+    proxy = "p1/proxies/clip.mp4"
+
+    def preview_path(path):
+        return proxy if os.path.exists(f"assets/{proxy}") else path
+
+    monkeypatch.setattr(routes, "preview_path", preview_path)
+
+    before = client.get("/api/stream/p1/clip.mp4", headers={"Range": "bytes=0-7"})
+    preview_before = client.get("/api/preview/p1/clip.mp4", follow_redirects=False)
+    with open(f"assets/{proxy}", "wb") as f:
+        f.write(b"proxy" * 10)
+    after = client.get("/api/stream/p1/clip.mp4", headers={"Range": "bytes=0-7"})
+    preview_after = client.get("/api/preview/p1/clip.mp4", follow_redirects=False)
+
+    assert before.content == after.content == b"original"
+    assert before.headers["etag"] == after.headers["etag"]
+    assert preview_before.status_code == 302
+    assert preview_before.headers["location"] == "/api/stream/p1/clip.mp4"
+    assert preview_after.headers["location"] == f"/api/stream/{proxy}"
+    assert client.get("/api/preview/p1/gone.mp4").status_code == 404
+
+
+def test_recent_projects_rejects_a_half_supplied_cursor(client):
+    edited = client.get(
+        "/api/recent_projects", params={"before_edited": "2024-01-01T00:00:00"}
+    )
+    project_id = client.get("/api/recent_projects", params={"before_id": "p1"})
+
+    assert edited.status_code == 400
+    assert project_id.status_code == 400
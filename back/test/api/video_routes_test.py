@@ -0,0 +1,127 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api import video_routes
+from src.services import video_edit
+
+PROBE = {
+    "format": {"duration": "10.0"},
+    "streams": [{"codec_type": "video", "codec_name": "h264", "pix_fmt": "yuv420p"}],
+}
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    """A relative ASSETS_DIR, as in production, with ffmpeg stubbed out."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(video_routes, "ASSETS_DIR", "assets")
+    monkeypatch.setattr(video_edit, "ASSETS_DIR", "assets")
+    os.makedirs("assets/p1")
+    with open("assets/p1/clip.mp4", "wb") as f:
+        f.write(b"clip")
+    cuts = []
+
+    def probe(full_path):
+        os.stat(full_path)  # The real probe cache keys on the file's stat
+        return PROBE
+
+    def cut(full_path, output_path, start, duration, codec_args):
+        cuts.append((full_path, start, duration))
+        with open(output_path, "wb") as f:
+            f.write(b"cut")
+
+    monkeypatch.setattr(video_edit.probe_cache, "probe", probe)
+    monkeypatch.setattr(video_edit, "get_keyframe_times", lambda path: [0, 2, 4, 6])
+    monkeypatch.setattr(video_edit, "_cut", cut)
+    return cuts
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(video_routes.router, prefix="/api")
+    return TestClient(app)
+
+
+def test_trim_cuts_the_project_file(assets, client):
+    response = client.post(
+        "/api/trim",
+        json={"project_location": "p1/clip.mp4", "start_time": 2, "end_time": 4},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["trim_mode"] == "copy"
+    assert assets == [(os.path.join("assets", "p1/clip.mp4"), 2, 2)]
+    output = response.json()["url"].removeprefix("/api/stream/")
+    assert os.path.exists(os.path.join("assets", output))
+
+
+def test_trim_of_an_unreadable_file_is_an_error_response(assets, client, monkeypatch):
+    def unreadable(full_path):
+        raise PermissionError(13, "Permission denied", full_path)
+
+    monkeypatch.setattr(video_edit.probe_cache, "probe", unreadable)
+
+    response = client.post(
+        "/api/trim",
+        json={"project_location": "p1/clip.mp4", "start_time": 2, "end_time": 4},
+    )
+    missing = client.post(
+        "/api/trim",
+        json={"project_location": "p1/gone.mp4", "start_time": 2, "end_time": 4},
+    )
+
+    assert response.status_code == 500
+    assert "Permission denied" in response.json()["detail"]
+    assert missing.status_code == 404
+
+
+class FakeProjectRepository:
+    """One project whose head version has two tracks."""
+
+    points = []
+
+    def __init__(self, mongo):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get_project(self, project_id):
+        if project_id != "p1":
+            return None
+        tracks = [
+            {"track_location": "p1/a.mp4", "track_start_time": 0.0, "track_duration": 5},
+            {"track_location": "p1/b.mp4", "track_start_time": 5.0, "track_duration": 5},
+        ]
+        return {"project_versions": [{"version": "0", "project_tracks": tracks}]}
+
+    async def set_track_points(self, project_id, revision, version, index, start, end):
+        self.points.append((project_id, version, index, start, end))
+        return True
+
+
+def test_track_points_are_stored_for_export(client, monkeypatch):
+    FakeProjectRepository.points = []
+    monkeypatch.setattr(video_routes, "AsyncProjectRepository", FakeProjectRepository)
+
+    def set_points(**body):
+        return client.post("/api/track_points", json={"project_id": "p1", **body})
+
+    stored = set_points(track_index=1, in_point=1.0, out_point=3.5)
+    reversed_points = set_points(track_index=1, in_point=3.0, out_point=2.0)
+    past_the_end = set_points(track_index=0, in_point=6.0)
+    missing_track = set_points(track_index=2, in_point=1.0)
+
+    assert stored.status_code == 200
+    assert stored.json()["track"]["track_in_point"] == 1.0
+    assert FakeProjectRepository.points == [("p1", "0", 1, 1.0, 3.5)]
+    assert reversed_points.status_code == 400
+    assert past_the_end.status_code == 400
+    assert missing_track.status_code == 404
@@ -0,0 +1,299 @@
+import asyncio
+from datetime import datetime
+
+from src.models.project_model import ProjectModel
+from src.repository.project_repository import (
+    AsyncProjectRepository,
+    migrate_project_operations,
+    track_append_update,
+    track_points_update,
+)
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self._documents = documents
+
+    def sort(self, keys):
+        documents = list(self._documents)
+        for key, direction in reversed(keys):
+            documents.sort(key=lambda d: d[key], reverse=direction < 0)
+        return FakeCursor(documents)
+
+    def limit(self, count):
+        return FakeCursor(self._documents[:count])
+
+    async def __aiter__(self):
+        for document in self._documents:
+            yield dict(document)
+
+
+class FakeUpdateResult:
+    def __init__(self, matched_count):
+        self.matched_count = matched_count
+
+
+class FakeCollection:
+    """Just enough of the async pymongo collection API for the repository."""
+
+    def __init__(self):
+        self.documents = []
+
+    @classmethod
+    def _matches(cls, document, query):
+        for key, value in query.items():
+            if key == "$or":
+                if not any(cls._matches(document, branch) for branch in value):
+                    return False
+            elif isinstance(value, dict) and "$exists" in value:
+                if (key in document) != value["$exists"]:
+                    return False
+            elif isinstance(value, dict) and "$in" in value:
+                if document.get(key) not in value["$in"]:
+                    return False
+            elif isinstance(value, dict):
+                if not document.get(key) < value["$lt"]:
+                    return False
+            elif document.get(key) != value:
+                return False
+        return True
+
+    @staticmethod
+    def _project(document, projection):
+        if projection is None:
+            return dict(document)
+        if any(projection.values()):
+            return {key: document[key] for key in document if projection.get(key)}
+        return {key: value for key, value in document.items() if key not in projection}
+
+    def find(self, query, projection=None):
+        return FakeCursor(
+            [
+                self._project(d, projection)
+                for d in self.documents
+                if self._matches(d, query)
+            ]
+        )
+
+    async def find_one(self, query, projection=None):
+        return next(
+            (
+                self._project(d, projection)
+                for d in self.documents
+                if self._matches(d, query)
+            ),
+            None,
+        )
+
+    async def insert_one(self, document):
+        self.documents.append(dict(document))
+
+    async def insert_many(self, documents):
+        self.documents.extend(dict(document) for document in documents)
+
+    async def update_one(self, query, update, array_filters=None):
+        for document in self.documents:
+            if self._matches(document, query):
+                document.update(update.get("$set", {}))
+                for key in update.get("$unset", {}):
+                    document.pop(key, None)
+                for key, value in update.get("$push", {}).items():
+                    document[key] = [*document[key], value]
+                for key, value in update.get("$inc", {}).items():
+                    document[key] = (document.get(key) or 0) + value
+                return FakeUpdateResult(1)
+        return FakeUpdateResult(0)
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            if await self.find_one(operation._filter) is None:
+                self.documents.append(
+                    {**operation._filter, **operation._doc["$setOnInsert"]}
+                )
+
+
+class FakeMongo:
+    def __init__(self):
+        self.projects = FakeCollection()
+        self.versions = FakeCollection()
+
+    def get_client(self):
+        return {
+            "Contentizer": {
+                "projects": self.projects,
+                "project_versions": self.versions,
+            }
+        }
+
+
+def make_project(project_id, user_id="0", day=1, versions=()):
+    return ProjectModel(
+        project_versions=list(versions),
+        project_id=project_id,
+        user_id=user_id,
+        project_directory=f"{project_id}/",
+        thumbnail="thumb.jpg",
+        last_edited=datetime(2025, 1, day),
+        name=f"{project_id}.mp4",
+    )
+
+
+def test_async_repository_round_trip():
+    async def run():
+        async with AsyncProjectRepository(FakeMongo()) as repository:
+            await repository.create_project(make_project("a"))
+            await repository.create_project(make_project("b"))
+            await repository.create_project(make_project("c", user_id="1"))
+            await repository.update_project("a", {"name": "renamed"})
+
+            project = await repository.get_project("a")
+            page = await repository.get_user_projects("0", count=1)
+            missing = await repository.get_project("nope")
+        return project, page, missing
+
+    project, page, missing = asyncio.run(run())
+
+    assert project["name"] == "renamed"
+    assert [p.project_id for p in page] == ["b"]
+    assert not hasattr(page[0], "project_versions")
+    assert missing is None
+
+
+def test_user_projects_are_paged_newest_first_by_keyset():
+    async def run():
+        async with AsyncProjectRepository(FakeMongo()) as repository:
+            for project_id, day in [("a", 1), ("b", 3), ("c", 2), ("d", 3), ("e", 1)]:
+                await repository.create_project(make_project(project_id, day=day))
+            pages, after = [], None
+            while True:
+                page = await repository.get_user_projects("0", count=2, after=after)
+                if not page:
+                    return pages
+                pages.append([p.project_id for p in page])
+                after = (page[-1].last_edited, page[-1].project_id)
+
+    assert asyncio.run(run()) == [["d", "b"], ["c", "e"], ["a"]]
+
+
+def test_versions_are_stored_apart_and_head_is_materialized():
+    versions = [
+        {"version": "0", "project_tracks": []},
+        {
+            "version": "1",
+            "project_tracks": [{"track_location": "p/a.mp4", "track_start_time": 0}],
+        },
+    ]
+    mongo = FakeMongo()
+
+    async def run():
+        async with AsyncProjectRepository(mongo) as repository:
+            await repository.create_project(make_project("p", versions=versions))
+            return (
+                await repository.get_project("p"),
+                await repository.get_project_version("p", "0"),
+            )
+
+    project, first = asyncio.run(run())
+
+    stored = mongo.projects.documents[0]
+    assert "project_versions" not in stored
+    assert stored["head_version"] == "1"
+    assert len(mongo.versions.documents) == 2
+    assert [v["version"] for v in project["project_versions"]] == ["1"]
+    assert project["project_versions"][0]["project_tracks"][0]["track_location"] == (
+        "p/a.mp4"
+    )
+    assert first == {"version": "0", "project_tracks": [], "revision": 0}
+
+
+def test_migration_moves_embedded_versions_out():
+    project = {
+        "project_id": "p",
+        "revision": 2,
+        "project_versions": [{"version": "0", "project_tracks": [{"x": 1}]}],
+    }
+
+    upserts, head_update = migrate_project_operations(project)
+
+    assert len(upserts) == 1
+    assert upserts[0]._filter == {"project_id": "p", "version": "0"}
+    assert upserts[0]._doc == {
+        "$setOnInsert": {
+            "version": "0",
+            "project_tracks": [{"x": 1}],
+            "project_id": "p",
+            "revision": 2,
+        }
+    }
+    assert head_update == {
+        "$set": {"head_version": "0"},
+        "$unset": {"project_versions": "", "revision": ""},
+    }
+
+
+def test_edits_migrate_a_project_with_embedded_versions_first():
+    mongo = FakeMongo()
+    # Written before versions moved out, and missed by the startup migration
+    mongo.projects.documents.append(
+        {
+            "_id": 1,
+            "project_id": "p",
+            "project_versions": [{"version": "0", "project_tracks": []}],
+        }
+    )
+
+    async def run():
+        async with AsyncProjectRepository(mongo) as repository:
+            before = await repository.get_project("p")
+            head = before["project_versions"][-1]
+            appended = await repository.append_track(
+                "p", head.get("revision", 0), head["version"], {"x": 1}
+            )
+            return appended, await repository.get_project("p")
+
+    appended, after = asyncio.run(run())
+
+    assert appended
+    assert "project_versions" not in mongo.projects.documents[0]
+    assert after["project_versions"][0]["project_tracks"] == [{"x": 1}]
+    assert after["project_versions"][0]["revision"] == 1
+
+
+def test_track_append_is_guarded_by_revision():
+    query, update, array_filters = track_append_update(
+        "p", 3, "1", {"track_location": "p/new.mp4"}, {"p/old.mp4": 4.0}
+    )
+
+    assert query == {"project_id": "p", "version": "1", "revision": 3}
+    assert update["$push"] == {"project_tracks": {"track_location": "p/new.mp4"}}
+    assert update["$inc"] == {"revision": 1}
+    assert update["$set"] == {"project_tracks.$[t0].track_duration": 4.0}
+    assert array_filters == [
+        {"t0.track_location": "p/old.mp4", "t0.track_duration": None},
+    ]
+
+
+def test_track_append_matches_versions_without_a_revision():
+    query, update, array_filters = track_append_update("p", 0, "0", {})
+
+    assert query["revision"] == {"$in": [0, None]}
+    assert "$set" not in update
+    assert array_filters == []
+
+
+def test_track_points_are_set_on_an_existing_track_by_revision():
+    query, update = track_points_update("p", 2, "1", 3, 1.5, None)
+
+    assert query == {
+        "project_id": "p",
+        "version": "1",
+        "revision": 2,
+        "project_tracks.3": {"$exists": True},
+    }
+    assert update == {
+        "$set": {
+            "project_tracks.3.track_in_point": 1.5,
+            "project_tracks.3.track_out_point": None,
+        },
+        "$inc": {"revision": 1},
+    }
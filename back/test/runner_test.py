@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.models.variant_model import VariantStatus
+from src.runner import call_agent_variants
+from src.services.session_store import get_session_store
+
+
+class FakeSessionService:
+    def __init__(self):
+        self.sessions = {}
+
+    async def get_session(self, app_name, user_id, session_id):
+        return self.sessions.get(session_id)
+
+    async def create_session(self, app_name, user_id, session_id):
+        self.sessions[session_id] = SimpleNamespace(state={})
+
+
+def final_event(author):
+    return SimpleNamespace(
+        author=author, content=None, actions=None, is_final_response=lambda: True
+    )
+
+
+class FakeDirectorRunner:
+    """Plans one variant per prompt listed in `prompts`."""
+
+    app_name = "contentizer"
+
+    def __init__(self, session_service, prompts):
+        self.session_service = session_service
+        self.prompts = prompts
+
+    async def run_async(self, user_id, session_id, new_message):
+        self.session_service.sessions[session_id].state["variant_plan"] = {
+            "variants": [
+                {"image_prompt": prompt, "video_prompt": f"{prompt} moving"}
+                for prompt in self.prompts
+            ]
+        }
+        yield final_event("variant_director_agent")
+
+
+class FakeVariantRunner:
+    """Pretends to generate a video; image prompts containing "fail" don't."""
+
+    app_name = "contentizer"
+
+    def __init__(self, session_service):
+        self.session_service = session_service
+        self.active = 0
+        self.max_active = 0
+
+    async def run_async(self, user_id, session_id, new_message):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.02)
+        self.active -= 1
+        if "fail" not in new_message.parts[0].text:
+            await get_session_store().set_video_path(session_id, f"{session_id}.mp4")
+        yield final_event("video_producer_agent")
+
+
+def test_variants_run_concurrently_under_the_cap():
+    sessions = FakeSessionService()
+    director = FakeDirectorRunner(sessions, ["dawn", "fail", "dusk", "night", "noon"])
+    variants = FakeVariantRunner(sessions)
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    results = asyncio.run(
+        call_agent_variants(
+            query="a city skyline",
+            director_runner=director,
+            variant_runner=variants,
+            user_id="video-1",
+            session_id="video-1_0",
+            variants=4,
+            max_concurrency=2,
+            on_event=on_event,
+        )
+    )
+
+    assert [result.image_prompt for result in results] == [
+        "dawn",
+        "fail",
+        "dusk",
+        "night",
+    ]
+    assert [result.status for result in results] == [
+        VariantStatus.SUCCEEDED,
+        VariantStatus.FAILED,
+        VariantStatus.SUCCEEDED,
+        VariantStatus.SUCCEEDED,
+    ]
+    assert results[0].generated_video_path == "video-1_0_v0.mp4"
+    assert results[1].error == "No video was generated"
+    assert variants.max_active == 2
+    assert {"variant": 1, "status": VariantStatus.FAILED} in events
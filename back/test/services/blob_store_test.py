@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from src.services import blob_store as blob_store_module
+from src.services.blob_store import BlobStore, collect_garbage, store_file, store_stream
+
+
+class MemoryBlobRepository:
+    """The blob repository over a dict of digest -> (size, refs, updated_at)."""
+
+    blobs = {}
+
+    def __init__(self, mongo):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def add_reference(self, digest, size, ref):
+        _, refs, _ = self.blobs.get(digest, (size, set(), None))
+        self.blobs[digest] = (size, refs | {ref}, datetime.now())
+
+    async def remove_reference(self, digest, ref):
+        size, refs, _ = self.blobs[digest]
+        self.blobs[digest] = (size, refs - {ref}, datetime.now())
+
+    async def get_references(self):
+        return [(digest, list(refs)) for digest, (_, refs, _) in self.blobs.items()]
+
+    async def get_unreferenced(self, before):
+        return [
+            digest
+            for digest, (_, refs, updated_at) in self.blobs.items()
+            if not refs and updated_at < before
+        ]
+
+    async def delete_unreferenced(self, digest, before):
+        _, refs, updated_at = self.blobs[digest]
+        if refs or updated_at >= before:
+            return False
+        del self.blobs[digest]
+        return True
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    store = BlobStore(str(assets / "blobs"))
+    MemoryBlobRepository.blobs = {}
+    monkeypatch.setattr(blob_store_module, "ASSETS_DIR", str(assets))
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    monkeypatch.setattr(blob_store_module, "AsyncBlobRepository", MemoryBlobRepository)
+    return store
+
+
+async def pieces(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def test_identical_uploads_share_one_blob(store):
+    assets = os.path.dirname(store.directory)
+    first = os.path.join(assets, "p1", "clip.mp4")
+    second = os.path.join(assets, "p2", "clip.mp4")
+
+    async def run():
+        return (
+            await store_stream(pieces(b"same ", b"footage"), first),
+            await store_stream(pieces(b"same footage"), second),
+        )
+
+    digest, again = asyncio.run(run())
+
+    assert digest == again == hashlib.sha256(b"same footage").hexdigest()
+    assert open(second, "rb").read() == b"same footage"
+    assert os.path.samefile(first, second)
+    assert os.path.samefile(first, store.path_for(digest))
+    assert MemoryBlobRepository.blobs[digest][1] == {"p1/clip.mp4", "p2/clip.mp4"}
+    assert os.listdir(store.temp_directory) == []
+
+
+def test_a_duplicate_file_is_replaced_by_a_link(store):
+    assets = os.path.dirname(store.directory)
+    paths = []
+    for project in ("p1", "p2"):
+        os.makedirs(os.path.join(assets, project))
+        paths.append(os.path.join(assets, project, "gen.mp4"))
+        with open(paths[-1], "wb") as f:
+            f.write(b"generated")
+
+    async def run():
+        return [await store_file(path) for path in paths]
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert os.path.samefile(paths[0], paths[1])
+    assert os.stat(paths[0]).st_nlink == 3
+
+
+def test_collection_keeps_referenced_blobs(store):
+    assets = os.path.dirname(store.directory)
+    kept = os.path.join(assets, "p1", "kept.mp4")
+    gone = os.path.join(assets, "p2", "gone.mp4")
+    asyncio.run(store_stream(pieces(b"kept"), kept))
+    asyncio.run(store_stream(pieces(b"gone"), gone))
+    os.remove(gone)
+    stray_fd, stray = store.temp_file()
+    os.close(stray_fd)
+    os.utime(stray, (1, 1))
+
+    # The first run only drops the reference; the blob gets a grace period
+    first = asyncio.run(collect_garbage(grace_seconds=3600))
+    time.sleep(0.01)
+    second = asyncio.run(collect_garbage(grace_seconds=0))
+
+    assert first["dropped_references"] == 1
+    assert first["deleted_blobs"] == 0
+    assert first["deleted_orphans"] == 1
+    assert second["deleted_blobs"] == 1
+    assert not os.path.exists(store.path_for(hashlib.sha256(b"gone").hexdigest()))
+    assert os.path.exists(store.path_for(hashlib.sha256(b"kept").hexdigest()))
+    assert open(kept, "rb").read() == b"kept"
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from src.services.chunked_upload import (
+    ChunkError,
+    ChunkIntegrityError,
+    UploadClosedError,
+    allocate,
+    _content_hashes,
+    chunk_bounds,
+    content_digest,
+    finalize,
+    partial_path,
+    total_chunks,
+    write_chunk,
+)
+
+
+async def pieces(data, size=3):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def test_chunk_bounds_cover_the_file():
+    assert total_chunks(10, 4) == 3
+    assert [chunk_bounds(i, 10, 4) for i in range(3)] == [(0, 4), (4, 4), (8, 2)]
+    with pytest.raises(ChunkError):
+        chunk_bounds(3, 10, 4)
+
+
+def test_chunks_written_in_any_order_assemble_the_file(tmp_path):
+    data = os.urandom(10)
+    full_path = str(tmp_path / "project" / "video.mp4")
+    allocate(full_path, len(data))
+
+    async def upload(index):
+        offset, length = chunk_bounds(index, len(data), 4)
+        chunk = data[offset : offset + length]
+        await write_chunk(
+            full_path, offset, length, pieces(chunk), hashlib.sha256(chunk).hexdigest()
+        )
+
+    async def run():
+        await asyncio.gather(*(upload(index) for index in (2, 0, 1)))
+
+    asyncio.run(run())
+    finalize(full_path)
+    finalize(full_path)  # a retried completion is a no-op
+
+    assert not os.path.exists(partial_path(full_path))
+    with open(full_path, "rb") as f:
+        assert f.read() == data
+
+
+def test_corrupt_and_wrong_sized_chunks_are_rejected(tmp_path):
+    full_path = str(tmp_path / "video.mp4")
+    allocate(full_path, 8)
+    good = hashlib.sha256(b"abcd").hexdigest()
+
+    with pytest.raises(ChunkIntegrityError):
+        asyncio.run(write_chunk(full_path, 0, 4, pieces(b"abce"), good))
+    with pytest.raises(ChunkError):
+        asyncio.run(write_chunk(full_path, 0, 4, pieces(b"abcde"), good))
+    with pytest.raises(ChunkError):
+        asyncio.run(write_chunk(full_path, 0, 4, pieces(b"abc"), good))
+
+
+def test_a_corrupt_retry_keeps_the_accepted_chunk(tmp_path):
+    full_path = str(tmp_path / "video.mp4")
+    allocate(full_path, 4)
+    good = hashlib.sha256(b"abcd").hexdigest()
+    asyncio.run(write_chunk(full_path, 0, 4, pieces(b"abcd"), good))
+
+    with pytest.raises(ChunkIntegrityError):
+        asyncio.run(write_chunk(full_path, 0, 4, pieces(b"xxxx"), good))
+
+    with open(partial_path(full_path), "rb") as f:
+        assert f.read() == b"abcd"
+    assert os.listdir(tmp_path) == ["video.mp4.part"]  # No spool files left
+
+
+def test_a_chunk_after_completion_is_rejected(tmp_path):
+    full_path = str(tmp_path / "video.mp4")
+    allocate(full_path, 4)
+    finalize(full_path)
+
+    with pytest.raises(UploadClosedError):
+        asyncio.run(
+            write_chunk(
+                full_path, 0, 4, pieces(b"abcd"), hashlib.sha256(b"abcd").hexdigest()
+            )
+        )
+
+
+def test_content_digest_is_built_while_chunks_arrive(tmp_path):
+    data = os.urandom(20)
+    full_path = str(tmp_path / "video.mp4")
+
+    async def upload(order):
+        for index in order:
+            offset, length = chunk_bounds(index, len(data), 4)
+            chunk = data[offset : offset + length]
+            checksum = hashlib.sha256(chunk).hexdigest()
+            await write_chunk(full_path, offset, length, pieces(chunk), checksum)
+
+    expected = hashlib.sha256(data).hexdigest()
+    for order in ([0, 1, 2, 3, 4], [2, 4, 1, 0, 3]):
+        allocate(full_path, len(data))
+        asyncio.run(upload(order))
+        # Early chunks were read back as the prefix reached them
+        assert _content_hashes[full_path].hashed == len(data)
+        assert content_digest(full_path) == expected
+
+    # After a restart the hash is taken from the file instead
+    allocate(full_path, len(data))
+    asyncio.run(upload([0, 1, 2, 3, 4]))
+    _content_hashes.clear()
+    finalize(full_path)
+    assert content_digest(full_path) == expected
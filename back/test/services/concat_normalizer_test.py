@@ -0,0 +1,43 @@
+from src.services.concat_normalizer import target_profile
+
+UPLOAD = {
+    "video_codec": "h264",
+    "width": 640,
+    "height": 360,
+    "fps": "30/1",
+    "pix_fmt": "yuv420p",
+    "time_base": "1/15360",
+    "audio_codec": "aac",
+    "sample_rate": 44100,
+    "channels": 1,
+}
+GENERATED = {
+    **UPLOAD,
+    "width": 1280,
+    "height": 720,
+    "fps": "24/1",
+    "time_base": "1/12288",
+    "audio_codec": None,
+    "sample_rate": None,
+    "channels": None,
+}
+
+
+def test_target_is_the_most_common_profile():
+    assert target_profile([GENERATED, UPLOAD, UPLOAD]) == UPLOAD
+
+
+def test_target_keeps_audio_when_any_clip_has_it():
+    target = target_profile([GENERATED, GENERATED, UPLOAD])
+    assert (target["width"], target["fps"]) == (1280, "24/1")
+    assert (target["audio_codec"], target["sample_rate"], target["channels"]) == (
+        "aac",
+        44100,
+        1,
+    )
+
+
+def test_target_codec_is_always_encodable():
+    vp9 = {**UPLOAD, "video_codec": "vp9", "pix_fmt": "yuv420p10le"}
+    target = target_profile([vp9])
+    assert (target["video_codec"], target["pix_fmt"]) == ("h264", "yuv420p")
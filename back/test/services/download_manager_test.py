@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from src.services.download_manager import (
+    DownloadError,
+    DownloadIntegrityError,
+    DownloadManager,
+    partial_path,
+)
+
+BODY = bytes(range(256)) * 4096  # 1 MiB
+
+
+class FileStub(BaseHTTPRequestHandler):
+    """Serves BODY with Range support; can drop the first connections midway."""
+
+    drop_first = 0
+    delay = 0.0
+    requests = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with FileStub.lock:
+            FileStub.requests.append(self.headers.get("Range"))
+            FileStub.active += 1
+            FileStub.max_active = max(FileStub.max_active, FileStub.active)
+        try:
+            self._serve()
+        finally:
+            with FileStub.lock:
+                FileStub.active -= 1
+
+    def _serve(self):
+        if self.path == "/missing":
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        time.sleep(FileStub.delay)
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{len(BODY) - 1}/{len(BODY)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(BODY) - start))
+        self.end_headers()
+        if FileStub.drop_first > 0:
+            FileStub.drop_first -= 1
+            # Promise the whole body, send a third of it, then hang up
+            self.wfile.write(BODY[start : start + (len(BODY) - start) // 3])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(BODY[start:])
+
+
+@pytest.fixture
+def file_server():
+    FileStub.drop_first = 0
+    FileStub.delay = 0.0
+    FileStub.requests = []
+    FileStub.max_active = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+
+def download(url, path, concurrency=4, retries=5, **kwargs):
+    async def scenario():
+        async with httpx.AsyncClient() as http:
+            manager = DownloadManager(
+                http, concurrency=concurrency, retries=retries, retry_delay=0.01
+            )
+            return await manager.download(url, path, **kwargs)
+
+    return asyncio.run(scenario())
+
+
+def test_interrupted_download_resumes_with_range(file_server, tmp_path):
+    FileStub.drop_first = 2
+    path = str(tmp_path / "video.mp4")
+
+    download(
+        f"{file_server}/video.mp4",
+        path,
+        expected_sha256=hashlib.sha256(BODY).hexdigest(),
+    )
+
+    assert open(path, "rb").read() == BODY
+    assert not os.path.exists(partial_path(path))
+    assert FileStub.requests[0] is None
+    assert FileStub.requests[1].startswith("bytes=")
+    assert len(FileStub.requests) == 3
+
+
+def test_hash_mismatch_leaves_nothing_behind(file_server, tmp_path):
+    path = str(tmp_path / "video.mp4")
+
+    with pytest.raises(DownloadIntegrityError):
+        download(f"{file_server}/video.mp4", path, expected_sha256="0" * 64)
+
+    assert not os.path.exists(path)
+    assert not os.path.exists(partial_path(path))
+
+
+def test_running_out_of_retries_leaves_nothing_behind(file_server, tmp_path):
+    FileStub.drop_first = 3
+    path = str(tmp_path / "video.mp4")
+
+    with pytest.raises(DownloadError):
+        download(f"{file_server}/video.mp4", path, retries=3)
+
+    assert len(FileStub.requests) == 3
+    assert not os.path.exists(path)
+    assert not os.path.exists(partial_path(path))
+
+
+def test_client_errors_are_not_retried(file_server, tmp_path):
+    with pytest.raises(DownloadError):
+        download(f"{file_server}/missing", str(tmp_path / "missing.mp4"))
+
+    assert len(FileStub.requests) == 1
+
+
+def test_downloads_run_with_bounded_parallelism(file_server, tmp_path):
+    FileStub.delay = 0.05
+    items = [(f"{file_server}/{i}.mp4", str(tmp_path / f"{i}.mp4")) for i in range(6)]
+
+    async def scenario():
+        async with httpx.AsyncClient() as http:
+            return await DownloadManager(http, concurrency=2).download_many(items)
+
+    paths = asyncio.run(scenario())
+
+    assert paths == [path for _, path in items]
+    assert all(os.path.getsize(path) == len(BODY) for path in paths)
+    assert FileStub.max_active == 2
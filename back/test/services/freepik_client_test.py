@@ -0,0 +1,229 @@
+import asyncio
+import base64
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from src.services.freepik_client import (
+    FreepikClient,
+    FreepikError,
+    FreepikTaskFailed,
+    FreepikTimeout,
+    InlineFile,
+    url_expiry,
+)
+
+TASK_PATH = "ai/text-to-image/flux-pro-v1-1"
+ASSET_BYTES = b"\xff\xd8generated-image\xff\xd9"
+
+
+class FreepikStub(BaseHTTPRequestHandler):
+    """Imitates the Freepik task/status endpoints."""
+
+    polls_before_done = 2
+    final_status = "COMPLETED"
+    polls = {}
+    bodies = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        FreepikStub.bodies.append(self.rfile.read(length))
+        if self.headers.get("x-freepik-api-key") != "test-key":
+            return self._send_json(401, {"message": "Invalid api key"})
+        self._send_json(200, {"data": {"task_id": "task-1", "status": "CREATED"}})
+
+    def do_GET(self):
+        if self.path == "/files/image.jpeg":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(ASSET_BYTES)))
+            self.end_headers()
+            self.wfile.write(ASSET_BYTES)
+            return
+        task_id = self.path.rsplit("/", 1)[-1]
+        count = FreepikStub.polls.get(task_id, 0) + 1
+        FreepikStub.polls[task_id] = count
+        if count < self.polls_before_done:
+            return self._send_json(
+                200, {"data": {"task_id": task_id, "status": "IN_PROGRESS"}}
+            )
+        host, port = self.server.server_address
+        self._send_json(
+            200,
+            {
+                "data": {
+                    "task_id": task_id,
+                    "status": self.final_status,
+                    "generated": [f"http://{host}:{port}/files/image.jpeg"],
+                }
+            },
+        )
+
+
+@pytest.fixture
+def stub_server():
+    FreepikStub.polls = {}
+    FreepikStub.bodies = []
+    FreepikStub.final_status = "COMPLETED"
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FreepikStub)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _client(base_url, **kwargs):
+    return FreepikClient(
+        base_url=base_url,
+        api_key="test-key",
+        initial_interval=0.01,
+        max_interval=0.05,
+        **kwargs,
+    )
+
+
+def test_run_task_polls_until_completed_and_downloads(stub_server):
+    async def scenario():
+        client = _client(stub_server)
+        try:
+            generated = await client.run_task(TASK_PATH, {"prompt": "a cat"})
+            with tempfile.TemporaryDirectory() as tmp:
+                path = await client.download(
+                    generated[0], os.path.join(tmp, "image.jpeg")
+                )
+                with open(path, "rb") as f:
+                    return generated, f.read()
+        finally:
+            await client.aclose()
+
+    generated, content = asyncio.run(scenario())
+
+    assert generated[0].endswith("/files/image.jpeg")
+    assert content == ASSET_BYTES
+    assert FreepikStub.polls["task-1"] == 2
+
+
+def test_failed_task_raises(stub_server):
+    FreepikStub.final_status = "FAILED"
+
+    async def scenario():
+        client = _client(stub_server)
+        try:
+            await client.run_task(TASK_PATH, {"prompt": "a cat"})
+        finally:
+            await client.aclose()
+
+    with pytest.raises(FreepikTaskFailed):
+        asyncio.run(scenario())
+
+
+def test_task_timeout(stub_server):
+    FreepikStub.polls_before_done = 1000
+
+    async def scenario():
+        client = _client(stub_server)
+        try:
+            await client.run_task(TASK_PATH, {"prompt": "a cat"}, timeout=0.1)
+        finally:
+            await client.aclose()
+
+    try:
+        with pytest.raises(FreepikTimeout):
+            asyncio.run(scenario())
+    finally:
+        FreepikStub.polls_before_done = 2
+
+
+def test_network_errors_are_raised_as_freepik_errors():
+    # Nothing listens on the port once the socket is closed
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FreepikStub)
+    host, port = server.server_address
+    server.server_close()
+
+    async def scenario():
+        client = _client(f"http://{host}:{port}")
+        try:
+            with pytest.raises(FreepikError) as raised:
+                await client.run_task(TASK_PATH, {"prompt": "a cat"})
+            # A failed status check is retried until the task's deadline
+            assert await client.get_task(TASK_PATH, "task-1") is None
+        finally:
+            await client.aclose()
+        return raised.value
+
+    assert isinstance(asyncio.run(scenario()).__cause__, httpx.ConnectError)
+
+
+def test_cancelling_stops_polling(stub_server):
+    FreepikStub.polls_before_done = 1000
+
+    async def scenario():
+        client = _client(stub_server)
+        try:
+            task = asyncio.create_task(client.run_task(TASK_PATH, {"prompt": "x"}))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            polls = FreepikStub.polls["task-1"]
+            await asyncio.sleep(0.1)
+            return polls, FreepikStub.polls["task-1"]
+        finally:
+            await client.aclose()
+
+    try:
+        before, after = asyncio.run(scenario())
+    finally:
+        FreepikStub.polls_before_done = 2
+    assert before == after
+
+
+def test_inline_file_is_streamed_as_a_data_url(stub_server, tmp_path):
+    image = tmp_path / "image.jpeg"
+    image.write_bytes(ASSET_BYTES * 1000)
+
+    async def scenario():
+        client = _client(stub_server)
+        try:
+            await client.create_task(
+                TASK_PATH, {"image": InlineFile(str(image)), "prompt": "a \"cat\""}
+            )
+        finally:
+            await client.aclose()
+
+    asyncio.run(scenario())
+
+    body = json.loads(FreepikStub.bodies[0])
+    assert body["prompt"] == 'a "cat"'
+    assert body["image"] == "data:image/jpeg;base64," + base64.b64encode(
+        ASSET_BYTES * 1000
+    ).decode("ascii")
+
+
+def test_url_expiry_reads_signed_urls():
+    signed = (
+        "https://cdn.example.com/image.jpeg?X-Goog-Algorithm=GOOG4-RSA-SHA256"
+        "&X-Goog-Date=20250101T000000Z&X-Goog-Expires=3600&X-Goog-Signature=abc"
+    )
+
+    assert url_expiry(signed) == 1735693200
+    assert url_expiry("https://cdn.example.com/a.jpeg?Expires=1735700000") == 1735700000
+    assert 0 < url_expiry("https://cdn.example.com/a.jpeg", 60) - time.time() <= 60
@@ -0,0 +1,173 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+
+from src.services import blob_store as blob_store_module
+from src.services import generation_cache as generation_cache_module
+from src.services.blob_store import BlobStore, store_stream
+from src.services.generation_cache import GenerationCache, generation_key
+from test.services.blob_store_test import MemoryBlobRepository, pieces
+
+
+class MemoryGenerationCacheRepository:
+    """The generation cache repository over a dict of key -> entry."""
+
+    entries = {}
+
+    def __init__(self, mongo):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def get_entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry["expires_at"] <= datetime.now():
+            return None
+        entry["last_used_at"] = datetime.now()
+        return dict(entry)
+
+    async def put_entry(self, key, endpoint, file, digest, size, expires_at):
+        self.entries[key] = {
+            "endpoint": endpoint,
+            "file": file,
+            "digest": digest,
+            "size": size,
+            "expires_at": expires_at,
+            "last_used_at": datetime.now(),
+        }
+
+    async def delete_entry(self, key):
+        self.entries.pop(key, None)
+
+    async def evict(self, budget_bytes):
+        excess = sum(entry["size"] for entry in self.entries.values()) - budget_bytes
+        evicted = []
+        by_use = sorted(self.entries.items(), key=lambda item: item[1]["last_used_at"])
+        for key, entry in by_use:
+            if excess <= 0:
+                break
+            excess -= entry["size"]
+            evicted.append(self.entries.pop(key)["file"])
+        return evicted
+
+    async def live_keys(self, keys):
+        return set(keys) & set(self.entries)
+
+
+@pytest.fixture
+def assets(tmp_path, monkeypatch):
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    store = BlobStore(str(assets / "blobs"))
+    MemoryBlobRepository.blobs = {}
+    MemoryGenerationCacheRepository.entries = {}
+    monkeypatch.setattr(blob_store_module, "ASSETS_DIR", str(assets))
+    monkeypatch.setattr(blob_store_module, "blob_store", store)
+    monkeypatch.setattr(blob_store_module, "AsyncBlobRepository", MemoryBlobRepository)
+    monkeypatch.setattr(generation_cache_module, "ASSETS_DIR", str(assets))
+    monkeypatch.setattr(generation_cache_module, "blob_store", store)
+    monkeypatch.setattr(
+        generation_cache_module, "GENERATION_CACHE_DIR", str(assets / "cache")
+    )
+    monkeypatch.setattr(
+        generation_cache_module,
+        "AsyncGenerationCacheRepository",
+        MemoryGenerationCacheRepository,
+    )
+    return str(assets)
+
+
+def test_key_ignores_spacing_key_order_and_number_types():
+    first = generation_key(
+        "ai/text-to-image/flux-pro-v1-1",
+        {"prompt": "A  red\tfox ", "safety_tolerance": 2, "aspect_ratio": "square_1_1"},
+    )
+    second = generation_key(
+        "/ai/text-to-image/flux-pro-v1-1",
+        {"aspect_ratio": "square_1_1", "safety_tolerance": "2", "prompt": "A red fox"},
+    )
+    other = generation_key(
+        "ai/text-to-image/flux-pro-v1-1",
+        {"prompt": "A red fox", "safety_tolerance": 2, "aspect_ratio": "square_4_3"},
+    )
+
+    assert first == second
+    assert first != other
+
+
+def test_a_repeated_request_links_the_cached_result(assets):
+    cache = GenerationCache(enabled=True, ttl=3600, budget_bytes=1024)
+    generated = os.path.join(assets, "g1", "g1.mp4")
+
+    async def run():
+        missed = await cache.fetch("k", os.path.join(assets, "g0", "g0.mp4"))
+        digest = await store_stream(pieces(b"generated"), generated)
+        await cache.put("k", "ai/video", generated, digest)
+        repeat = os.path.join(assets, "g2", "g2.mp4")
+        hit = await cache.fetch("k", repeat)
+        bypassed = await cache.fetch("k", repeat, bypass=True)
+        return missed, hit, bypassed, repeat
+
+    missed, hit, bypassed, repeat = asyncio.run(run())
+
+    assert (missed, hit, bypassed) == (False, True, False)
+    assert os.path.samefile(generated, repeat)
+    assert cache.metrics()["hits"] == 1
+    assert cache.metrics()["misses"] == 1
+    assert cache.metrics()["bypassed"] == 1
+
+
+def test_entries_over_budget_are_evicted_least_recently_used_first(assets):
+    cache = GenerationCache(enabled=True, ttl=3600, budget_bytes=10, evict_interval=0)
+
+    async def run():
+        for name in ("old", "new"):
+            path = os.path.join(assets, name, f"{name}.mp4")
+            digest = await store_stream(pieces(name.encode() * 2), path)
+            await cache.put(name, "ai/video", path, digest)
+        return (
+            await cache.fetch("old", os.path.join(assets, "a.mp4")),
+            await cache.fetch("new", os.path.join(assets, "b.mp4")),
+        )
+
+    old, new = asyncio.run(run())
+
+    assert (old, new) == (False, True)
+    assert os.listdir(os.path.join(assets, "cache")) == ["new.mp4"]
+
+
+def test_budget_is_checked_at_most_once_per_interval(assets):
+    cache = GenerationCache(enabled=True, ttl=3600, budget_bytes=10)
+
+    async def run():
+        for name in ("old", "new"):
+            path = os.path.join(assets, name, f"{name}.mp4")
+            digest = await store_stream(pieces(name.encode() * 2), path)
+            await cache.put(name, "ai/video", path, digest)
+
+    asyncio.run(run())
+
+    assert sorted(os.listdir(os.path.join(assets, "cache"))) == ["new.mp4", "old.mp4"]
+
+
+def test_links_of_entries_expired_by_mongo_are_removed(assets, monkeypatch):
+    monkeypatch.setattr(generation_cache_module, "LINK_GRACE_SECONDS", -60)
+    cache = GenerationCache(enabled=True, ttl=3600, budget_bytes=1024, evict_interval=0)
+
+    async def run():
+        for name in ("expired", "live"):
+            path = os.path.join(assets, name, f"{name}.mp4")
+            digest = await store_stream(pieces(name.encode()), path)
+            await cache.put(name, "ai/video", path, digest)
+            # The TTL index deletes the entry, leaving its link behind
+            MemoryGenerationCacheRepository.entries.pop("expired", None)
+
+    asyncio.run(run())
+
+    assert os.listdir(os.path.join(assets, "cache")) == ["live.mp4"]
@@ -0,0 +1,154 @@
+import asyncio
+import os
+
+from src.services import hls_packager
+from src.services.hls_packager import (
+    HLS_LADDER,
+    SegmentPackager,
+    adts_frame_offsets,
+    audio_frame,
+    audio_slice,
+    ladder_for,
+    master_playlist,
+    media_playlist,
+    plan_segments,
+    source_ranges,
+)
+from src.services.media_executor import MediaExecutor
+from src.services.render_cache import RenderCache
+
+
+def test_segments_follow_the_timeline_without_spanning_sources():
+    segments = plan_segments([("a.mp4", 1.0, 10.0), ("b.mp4", 0.0, 1.5)], 4.0)
+
+    assert [(s["source"], s["start"], s["duration"], s["offset"]) for s in segments] == [
+        ("a.mp4", 1.0, 4.0, 0.0),
+        # The 1s tail is folded into the last full segment
+        ("a.mp4", 5.0, 5.0, 4.0),
+        ("b.mp4", 0.0, 1.5, 9.0),
+    ]
+
+
+def test_ladder_never_upscales_and_keeps_the_aspect_ratio():
+    assert [r["name"] for r in ladder_for(1280, 720)] == ["360p", "540p", "720p"]
+    assert [(r["width"], r["height"]) for r in ladder_for(1080, 1920)][:1] == [
+        (202, 360)
+    ]
+    assert [r["name"] for r in ladder_for(320, 240)] == [HLS_LADDER[0]["name"]]
+
+
+def test_playlists_list_every_segment_up_front():
+    renditions = ladder_for(640, 360)
+    segments = plan_segments([("a.mp4", 0.0, 6.5)], 4.0)
+
+    master = master_playlist(renditions)
+    media = media_playlist(renditions[0], segments)
+
+    assert "RESOLUTION=640x360" in master
+    assert master.rstrip().endswith("360p.m3u8")
+    assert "#EXT-X-TARGETDURATION:4" in media
+    assert media.count("#EXTINF") == 2
+    assert "360p/1.ts" in media
+    assert media.rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_served_segments_are_pinned_and_touched_on_hits(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path), budget_bytes=25)
+    monkeypatch.setattr(hls_packager, "segment_cache", cache)
+    renditions = ladder_for(640, 360)
+    manifest = {
+        "key": "k",
+        "renditions": renditions,
+        "segments": plan_segments([("a.mp4", 0.0, 8.0)], 4.0),
+    }
+    for index in (0, 1):
+        with open(cache.path_for(f"k-360p-{index}"), "wb") as f:
+            f.write(b"x" * 10)
+    os.utime(cache.path_for("k-360p-0"), (1, 1))
+    os.utime(cache.path_for("k-360p-1"), (2, 2))
+
+    packager = SegmentPackager(prefetch=0)
+    served = asyncio.run(packager.get_segment(manifest, renditions[0], 0))
+    with open(cache.path_for("newer"), "wb") as f:
+        f.write(b"x" * 10)
+    cache.evict()
+
+    # The hit made segment 0 newer than segment 1
+    assert not os.path.exists(cache.path_for("k-360p-1"))
+    cache.budget_bytes = 0
+    cache.evict()
+    assert os.path.exists(served)  # Still being sent
+    cache.release(served)
+    cache.evict()
+    assert not os.path.exists(served)
+
+
+def adts_frame(number, payload_size=5):
+    """A minimal ADTS frame whose payload repeats `number`."""
+    length = 7 + payload_size
+    header = bytes(
+        [
+            0xFF,
+            0xF1,
+            0x4C,
+            0x80 | (length >> 11) & 0x03,
+            (length >> 3) & 0xFF,
+            (length & 0x07) << 5 | 0x1F,
+            0xFC,
+        ]
+    )
+    return header + bytes([number]) * payload_size
+
+
+def test_segment_audio_slices_tile_the_continuous_stream(tmp_path):
+    # Priming frame, then 400 frames (~8.5s at 48kHz) of timeline audio
+    stream = b"".join(adts_frame(n % 256, 5 + n % 3) for n in range(401))
+    audio_path = tmp_path / "audio.aac"
+    audio_path.write_bytes(stream)
+    segments = plan_segments([("a.mp4", 0.0, 3.0), ("b.mp4", 1.0, 6.5)], 2.0)
+
+    starts = [audio_frame(segment["offset"]) for segment in segments]
+    slices = [
+        audio_slice(str(audio_path), first, end)
+        for first, end in zip(starts, [*starts[1:], None])
+    ]
+
+    assert len(adts_frame_offsets(stream)) == 402
+    assert starts[1] == 94  # 2.0s is 93.75 frames of 1024 samples
+    # Every frame but the priming one, each in exactly one segment
+    assert b"".join(slices) == stream[len(adts_frame(0)) :]
+    assert source_ranges(segments) == [("a.mp4", 0.0, 3.0), ("b.mp4", 1.0, 5.5)]
+
+
+def test_prefetch_that_finds_no_room_is_rendered_on_request(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path), budget_bytes=1024)
+    monkeypatch.setattr(hls_packager, "segment_cache", cache)
+    monkeypatch.setattr(
+        hls_packager, "prefetch_executor", MediaExecutor(workers=1, queue_limit=0)
+    )
+    rendered = []
+
+    def render_segment(manifest, rendition, index, output_path):
+        rendered.append(index)
+        with open(output_path, "wb") as f:
+            f.write(b"ts")
+
+    monkeypatch.setattr(hls_packager, "render_segment", render_segment)
+    renditions = ladder_for(640, 360)
+    manifest = {
+        "key": "k",
+        "renditions": renditions,
+        "segments": plan_segments([("a.mp4", 0.0, 8.0)], 4.0),
+    }
+
+    async def scenario():
+        packager = SegmentPackager(prefetch=1)
+        first = await packager.get_segment(manifest, renditions[0], 0)
+        await asyncio.sleep(0.01)  # The prefetch of segment 1 is turned away
+        second = await packager.get_segment(manifest, renditions[0], 1)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert rendered == [0, 1]
+    assert os.path.exists(second)
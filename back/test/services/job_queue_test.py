@@ -0,0 +1,383 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from src.models.job_model import JobStatus
+from src.services.job_queue import JobQueue
+
+
+class InMemoryJobStore:
+    def __init__(self):
+        self.jobs = {}
+
+    async def create_job(self, job):
+        self.jobs[job.job_id] = job
+
+    async def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def update_job(self, job_id, update_data):
+        self.jobs[job_id] = self.jobs[job_id].model_copy(update=update_data)
+
+    async def push_progress(self, job_id, event):
+        job = self.jobs[job_id]
+        self.jobs[job_id] = job.model_copy(update={"progress": [*job.progress, event]})
+
+    async def claim_job(self, job_id, worker_id, lease_expires_at):
+        job = self.jobs.get(job_id)
+        if job is None or job.status != JobStatus.QUEUED:
+            return None
+        self.jobs[job_id] = job.model_copy(
+            update={
+                "status": JobStatus.RUNNING,
+                "worker_id": worker_id,
+                "lease_expires_at": lease_expires_at,
+                "attempts": job.attempts + 1,
+            }
+        )
+        return self.jobs[job_id]
+
+    def _owned(self, job_id, worker_id):
+        job = self.jobs[job_id]
+        return job.status == JobStatus.RUNNING and job.worker_id == worker_id
+
+    async def renew_lease(self, job_id, worker_id, lease_expires_at):
+        if not self._owned(job_id, worker_id):
+            return False
+        await self.update_job(job_id, {"lease_expires_at": lease_expires_at})
+        return True
+
+    async def finish_job(self, job_id, worker_id, update_data):
+        if not self._owned(job_id, worker_id):
+            return False
+        await self.update_job(
+            job_id, {**update_data, "worker_id": None, "lease_expires_at": None}
+        )
+        return True
+
+    async def release_job(self, job_id, worker_id):
+        if not self._owned(job_id, worker_id):
+            return False
+        await self.update_job(
+            job_id,
+            {"status": JobStatus.QUEUED, "worker_id": None, "lease_expires_at": None},
+        )
+        return True
+
+    async def cancel_queued_job(self, job_id):
+        if self.jobs[job_id].status != JobStatus.QUEUED:
+            return False
+        await self.update_job(job_id, {"status": JobStatus.CANCELLED})
+        return True
+
+    async def requeue_expired_jobs(self, now):
+        count = 0
+        for job_id, job in self.jobs.items():
+            if job.status == JobStatus.RUNNING and (
+                job.lease_expires_at is None or job.lease_expires_at < now
+            ):
+                self.jobs[job_id] = job.model_copy(
+                    update={"status": JobStatus.QUEUED, "worker_id": None}
+                )
+                count += 1
+        return count
+
+    async def get_queued_jobs(self):
+        queued = [job for job in self.jobs.values() if job.status == JobStatus.QUEUED]
+        return sorted(queued, key=lambda job: job.created_at)
+
+
+async def _wait_until_finished(queue, job_ids):
+    for _ in range(200):
+        jobs = [await queue.get_job(job_id) for job_id in job_ids]
+        if all(job.status in JobStatus.FINISHED for job in jobs):
+            return jobs
+        await asyncio.sleep(0.01)
+    raise AssertionError("jobs did not finish")
+
+
+def test_jobs_respect_worker_and_per_user_limits():
+    async def scenario():
+        running = {"total": 0, "max_total": 0, "per_user": {}, "max_user": 0}
+
+        async def handler(job, report):
+            running["total"] += 1
+            user_count = running["per_user"].get(job.user_id, 0) + 1
+            running["per_user"][job.user_id] = user_count
+            running["max_total"] = max(running["max_total"], running["total"])
+            running["max_user"] = max(running["max_user"], user_count)
+            await report({"author": "director_agent"})
+            await asyncio.sleep(0.02)
+            running["total"] -= 1
+            running["per_user"][job.user_id] -= 1
+            return {"value": job.payload["value"]}
+
+        queue = JobQueue(store=InMemoryJobStore(), workers=3, per_user_limit=1)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            jobs = [
+                await queue.submit("test", user_id=f"user-{i % 2}", payload={"value": i})
+                for i in range(6)
+            ]
+            finished = await _wait_until_finished(queue, [job.job_id for job in jobs])
+        finally:
+            await queue.stop()
+        return running, finished
+
+    running, finished = asyncio.run(scenario())
+
+    assert running["max_user"] == 1
+    assert running["max_total"] <= 2
+    assert [job.result["value"] for job in finished] == list(range(6))
+    assert all(job.status == JobStatus.SUCCEEDED for job in finished)
+    assert finished[0].progress[0]["author"] == "director_agent"
+
+
+def test_failed_and_cancelled_jobs():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(job, report):
+            if job.payload.get("fail"):
+                raise RuntimeError("boom")
+            await release.wait()
+            return {}
+
+        queue = JobQueue(store=InMemoryJobStore(), workers=1, per_user_limit=1)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            blocking = await queue.submit("test", user_id="a", payload={})
+            queued = await queue.submit("test", user_id="b", payload={})
+            failing = await queue.submit("test", user_id="c", payload={"fail": True})
+            await asyncio.sleep(0.05)
+            assert await queue.cancel(queued.job_id)
+            assert await queue.cancel(blocking.job_id)
+            return await _wait_until_finished(
+                queue, [blocking.job_id, queued.job_id, failing.job_id]
+            )
+        finally:
+            await queue.stop()
+
+    blocking, queued, failing = asyncio.run(scenario())
+
+    assert blocking.status == JobStatus.CANCELLED
+    assert queued.status == JobStatus.CANCELLED
+    assert failing.status == JobStatus.FAILED
+    assert failing.error == "boom"
+
+
+def test_interrupted_jobs_resume_after_restart():
+    store = InMemoryJobStore()
+
+    async def first_process():
+        started = asyncio.Event()
+
+        async def handler(job, report):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue = JobQueue(store=store, workers=1)
+        queue.register_handler("test", handler)
+        await queue.start()
+        job = await queue.submit("test", user_id="a", payload={})
+        await started.wait()
+        await queue.stop()
+        return job
+
+    async def second_process(job_id):
+        async def handler(job, report):
+            return {"resumed": True}
+
+        queue = JobQueue(store=store, workers=1)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            return (await _wait_until_finished(queue, [job_id]))[0]
+        finally:
+            await queue.stop()
+
+    job = asyncio.run(first_process())
+    # A clean shutdown hands the job straight back to the queue
+    assert store.jobs[job.job_id].status == JobStatus.QUEUED
+
+    resumed = asyncio.run(second_process(job.job_id))
+    assert resumed.status == JobStatus.SUCCEEDED
+    assert resumed.result == {"resumed": True}
+    assert resumed.attempts == 2
+
+
+class FlakyJobStore(InMemoryJobStore):
+    """Fails the first `failures` job completions, like a store outage."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    async def finish_job(self, job_id, worker_id, update_data):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("store unreachable")
+        return await super().finish_job(job_id, worker_id, update_data)
+
+
+def test_store_errors_do_not_kill_workers():
+    async def scenario():
+        async def handler(job, report):
+            return {}
+
+        queue = JobQueue(store=FlakyJobStore(failures=2), workers=1)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            await queue.submit("test", user_id="a", payload={})
+            await queue.submit("test", user_id="a", payload={})
+            later = await queue.submit("test", user_id="a", payload={})
+            return (await _wait_until_finished(queue, [later.job_id]))[0]
+        finally:
+            await queue.stop()
+
+    assert asyncio.run(scenario()).status == JobStatus.SUCCEEDED
+
+
+def test_processes_sharing_a_store_run_each_job_once():
+    store = InMemoryJobStore()
+
+    async def scenario():
+        runs = []
+
+        async def handler(job, report):
+            runs.append(job.job_id)
+            await asyncio.sleep(0.02)
+            return {}
+
+        queues = [JobQueue(store=store, workers=2, lease_seconds=0.05) for _ in "ab"]
+        for queue in queues:
+            queue.register_handler("test", handler)
+            await queue.start()
+        try:
+            jobs = [
+                await queues[0].submit("test", user_id=f"user-{i}", payload={})
+                for i in range(6)
+            ]
+            # The other process finds the queued jobs by polling and joins in
+            await _wait_until_finished(queues[0], [job.job_id for job in jobs])
+        finally:
+            for queue in queues:
+                await queue.stop()
+        return runs
+
+    runs = asyncio.run(scenario())
+
+    assert len(runs) == 6
+    assert len(set(runs)) == 6
+
+
+def test_only_jobs_with_an_expired_lease_are_requeued():
+    store = InMemoryJobStore()
+
+    async def scenario():
+        async def handler(job, report):
+            return {}
+
+        owner = JobQueue(store=store, workers=1)
+        owner.register_handler("test", handler)
+        crashed = await owner.submit("test", user_id="a", payload={})
+        alive = await owner.submit("test", user_id="b", payload={})
+        now = datetime.now(timezone.utc)
+        await store.claim_job(crashed.job_id, "gone", now - timedelta(seconds=1))
+        await store.claim_job(alive.job_id, "busy", now + timedelta(hours=1))
+
+        queue = JobQueue(store=store, workers=1)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            await _wait_until_finished(queue, [crashed.job_id])
+        finally:
+            await queue.stop()
+        return store.jobs[crashed.job_id], store.jobs[alive.job_id]
+
+    crashed, alive = asyncio.run(scenario())
+
+    assert crashed.status == JobStatus.SUCCEEDED
+    assert crashed.attempts == 2
+    assert alive.status == JobStatus.RUNNING
+    assert alive.worker_id == "busy"
+
+
+class UnreachableAtStartJobStore(InMemoryJobStore):
+    """Can't list jobs on the first try, like a store that is still booting."""
+
+    def __init__(self):
+        super().__init__()
+        self.down = True
+
+    async def requeue_expired_jobs(self, now):
+        if self.down:
+            self.down = False
+            raise ConnectionError("store unreachable")
+        return await super().requeue_expired_jobs(now)
+
+
+def test_start_survives_a_store_outage_and_retries():
+    store = UnreachableAtStartJobStore()
+
+    async def scenario():
+        async def handler(job, report):
+            return {}
+
+        earlier = JobQueue(store=store)
+        earlier.register_handler("test", handler)
+        queued = await earlier.submit("test", user_id="a", payload={})
+
+        queue = JobQueue(store=store, workers=1, lease_seconds=0.05)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            return (await _wait_until_finished(queue, [queued.job_id]))[0]
+        finally:
+            await queue.stop()
+
+    assert asyncio.run(scenario()).status == JobStatus.SUCCEEDED
+
+
+def test_a_job_whose_lease_is_lost_stops_and_keeps_the_new_owners_result():
+    store = InMemoryJobStore()
+
+    async def scenario():
+        stopped = asyncio.Event()
+
+        async def handler(job, report):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                stopped.set()
+                raise
+
+        queue = JobQueue(store=store, workers=1, lease_seconds=0.06)
+        queue.register_handler("test", handler)
+        await queue.start()
+        try:
+            job = await queue.submit("test", user_id="a", payload={})
+            while store.jobs[job.job_id].status != JobStatus.RUNNING:
+                await asyncio.sleep(0.01)
+            # Another process takes the job over, e.g. after a long GC pause
+            await store.update_job(
+                job.job_id,
+                {
+                    "worker_id": "other",
+                    "lease_expires_at": datetime.now(timezone.utc) + timedelta(hours=1),
+                    "result": {"by": "other"},
+                },
+            )
+            await asyncio.wait_for(stopped.wait(), 1)
+            await asyncio.sleep(0.05)
+        finally:
+            await queue.stop()
+        return store.jobs[job.job_id]
+
+    job = asyncio.run(scenario())
+
+    assert job.status == JobStatus.RUNNING
+    assert job.worker_id == "other"
+    assert job.result == {"by": "other"}
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from src.services.media_executor import (
+    MediaExecutor,
+    MediaJobCancelled,
+    MediaJobTimeout,
+    MediaQueueFull,
+    run_process,
+)
+
+
+def _sleep(seconds):
+    return run_process(["sleep", str(seconds)])
+
+
+def test_run_returns_result_off_the_event_loop():
+    async def scenario():
+        executor = MediaExecutor(workers=2, queue_limit=4, timeout=5)
+        try:
+            return await executor.run(run_process, ["echo", "hello"])
+        finally:
+            executor.shutdown()
+
+    stdout, _, returncode = asyncio.run(scenario())
+    assert (stdout, returncode) == (b"hello\n", 0)
+
+
+def test_queue_limit_rejects_extra_jobs():
+    async def scenario():
+        executor = MediaExecutor(workers=1, queue_limit=2, timeout=5)
+        try:
+            running = [asyncio.create_task(executor.run(_sleep, 0.3)) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            with pytest.raises(MediaQueueFull):
+                await executor.run(_sleep, 0.3)
+            await asyncio.gather(*running)
+            return executor.depth
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(scenario()) == 0
+
+
+def test_timeout_kills_the_process():
+    async def scenario():
+        executor = MediaExecutor(workers=1, queue_limit=2, timeout=0.2)
+        try:
+            started = time.monotonic()
+            with pytest.raises(MediaJobTimeout):
+                await executor.run(_sleep, 10)
+            # the killed job frees its worker, so the next job runs right away
+            await executor.run(_sleep, 0)
+            return time.monotonic() - started
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(scenario()) < 5
+
+
+def test_client_disconnect_cancels_the_job():
+    async def scenario():
+        executor = MediaExecutor(workers=1, queue_limit=2, timeout=10)
+        disconnected_at = time.monotonic() + 0.2
+
+        async def is_disconnected():
+            return time.monotonic() > disconnected_at
+
+        try:
+            with pytest.raises(MediaJobCancelled):
+                await executor.run(_sleep, 10, is_disconnected=is_disconnected)
+            return time.monotonic() - disconnected_at
+        finally:
+            executor.shutdown()
+
+    assert asyncio.run(scenario()) < 2
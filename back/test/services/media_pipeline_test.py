@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from src.models.job_model import JobModel
+from src.services import media_pipeline
+from src.services.media_pipeline import PIPELINE_STAGES, run_media_pipeline
+
+
+class RecordingRepository:
+    def __init__(self, mongo):
+        self.calls = RecordingRepository.calls
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def set_processing_stage(self, project_id, stage, status, **kwargs):
+        self.calls.append((stage, status))
+
+    async def set_head_track_durations(self, project_id, durations):
+        self.calls.append(("durations", durations))
+
+    async def update_project(self, project_id, update):
+        self.calls.append(("update", update))
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    RecordingRepository.calls = []
+    monkeypatch.setattr(media_pipeline, "AsyncProjectRepository", RecordingRepository)
+    functions = {
+        "probe": lambda path: {"duration": 4.0},
+        "thumbnail": lambda path: {"path": "thumbs/a.jpg"},
+        "proxy": lambda path: {"path": "proxies/a.mp4"},
+        "waveform": lambda path: {"path": "waveforms/a.json"},
+    }
+    monkeypatch.setattr(media_pipeline, "STAGE_FUNCTIONS", functions)
+    return functions
+
+
+def make_job(stages=PIPELINE_STAGES):
+    return JobModel(
+        job_id="j",
+        user_id="0",
+        kind=media_pipeline.MEDIA_PIPELINE_JOB,
+        payload={"project_id": "p", "video_path": "p/a.mp4", "stages": list(stages)},
+        created_at="2025-01-01T00:00:00",
+        updated_at="2025-01-01T00:00:00",
+    )
+
+
+async def no_report(event):
+    pass
+
+
+def fail(path):
+    raise RuntimeError("boom")
+
+
+def test_stages_run_in_order_and_results_reach_the_project(pipeline):
+    result = asyncio.run(run_media_pipeline(make_job(), no_report))
+
+    assert result["stages"] == {stage: "done" for stage in PIPELINE_STAGES}
+    calls = RecordingRepository.calls
+    assert ("durations", {"p/a.mp4": 4.0}) in calls
+    assert ("update", {"thumbnail": "thumbs/a.jpg"}) in calls
+    assert [c for c in calls if c[0] == "proxy"] == [
+        ("proxy", "running"),
+        ("proxy", "done"),
+    ]
+
+
+def test_a_failed_stage_does_not_stop_independent_ones(pipeline):
+    pipeline["thumbnail"] = fail
+
+    result = asyncio.run(run_media_pipeline(make_job(), no_report))
+
+    assert result["stages"] == {
+        "probe": "done",
+        "thumbnail": "failed",
+        "proxy": "done",
+        "waveform": "done",
+    }
+
+
+def test_a_failed_probe_skips_the_rest(pipeline):
+    pipeline["probe"] = fail
+
+    result = asyncio.run(run_media_pipeline(make_job(), no_report))
+
+    assert result["stages"] == {"probe": "failed"}
+    assert ("waveform", "failed") in RecordingRepository.calls
+
+
+def test_a_retry_runs_only_the_requested_stage(pipeline):
+    result = asyncio.run(run_media_pipeline(make_job(["proxy"]), no_report))
+
+    assert result["stages"] == {"proxy": "done"}
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from src.repository.base_repository import BaseRepository
+from src.services.mongo_client import MongoClientSingleton, MongoPoolMetrics
+
+
+def test_repositories_do_not_close_the_shared_client():
+    mongo = MongoClientSingleton()
+    client = mongo.get_client()
+    try:
+        with BaseRepository(mongo):
+            pass
+        with BaseRepository(mongo):
+            pass
+        assert mongo.get_client() is client
+    finally:
+        mongo.close_client()
+
+
+def test_pool_metrics_track_checkouts_and_wait_time():
+    metrics = MongoPoolMetrics()
+    event = SimpleNamespace(duration=0.002)
+
+    metrics.connection_created(event)
+    metrics.connection_checked_out(event)
+    metrics.connection_checked_out(SimpleNamespace(duration=0.004))
+    metrics.connection_checked_in(event)
+    metrics.connection_check_out_failed(event)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["open_connections"] == 1
+    assert snapshot["checked_out"] == 1
+    assert snapshot["checkouts"] == 2
+    assert snapshot["checkout_failures"] == 1
+    assert round(snapshot["avg_wait_ms"], 3) == 3.0
+    assert round(snapshot["max_wait_ms"], 3) == 4.0
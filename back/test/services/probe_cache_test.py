@@ -0,0 +1,74 @@
+import os
+
+from src.services.probe_cache import ProbeCache
+
+
+def _counting_prober(calls):
+    def prober(path):
+        calls.append(path)
+        return {"format": {"duration": "2.5"}, "streams": []}
+
+    return prober
+
+
+def test_probe_is_cached_until_file_changes(tmp_path):
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(b"a" * 10)
+    calls = []
+    cache = ProbeCache(max_entries=4, prober=_counting_prober(calls))
+
+    cache.probe(str(path))
+    cache.probe(str(path))
+    assert len(calls) == 1
+
+    path.write_bytes(b"b" * 20)
+    cache.probe(str(path))
+    assert len(calls) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    paths = []
+    for name in "abc":
+        path = tmp_path / f"{name}.mp4"
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+    calls = []
+    cache = ProbeCache(max_entries=2, prober=_counting_prober(calls))
+
+    cache.probe(paths[0])
+    cache.probe(paths[1])
+    cache.probe(paths[0])  # a is now most recently used
+    cache.probe(paths[2])  # evicts b
+    cache.probe(paths[0])
+    cache.probe(paths[1])
+
+    assert [os.path.basename(path) for path in calls] == [
+        "a.mp4",
+        "b.mp4",
+        "c.mp4",
+        "b.mp4",
+    ]
+
+
+def test_each_kind_of_result_has_its_own_budget(tmp_path):
+    paths = []
+    for name in "abc":
+        path = tmp_path / f"{name}.mp4"
+        path.write_bytes(name.encode())
+        paths.append(str(path))
+    calls = []
+    cache = ProbeCache(
+        max_entries=1, prober=_counting_prober(calls), budgets={"keyframes": 2}
+    )
+
+    cache.probe(paths[0])
+    for path in paths:
+        cache.get(path, "keyframes", lambda path: [0.0])
+    cache.probe(paths[0])  # Keyframe lists didn't push the probe out
+
+    assert len(calls) == 1
+    computed = []
+    cache.get(paths[2], "keyframes", computed.append)
+    cache.get(paths[0], "keyframes", computed.append)
+    assert computed == [paths[0]]
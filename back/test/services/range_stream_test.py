@@ -0,0 +1,119 @@
+import os
+
+import pytest
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from src.services.range_stream import (
+    RangeFileResponse,
+    RangeNotSatisfiable,
+    parse_range_header,
+)
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+
+    async def stream(request):
+        return RangeFileResponse(str(path), chunk_size=1000)
+
+    app = Starlette(routes=[Route("/stream", stream, methods=["GET", "HEAD"])])
+    return TestClient(app)
+
+
+def test_parse_range_header():
+    assert parse_range_header("bytes=0-99", 1000) == [(0, 100)]
+    assert parse_range_header("bytes=900-", 1000) == [(900, 1000)]
+    assert parse_range_header("bytes=-100", 1000) == [(900, 1000)]
+    assert parse_range_header("bytes=-5000", 1000) == [(0, 1000)]
+    assert parse_range_header("bytes=0-9, 5-19, 50-59", 1000) == [(0, 20), (50, 60)]
+    assert parse_range_header("bytes=10-5", 1000) is None
+    assert parse_range_header("items=0-5", 1000) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header("bytes=1000-", 1000)
+
+
+def test_full_file_without_range(client):
+    response = client.get("/stream")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_single_and_suffix_ranges(client):
+    response = client.get("/stream", headers={"Range": "bytes=100-2599"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:2600]
+    assert response.headers["content-range"] == f"bytes 100-2599/{len(CONTENT)}"
+
+    response = client.get("/stream", headers={"Range": "bytes=-500"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[-500:]
+
+
+def test_multi_range(client):
+    response = client.get("/stream", headers={"Range": "bytes=0-9,2000-2009"})
+    assert response.status_code == 206
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=")[1]
+    body = response.content
+    assert int(response.headers["content-length"]) == len(body)
+    assert body.count(f"--{boundary}".encode()) == 3
+    assert CONTENT[0:10] in body and CONTENT[2000:2010] in body
+    assert f"Content-Range: bytes 2000-2009/{len(CONTENT)}".encode() in body
+
+
+def test_unsatisfiable_range(client):
+    response = client.get("/stream", headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_conditional_requests(client):
+    first = client.get("/stream")
+    etag = first.headers["etag"]
+    last_modified = first.headers["last-modified"]
+
+    assert client.get("/stream", headers={"If-None-Match": etag}).status_code == 304
+    assert (
+        client.get("/stream", headers={"If-Modified-Since": last_modified}).status_code
+        == 304
+    )
+
+    matching = client.get("/stream", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert matching.status_code == 206
+
+    stale = client.get(
+        "/stream", headers={"Range": "bytes=0-9", "If-Range": '"stale-etag"'}
+    )
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+
+def test_head_sends_headers_only(client):
+    response = client.head("/stream", headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.headers["content-length"] == "10"
+    assert response.content == b""
+
+
+def test_background_runs_after_every_response(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(CONTENT)
+    done = []
+
+    async def stream(request):
+        return RangeFileResponse(str(path), background=BackgroundTask(done.append, 1))
+
+    client = TestClient(Starlette(routes=[Route("/stream", stream)]))
+    assert client.get("/stream").content == CONTENT
+    assert client.get("/stream", headers={"Range": "bytes=99999-"}).status_code == 416
+    assert done == [1, 1]
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from src.services.render_cache import RenderCache
+
+
+def write_bytes(size):
+    def render(path):
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+
+    return render
+
+
+def test_renders_once_and_reuses_the_segment(tmp_path):
+    cache = RenderCache(str(tmp_path), budget_bytes=1024)
+    calls = []
+
+    def render(path):
+        calls.append(path)
+        write_bytes(10)(path)
+
+    first = cache.get_or_render("a", render)
+    second = cache.get_or_render("a", render)
+
+    assert first == second == cache.path_for("a")
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    cache = RenderCache(str(tmp_path), budget_bytes=25)
+    for key in ("a", "b"):
+        cache.release(cache.get_or_render(key, write_bytes(10)))
+    os.utime(cache.path_for("a"), (1, 1))
+    os.utime(cache.path_for("b"), (2, 2))
+
+    cache.release(cache.get_or_render("c", write_bytes(10)))
+
+    assert not os.path.exists(cache.path_for("a"))
+    assert os.path.exists(cache.path_for("b"))
+    assert os.path.exists(cache.path_for("c"))
+
+
+def test_pinned_segments_survive_eviction(tmp_path):
+    cache = RenderCache(str(tmp_path), budget_bytes=15)
+    pinned = cache.get_or_render("a", write_bytes(10))
+    os.utime(pinned, (1, 1))
+
+    cache.get_or_render("b", write_bytes(10))
+
+    assert os.path.exists(pinned)
+    cache.release(pinned)
+    cache.evict()
+    assert not os.path.exists(pinned)
+
+
+def test_failed_render_leaves_nothing_behind(tmp_path):
+    cache = RenderCache(str(tmp_path), budget_bytes=1024)
+
+    def render(path):
+        write_bytes(10)(path)
+        raise RuntimeError("ffmpeg failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_render("a", render)
+
+    assert os.listdir(tmp_path) == []
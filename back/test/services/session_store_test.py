@@ -0,0 +1,85 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from src.services.session_store import (
+    InMemorySessionBackend,
+    MongoSessionBackend,
+    SessionArtifactStore,
+)
+
+
+def test_sessions_are_isolated():
+    async def scenario():
+        store = SessionArtifactStore(InMemorySessionBackend(), ttl=60)
+        await store.set_image_path("session-a", "a.jpeg")
+        await store.set_image_path("session-b", "b.jpeg")
+        await store.set_video_path("session-a", "a.mp4")
+        return (
+            await store.get_image_path("session-a"),
+            await store.get_image_path("session-b"),
+            await store.get_video_path("session-b"),
+        )
+
+    assert asyncio.run(scenario()) == ("a.jpeg", "b.jpeg", None)
+
+
+def test_sessions_expire_after_ttl():
+    async def scenario():
+        backend = InMemorySessionBackend()
+        store = SessionArtifactStore(backend, ttl=0)
+        await store.set_image_path("session-a", "a.jpeg")
+        expired = await store.get_image_path("session-a")
+        await store.set_image_path("session-b", "b.jpeg")
+        return expired, len(backend._sessions)
+
+    expired, remaining = asyncio.run(scenario())
+    assert expired is None
+    assert remaining == 1
+
+
+def test_image_url_is_only_handed_over_while_valid():
+    async def scenario():
+        store = SessionArtifactStore(InMemorySessionBackend(), ttl=60)
+        await store.set_image_url("s", "a.jpeg", "https://cdn/a.jpeg", time.time() + 300)
+        return (
+            await store.get_image_url("s", "a.jpeg", valid_for=120),
+            await store.get_image_url("s", "a.jpeg", valid_for=600),
+            await store.get_image_url("s", "b.jpeg"),
+        )
+
+    assert asyncio.run(scenario()) == ("https://cdn/a.jpeg", None, None)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.queries = []
+        self.updates = []
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append(update)
+
+    def find_one(self, query):
+        self.queries.append(query)
+        return None
+
+
+def test_mongo_expiry_is_written_in_utc(monkeypatch):
+    collection = FakeCollection()
+    backend = MongoSessionBackend()
+    monkeypatch.setattr(backend, "_collection", lambda: collection)
+
+    async def scenario():
+        await backend.set("s", "image_path", "a.jpeg", ttl=60)
+        await backend.get("s")
+
+    asyncio.run(scenario())
+
+    # The TTL index compares against UTC, whatever the server's local zone
+    expires_at = collection.updates[0]["$set"]["expires_at"]
+    assert expires_at.utcoffset() == timedelta(0)
+    assert expires_at - datetime.now(timezone.utc) <= timedelta(seconds=60)
+    assert collection.queries[0]["expires_at"]["$gt"].utcoffset() == timedelta(0)
@@ -0,0 +1,44 @@
+from src.services import thumbnails
+from src.services.thumbnails import resolve_thumbnail_path, sprite_index, sprite_vtt
+
+
+def test_sprite_index_wraps_rows_and_sheets(monkeypatch):
+    monkeypatch.setattr(thumbnails, "SPRITE_COLUMNS", 2)
+    monkeypatch.setattr(thumbnails, "SPRITE_ROWS", 2)
+
+    index = sprite_index(9.0, 160, 90, interval=2.0)
+
+    assert [(t["sheet"], t["x"], t["y"]) for t in index["tiles"]] == [
+        ("sprite-0.jpg", 0, 0),
+        ("sprite-0.jpg", 160, 0),
+        ("sprite-0.jpg", 0, 90),
+        ("sprite-0.jpg", 160, 90),
+        ("sprite-1.jpg", 0, 0),
+    ]
+    assert index["sheets"] == ["sprite-0.jpg", "sprite-1.jpg"]
+    assert (index["tiles"][-1]["start"], index["tiles"][-1]["end"]) == (8.0, 9.0)
+
+
+def test_sprite_vtt_points_cues_at_tiles():
+    vtt = sprite_vtt(sprite_index(3.0, 160, 90, interval=2.0))
+
+    assert vtt.startswith("WEBVTT\n")
+    assert "00:00:00.000 --> 00:00:02.000\nsprite-0.jpg#xywh=0,0,160,90" in vtt
+    assert "00:00:02.000 --> 00:00:03.000\nsprite-0.jpg#xywh=160,0,160,90" in vtt
+
+
+def test_thumbnail_paths_stay_under_the_thumbnails_dir(tmp_path, monkeypatch):
+    root = tmp_path / "thumbnails"
+    (root / "p").mkdir(parents=True)
+    (root / "p" / "poster-small.jpg").write_bytes(b"jpg")
+    (tmp_path / "secret.txt").write_text("secret")
+    monkeypatch.setattr(thumbnails, "THUMBNAILS_DIR", str(root))
+
+    assert resolve_thumbnail_path("p/poster-small.jpg") == str(
+        root / "p" / "poster-small.jpg"
+    )
+    # Paths stored with the thumbnails directory in front still resolve
+    assert resolve_thumbnail_path(f"{root}/p/poster-small.jpg") is not None
+    assert resolve_thumbnail_path("../secret.txt") is None
+    assert resolve_thumbnail_path(str(tmp_path / "secret.txt")) is None
+    assert resolve_thumbnail_path("p") is None
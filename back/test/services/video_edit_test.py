@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import threading
+
+import pytest
+
+from src.services import video_edit
+from src.services.media_executor import MediaExecutor
+from src.services.render_cache import RenderCache
+from src.services.video_edit import (
+    TRIM_COPY,
+    TRIM_REENCODE,
+    TRIM_SMART,
+    plan_trim,
+    trim,
+    preview_path,
+    waveform_peaks,
+)
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+
+
+def test_cuts_on_gop_boundaries_are_copied():
+    assert plan_trim(KEYFRAMES, 12.0, 2.0, 8.0) == (TRIM_COPY, 2.0, 8.0)
+    assert plan_trim(KEYFRAMES, 12.0, 4.0, 30.0) == (TRIM_COPY, 4.0, 12.0)
+
+
+def test_partial_gops_at_the_edges_use_smart_cut():
+    assert plan_trim(KEYFRAMES, 12.0, 2.5, 9.3) == (TRIM_SMART, 4.0, 8.0)
+    assert plan_trim(KEYFRAMES, 12.0, 2.0, 9.3) == (TRIM_SMART, 2.0, 8.0)
+
+
+def test_cuts_without_a_whole_gop_are_reencoded():
+    assert plan_trim(KEYFRAMES, 12.0, 0.5, 1.5)[0] == TRIM_REENCODE
+    assert plan_trim(KEYFRAMES, 12.0, 2.5, 4.5)[0] == TRIM_REENCODE
+    assert plan_trim([], 12.0, 2.0, 8.0)[0] == TRIM_REENCODE
+
+
+SOURCE_VIDEO = {
+    "codec_type": "video",
+    "codec_name": "h264",
+    "profile": "Main",
+    "level": 31,
+    "pix_fmt": "yuv420p",
+    "width": 1280,
+    "height": 720,
+    "time_base": "1/15360",
+    "color_range": "tv",
+    "color_space": "bt709",
+    "color_primaries": "unknown",
+}
+
+
+def test_smart_trim_edges_match_the_source_stream():
+    args = video_edit._smart_encode_args(SOURCE_VIDEO, None)
+
+    assert args[:2] == ["-c:v", "libx264"]
+    assert args[args.index("-profile:v") + 1] == "main"
+    assert args[args.index("-level:v") + 1] == "3.1"
+    assert args[args.index("-pix_fmt") + 1] == "yuv420p"
+    assert args[args.index("-video_track_timescale") + 1] == "15360"
+    assert args[args.index("-colorspace") + 1] == "bt709"
+    assert "-color_primaries" not in args
+
+    hevc = {**SOURCE_VIDEO, "codec_name": "hevc", "profile": "Main 10", "level": 123}
+    args = video_edit._smart_encode_args(hevc, None)
+    assert args[args.index("-profile:v") + 1] == "main10"
+    assert args[args.index("-x265-params") + 1] == "level-idc=41:repeat-headers=1"
+
+
+def test_smart_trim_of_an_unmatchable_stream_is_reencoded(tmp_path, monkeypatch):
+    cuts = []
+
+    def cut(full_path, output_path, start, duration, codec_args):
+        cuts.append((os.path.basename(output_path), start, duration))
+        with open(output_path, "wb") as f:
+            f.write(b"cut")
+
+    def probe(stream):
+        return {"format": {"duration": "12.0"}, "streams": [stream]}
+
+    monkeypatch.setattr(video_edit, "get_keyframe_times", lambda path: KEYFRAMES)
+    monkeypatch.setattr(video_edit, "_cut", cut)
+
+    # A profile the encoder can't produce
+    extended = {**SOURCE_VIDEO, "profile": "Extended"}
+    monkeypatch.setattr(video_edit.probe_cache, "probe", lambda path: probe(extended))
+    output = str(tmp_path / "out.mp4")
+    assert trim("clip.mp4", output, 2.5, 9.3, TRIM_SMART) == TRIM_REENCODE
+    assert cuts == [("out.mp4", 2.5, pytest.approx(6.8))]
+
+    # Edges that came out in other stream parameters
+    cuts.clear()
+    source = probe(SOURCE_VIDEO)
+    monkeypatch.setattr(video_edit.probe_cache, "probe", lambda path: source)
+    monkeypatch.setattr(
+        video_edit, "run_ffprobe", lambda path: probe({**SOURCE_VIDEO, "level": 40})
+    )
+    assert trim("clip.mp4", output, 2.5, 9.3) == TRIM_REENCODE
+    assert [name for name, _, _ in cuts] == [
+        "head.mp4",
+        "middle.mp4",
+        "tail.mp4",
+        "out.mp4",
+    ]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="needs ffmpeg")
+def test_smart_trim_output_decodes_across_both_cuts(tmp_path):
+    source = str(tmp_path / "source.mp4")
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=size=320x240:rate=30",
+            "-f", "lavfi", "-i", "sine=frequency=440",
+            "-t", "6",
+            "-c:v", "libx264", "-profile:v", "main", "-level:v", "3.0",
+            "-pix_fmt", "yuv420p", "-g", "30", "-sc_threshold", "0",
+            "-c:a", "aac",
+            source,
+        ],
+        check=True,
+    )  # fmt: skip
+    output = str(tmp_path / "out.mp4")
+
+    # Keyframes every second, so both cuts fall inside a GOP
+    assert trim(source, output, 0.5, 4.5) == TRIM_SMART
+
+    probe = json.loads(
+        subprocess.run(
+            [
+                "ffprobe", "-v", "error", "-select_streams", "v:0", "-count_frames",
+                "-show_streams", "-of", "json", output,
+            ],
+            check=True,
+            capture_output=True,
+        ).stdout
+    )["streams"][0]  # fmt: skip
+    assert probe["profile"] == "Main"
+    assert probe["level"] == 30
+    assert probe["pix_fmt"] == "yuv420p"
+    assert abs(int(probe["nb_read_frames"]) - 120) <= 1
+
+    decoded = subprocess.run(
+        ["ffmpeg", "-v", "error", "-i", output, "-f", "null", "-"],
+        capture_output=True,
+    )
+    assert decoded.returncode == 0
+    assert decoded.stderr == b""
+
+
+def test_waveform_peaks_are_the_loudest_sample_per_bucket():
+    samples = [0, 16384, -8192, 0, -32768, 100]
+
+    assert waveform_peaks(samples, 3) == [0.5, 1.0]
+
+
+def test_preview_uses_a_fresh_proxy_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(video_edit, "ASSETS_DIR", str(tmp_path))
+    (tmp_path / "p").mkdir()
+    original = tmp_path / "p" / "clip.mov"
+    original.write_bytes(b"original")
+
+    assert preview_path("p/clip.mov") == "p/clip.mov"
+
+    proxy = tmp_path / "p" / "clip.proxy.mp4"
+    proxy.write_bytes(b"proxy")
+    assert preview_path("p/clip.mov") == "p/clip.proxy.mp4"
+    assert preview_path("p/clip.proxy.mp4") == "p/clip.proxy.mp4"
+
+    # A proxy older than its original is stale
+    os.utime(proxy, (1, 1))
+    assert preview_path("p/clip.mov") == "p/clip.mov"
+
+
+def test_export_segments_with_in_out_points_are_trimmed(tmp_path, monkeypatch):
+    # Full paths are built on a relative ASSETS_DIR, as in production
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(video_edit, "ASSETS_DIR", "assets")
+    os.makedirs("assets/p1")
+    with open("assets/p1/clip.mp4", "wb") as f:
+        f.write(b"clip")
+    probe = {
+        "format": {"duration": "10.0"},
+        "streams": [{"codec_type": "video", "codec_name": "h264"}],
+    }
+    cuts = []
+
+    def cut(full_path, output_path, start, duration, codec_args):
+        cuts.append((full_path, start, duration))
+        with open(output_path, "wb") as f:
+            f.write(b"cut")
+
+    monkeypatch.setattr(video_edit.probe_cache, "probe", lambda path: probe)
+    monkeypatch.setattr(video_edit, "get_keyframe_times", lambda path: KEYFRAMES)
+    monkeypatch.setattr(video_edit, "_cut", cut)
+    monkeypatch.setattr(video_edit, "render_cache", RenderCache(str(tmp_path / "c")))
+    full_path = os.path.join("assets", "p1/clip.mp4")
+    profile = {"video_codec": "h264", "audio_codec": None}
+
+    path, pinned = video_edit._render_segment(full_path, profile, profile, 2, 4, 1)
+
+    assert pinned
+    assert open(path, "rb").read() == b"cut"
+    assert cuts == [(full_path, 2.0, 2.0)]
+
+
+def test_export_unpins_rendered_segments_on_failure(monkeypatch):
+    rendered, released = [], []
+
+    def render_segment(full_path, profile, target, in_point, out_point, threads):
+        if full_path.endswith("bad.mp4"):
+            raise RuntimeError("encoder crashed")
+        rendered.append(full_path)
+        return f"{full_path}.part", True
+
+    monkeypatch.setattr(video_edit, "clip_profile", lambda path: {})
+    monkeypatch.setattr(video_edit, "target_profile", lambda profiles: {})
+    monkeypatch.setattr(video_edit, "_render_segment", render_segment)
+    monkeypatch.setattr(video_edit.render_cache, "release", released.append)
+
+    output = asyncio.run(
+        video_edit.concatenate_videos(
+            [("p/a.mp4", None, None), ("p/bad.mp4", None, None), ("p/c.mp4", 1, 2)],
+            "p/out.mp4",
+        )
+    )
+
+    assert output is None
+    assert sorted(os.path.basename(path) for path in rendered) == ["a.mp4", "c.mp4"]
+    assert sorted(released) == sorted(f"{path}.part" for path in rendered)
+
+
+def test_export_transcodes_mismatched_clips_in_parallel(monkeypatch):
+    # Both renders have to be running at once to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    threads_used, concatenated = [], []
+
+    def render_segment(full_path, profile, target, in_point, out_point, threads):
+        barrier.wait()
+        threads_used.append(threads)
+        return f"{full_path}.part", False
+
+    monkeypatch.setattr(video_edit, "clip_profile", lambda path: {"path": path})
+    monkeypatch.setattr(video_edit, "target_profile", lambda profiles: {})
+    monkeypatch.setattr(video_edit, "_render_segment", render_segment)
+    monkeypatch.setattr(
+        video_edit, "_concat_copy", lambda parts, output: concatenated.extend(parts)
+    )
+    monkeypatch.setattr(video_edit, "MEDIA_WORKERS", 4)
+    monkeypatch.setattr(video_edit, "media_executor", MediaExecutor(workers=4))
+    monkeypatch.setattr(video_edit.os, "cpu_count", lambda: 8)
+
+    output = asyncio.run(
+        video_edit.concatenate_videos(
+            [("p/a.mp4", None, None), ("p/b.mp4", None, None)], "p/out.mp4"
+        )
+    )
+
+    assert output.endswith("p/out.mp4")
+    assert [os.path.basename(part) for part in concatenated] == [
+        "a.mp4.part",
+        "b.mp4.part",
+    ]
+    assert threads_used == [4, 4]  # Two encodes share the eight CPUs
@@ -1,20 +1,85 @@
+const API_URL = "http://localhost:8000/api";
+const PARALLEL_CHUNKS = 3;
+const CHUNK_RETRIES = 3;
+
+async function sha256Hex(data: ArrayBuffer): Promise<string> {
+    const digest = await crypto.subtle.digest("SHA-256", data);
+    return Array.from(new Uint8Array(digest))
+        .map((byte) => byte.toString(16).padStart(2, "0"))
+        .join("");
+}
+
+async function uploadChunk(
+    uploadId: string,
+    file: File,
+    index: number,
+    chunkSize: number
+): Promise<void> {
+    const data = await file
+        .slice(index * chunkSize, (index + 1) * chunkSize)
+        .arrayBuffer();
+    const checksum = await sha256Hex(data);
+
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(
+                `${API_URL}/uploads/${uploadId}/chunks/${index}`,
+                {
+                    method: "PUT",
+                    headers: { "X-Chunk-Sha256": checksum },
+                    body: data,
+                }
+            );
+            if (response.ok) {
+                return;
+            }
+            if (attempt >= CHUNK_RETRIES) {
+                throw new Error(`Failed to upload chunk ${index}`);
+            }
+        } catch (error) {
+            if (attempt >= CHUNK_RETRIES) {
+                throw error;
+            }
+        }
+    }
+}
 
 /**
- * Upload a file to the server
+ * Upload a file to the server in resumable, checksummed chunks.
+ * Only chunks the server is still missing are sent, so calling this again
+ * with the same `uploadId` after a failure resumes where it stopped.
  */
 export async function uploadVideo(
     file: File,
-    title?: string
+    title?: string,
+    uploadId?: string
 ): Promise<any> {
-    const formData = new FormData();
-    formData.append("file", file);
-    if (title) {
-        formData.append("title", title);
+    let session;
+    if (uploadId) {
+        session = await (await fetch(`${API_URL}/uploads/${uploadId}`)).json();
+    } else {
+        const response = await fetch(`${API_URL}/uploads`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ filename: title || file.name, size: file.size }),
+        });
+        if (!response.ok) {
+            throw new Error("Failed to upload video");
+        }
+        session = await response.json();
     }
 
-    const response = await fetch("http://localhost:8000/api/upload", {
+    const pending: number[] = [...session.missing_chunks];
+    const workers = Array.from({ length: PARALLEL_CHUNKS }, async () => {
+        while (pending.length > 0) {
+            const index = pending.shift() as number;
+            await uploadChunk(session.upload_id, file, index, session.chunk_size);
+        }
+    });
+    await Promise.all(workers);
+
+    const response = await fetch(`${API_URL}/uploads/${session.upload_id}/complete`, {
         method: "POST",
-        body: formData,
     });
 
     if (!response.ok) {
@@ -22,4 +87,4 @@ export async function uploadVideo(
     }
 
     return response.json();
-}
\ No newline at end of file
+}
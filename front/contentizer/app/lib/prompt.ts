@@ -1,3 +1,5 @@
+const JOB_POLL_INTERVAL_MS = 2000;
+
 export async function generatePrompt(
     video_id: string,
     time: string,
@@ -19,5 +21,31 @@ export async function generatePrompt(
         throw new Error("Failed to generate prompt");
     }
 
-    return response.json();
-}
\ No newline at end of file
+    const submitted = await response.json();
+    return waitForJob(submitted.job_id);
+}
+
+/**
+ * Poll an agent job until it finishes and return its result
+ */
+export async function waitForJob(job_id: string): Promise<any> {
+    while (true) {
+        const response = await fetch(`http://localhost:8000/api/agent/jobs/${job_id}`, {
+            method: "GET",
+        });
+
+        if (!response.ok) {
+            throw new Error("Failed to get job status");
+        }
+
+        const job = await response.json();
+        if (job.status === "succeeded") {
+            return { ...job.result, status: "success" };
+        }
+        if (job.status === "failed" || job.status === "cancelled") {
+            return { error: job.error, status: "error" };
+        }
+
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+}
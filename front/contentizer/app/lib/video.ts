@@ -59,6 +59,32 @@ export async function addVideoToProject(
     return response.json();
 }
 
+export async function setTrackPoints(
+    project_id: string,
+    track_index: number,
+    in_point?: number,
+    out_point?: number
+): Promise<any> {
+    const response = await fetch("http://localhost:8000/api/video/track_points", {
+        method: "POST",
+        body: JSON.stringify({
+            project_id: project_id,
+            track_index: track_index,
+            in_point: in_point ?? null,
+            out_point: out_point ?? null,
+        }),
+        headers: {
+            "Content-Type": "application/json",
+        },
+    });
+
+    if (!response.ok) {
+        throw new Error("Failed to set track points");
+    }
+
+    return response.json();
+}
+
 export async function concatenateVideos(
     project_id: string,
     output_filename?: string
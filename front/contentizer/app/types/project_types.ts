@@ -1,6 +1,8 @@
 export type ProjectTracksModel = {
     track_location: string;
     track_start_time: string;
+    track_in_point?: number;
+    track_out_point?: number;
 }
 
 export type ProjectFilesModel = {